@@ -0,0 +1,170 @@
+""" Benchmarks of the matching engine. Run with: python benchmark.py [name ...] """
+import logging
+import sys
+import timeit
+from concurrent.futures import ProcessPoolExecutor
+
+from discrete_event import DiscreteEvent, source_event, schedulers
+from regex_lib import Pattern, RegexSet
+from regex_to_nfa import regex_to_nfa, eliminate_null_nodes
+from regex_program import compile_program
+from regex_dfa import RegexDfa
+from regex_vm import PikeVm
+
+
+def bench_scheduler(counts=(100, 400, 1600, 6400), repeat: int = 3) -> None:
+    """ Time DiscreteEvent.execute against the number of pending events for every scheduler.
+    One source event fans out to count nodes, so count events are pending at the same time """
+    print('{:>8} {}'.format('events', ' '.join('{:>10}'.format(name) for name in schedulers)))
+    for count in counts:
+        times = []
+        for name in schedulers:
+            m = DiscreteEvent('fan_out', scheduler=name)
+            m.input_port('A', latency=1)
+            for i in range(count):
+                n = m.add_node('copy', lambda a: a)
+                n.input('A', latency=1 + i % 7)
+            t = min(timeit.repeat(lambda: m.execute(source_event('A', 1, 0), limit=count + 1),
+                                  number=1, repeat=repeat))
+            times.append(t)
+        print('{:>8} {}'.format(count, ' '.join('{:>9.4f}s'.format(t) for t in times)))
+
+
+def bench_search(lengths=(50, 100, 200, 400), engines=('nfa', 'dfa', 'pike'), repeat: int = 3) -> None:
+    """ Time an unsuccessful search against the length of the text for every engine """
+    print('{:>8} {}'.format('chars', ' '.join('{:>10}'.format(name) for name in engines)))
+    patterns = [Pattern(r'[0-9]+:[0-9]+x', engine) for engine in engines]
+    for length in lengths:
+        text = '12:34 ' * (length // 6)
+        times = [min(timeit.repeat(lambda: p.search(text), number=1, repeat=repeat)) for p in patterns]
+        print('{:>8} {}'.format(len(text), ' '.join('{:>9.4f}s'.format(t) for t in times)))
+
+
+def bench_set(counts=(10, 50, 200), repeat: int = 3) -> None:
+    """ Time finding which of count patterns match a line, one search per pattern against one RegexSet """
+    print('{:>8} {:>10} {:>10}'.format('patterns', 'loop', 'set'))
+    line = 'GET /api/v7/items?user=42 HTTP/1.1'
+    for count in counts:
+        regexes = ['POST /api/v{}/[a-z]+'.format(i) if i % 2 else 'user={}[0-9]*$'.format(i) for i in range(count)]
+        patterns = [Pattern(regex) for regex in regexes]
+        regex_set = RegexSet(regexes)
+        loop = min(timeit.repeat(lambda: [p.search(line) for p in patterns], number=1, repeat=repeat))
+        one_pass = min(timeit.repeat(lambda: regex_set.matches(line), number=1, repeat=repeat))
+        print('{:>8} {:>9.4f}s {:>9.4f}s'.format(count, loop, one_pass))
+
+
+def node_size(node) -> int:
+    """ Approximate the memory held by one node of a RegexFaConstruction, not counting shared classes """
+    size = sys.getsizeof(node) + sys.getsizeof(node.__dict__) + sys.getsizeof(node.inputs) + \
+        sys.getsizeof(node.outputs) + sys.getsizeof(node.function) + sys.getsizeof(node._owners)
+    return size + sum(sys.getsizeof(port) for port in list(node.inputs) + list(node.outputs))
+
+
+def bench_memory(regexes=(r'[0-9]+:[0-9]+x', r'[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+', r'\d{2,4}-\w{3}')) -> None:
+    """ Compare the bytes per state of the node graph and of the compiled program """
+    print('{:>8} {:>10} {:>10}'.format('states', 'nodes', 'program'))
+    for regex in regexes:
+        nfa = regex_to_nfa(regex)
+        nodes = list(nfa.get_node_list())
+        program = compile_program(nfa)
+        print('{:>8} {:>9.0f}B {:>9.0f}B'.format(len(program), sum(node_size(n) for n in nodes) / len(nodes),
+                                                 program.nbytes() / len(program)))
+
+
+def bench_null_nodes(cases=((r'a*b*c*', 'a' * 20 + 'b' * 20), (r'(ab)+x*', 'ab' * 20 + 'x' * 20),
+                            (r'[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+', 'a.b' * 13 + '@' + 'a.b' * 13),
+                            (r'(a*a)*b', 'a' * 12 + 'b'), (r'(.*.)*$', 'ab1baaabac1')),
+                     repeat: int = 200) -> None:
+    """ Compare the programs compiled with and without null nodes: their instruction counts and the time of
+    a Pike VM search. The discrete-event engine keeps its null nodes, so its events are not compared """
+    print('{:>8} {:>10} {:>10} {:>10} {:>10}'.format('chars', 'states', 'no null', 'search', 'no null'))
+    for regex, text in cases:
+        sizes = []
+        times = []
+        for nfa in (regex_to_nfa(regex), eliminate_null_nodes(regex_to_nfa(regex))):
+            program = compile_program(nfa)
+            vm = PikeVm(program)
+            sizes.append(len(program))
+            times.append(timeit.timeit(lambda: vm.search(text), number=repeat) / repeat)
+        print('{:>8} {:>10} {:>10} {:>9.1f}us {:>9.1f}us'.format(len(text), *sizes, *(t * 1e6 for t in times)))
+
+
+def bench_minimize(regexes=(r'\d+(\.\d+)*', r'[a-z]+(-[a-z]+)*@x', r'\d+(:\d+)*x', r'(\w+)(-\w+)*(-\w+)*',
+                            r'[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+')) -> None:
+    """ Compare the DFA states and classes before and after minimization """
+    print('{:>8} {:>8} {:>8} {:>8}'.format('states', 'minimal', 'classes', 'minimal'))
+    for regex in regexes:
+        dfa = RegexDfa(compile_program(eliminate_null_nodes(regex_to_nfa(regex))))
+        classes = dfa.info().classes
+        before, after = dfa.minimize()
+        print('{:>8} {:>8} {:>8} {:>8}'.format(before, after, classes, dfa.info().classes))
+
+
+def bench_batch(rows: int = 20000, workers=(1, 2, 4), chunksize: int = 500) -> None:
+    """ Time search_many over rows of text in this process and on process pools of several sizes """
+    texts = ['{},user{}@mail{}.example.com,ok'.format(i, i * 7, i % 13) for i in range(rows)]
+    pattern = Pattern(r'[\w-]+@[\w-]+(\.[\w-]+)+', 'dfa')
+    print('{:>8} {:>10}'.format('workers', 'time'))
+    start = timeit.default_timer()
+    expected = list(pattern.search_many(texts))
+    print('{:>8} {:>9.4f}s'.format(0, timeit.default_timer() - start))
+    for count in workers:
+        with ProcessPoolExecutor(count) as executor:
+            start = timeit.default_timer()
+            assert list(pattern.search_many(texts, executor, chunksize)) == expected
+            print('{:>8} {:>9.4f}s'.format(count, timeit.default_timer() - start))
+
+
+def bench_split(lines: int = 20000, workers=(1, 2, 4), chunk_size: int = 1 << 18) -> None:
+    """ Time finditer over one large text sequentially and split into chunks on process pools of several sizes,
+    for a pattern with bounded matches and one with unbounded matches,
+    then over growing texts with one match that spans all the chunks """
+    text = ''.join('2024-01-{:02} host{} GET /api/items user={}@mail.example.com status=200\n'.format(
+        i % 28 + 1, i % 7, i) for i in range(lines))
+    print('{:>8} {:>10} {:>10}'.format('workers', 'bounded', 'unbounded'))
+    patterns = [Pattern(r'status=\d{3}', 'dfa'), Pattern(r'\w+@\w+(\.\w+)+', 'dfa')]
+    times = []
+    expected = []
+    for pattern in patterns:
+        start = timeit.default_timer()
+        expected.append(list(pattern.finditer(text)))
+        times.append(timeit.default_timer() - start)
+    print('{:>8} {}'.format(0, ' '.join('{:>9.4f}s'.format(t) for t in times)))
+    for count in workers:
+        times = []
+        with ProcessPoolExecutor(count) as executor:
+            for pattern, matches in zip(patterns, expected):
+                start = timeit.default_timer()
+                assert list(pattern.finditer(text, executor, chunk_size)) == matches
+                times.append(timeit.default_timer() - start)
+        print('{:>8} {}'.format(count, ' '.join('{:>9.4f}s'.format(t) for t in times)))
+    # a match that crosses every chunk boundary: the split scan must stay linear in the text length
+    print('{:>8} {:>10} {:>10}'.format('chars', 'sequential', 'split'))
+    pattern = Pattern(r'\w+@x')
+    with ProcessPoolExecutor(workers[-1]) as executor:
+        for size in (2000, 4000, 8000, 16000):
+            text = 'a' * size + '@x'
+            start = timeit.default_timer()
+            matches = list(pattern.finditer(text))
+            sequential = timeit.default_timer() - start
+            start = timeit.default_timer()
+            assert list(pattern.finditer(text, executor, 1000)) == matches
+            print('{:>8} {:>9.4f}s {:>9.4f}s'.format(size, sequential, timeit.default_timer() - start))
+
+
+benchmarks = {
+    'scheduler': bench_scheduler,
+    'search': bench_search,
+    'set': bench_set,
+    'memory': bench_memory,
+    'null': bench_null_nodes,
+    'minimize': bench_minimize,
+    'batch': bench_batch,
+    'split': bench_split,
+}
+
+if __name__ == '__main__':
+    logging.disable(logging.CRITICAL)
+    for name in sys.argv[1:] or benchmarks:
+        print('== {} =='.format(name))
+        benchmarks[name]()
@@ -0,0 +1,184 @@
+import functools
+import sys
+from bisect import bisect_right
+
+from common import Kind, set_member_t, empty_chars, arg_type
+
+ASCII_SIZE = 128
+
+
+class CharClass(object):
+    """ A set of characters compiled so that testing a character costs one lookup.
+    ASCII characters are looked up in a bitmap. Other characters are looked up in sorted code point ranges
+    and, for the '\\w' and '\\d' parts of a class, by their unicode category. Negation is folded into the
+    bitmap and applied once to the result for the other characters. """
+    __slots__ = ('bitmap', 'ranges', 'alpha', 'digit', 'decimals', 'negative', '_starts')
+
+    def __init__(self, bitmap: int = 0, ranges: tuple = (), alpha: bool = False, digit: bool = False,
+                 decimals: int = 0, negative: bool = False):
+        # bit k is set when chr(k) is in the class, with negation already applied
+        self.bitmap = bitmap
+        # sorted, disjoint (first, last) code points above ASCII
+        self.ranges = tuple(ranges)
+        # letters and digits above ASCII, as accepted by str.isalpha() and str.isdigit()
+        self.alpha = alpha
+        self.digit = digit
+        # bit k is set when decimal digits above ASCII with value k are in the class
+        self.decimals = decimals
+        self.negative = negative
+        self._starts = [first for first, _ in self.ranges]
+
+    def __repr__(self):
+        return "CharClass(bitmap={:#x}, ranges={}, alpha={}, digit={}, decimals={:#x}, negative={})".format(
+            self.bitmap, self.ranges, self.alpha, self.digit, self.decimals, self.negative)
+
+    def __eq__(self, other):
+        return isinstance(other, CharClass) and self._key() == other._key()
+
+    def __hash__(self):
+        return hash(self._key())
+
+    def _key(self) -> tuple:
+        return self.bitmap, self.ranges, self.alpha, self.digit, self.decimals, self.negative
+
+    def __contains__(self, ch: str) -> bool:
+        if ch < '\x80':
+            return self.bitmap >> ord(ch) & 1 == 1
+        code = ord(ch)
+        k = bisect_right(self._starts, code) - 1
+        found = (k >= 0 and code <= self.ranges[k][1]) or \
+                (self.alpha and ch.isalpha()) or \
+                (self.digit and ch.isdigit()) or \
+                (self.decimals != 0 and ch.isdecimal() and self.decimals >> int(ch) & 1 == 1)
+        return found != self.negative
+
+
+def non_ascii_signatures(classes: list) -> set:
+    """ Get every tuple of membership flags in classes that a character above ASCII can have.
+    Such a character is tested against the ranges, which are constant between their bounds, and against its
+    letter, digit and decimal properties, so each gap between bounds is tried with each set of properties.
+    Property sets no character has may add signatures that never occur, but no occurring one is missed """
+    bounds = {ASCII_SIZE}
+    for char_class in classes:
+        for first, last in char_class.ranges:
+            bounds.update((first, last + 1))
+    properties = [(alpha, digit, decimal) for alpha in (False, True)
+                  for digit, decimal in [(False, None), (True, None)] + [(True, value) for value in range(10)]]
+    signatures = set()
+    for code in bounds:
+        if code > sys.maxunicode:
+            continue
+        in_ranges = []
+        for char_class in classes:
+            k = bisect_right(char_class._starts, code) - 1
+            in_ranges.append(k >= 0 and code <= char_class.ranges[k][1])
+        for alpha, digit, decimal in properties:
+            signatures.add(tuple((in_range or (alpha and c.alpha) or (digit and c.digit) or
+                                  (decimal is not None and c.decimals >> decimal & 1 == 1)) != c.negative
+                                 for c, in_range in zip(classes, in_ranges)))
+    return signatures
+
+
+def token_contains(member: set_member_t, ch: str) -> bool:
+    """ Determine whether a charset member from charset_parser accepts a character """
+    kind, value = member
+    if kind == Kind.NORMAL:
+        return value == ch
+    if kind == Kind.TRANS:
+        if value == 'w':
+            return ch.isalpha() or ch.isdigit() or ch == '_'
+        if value == 's':
+            return ch in empty_chars
+        return ch.isdigit()
+    l, r = value
+    if kind == Kind.ALPHA_RANGE:
+        return ch.isalpha() and l <= ch <= r
+    return ch.isdigit() and l <= int(ch) <= r
+
+
+def ascii_bits(predicate) -> int:
+    """ Get the bitmap of the ASCII characters that satisfy predicate """
+    return sum(1 << code for code in range(ASCII_SIZE) if predicate(chr(code)))
+
+
+def span_bits(first: int, last: int) -> int:
+    """ Get the bitmap of the ASCII codes from first to last """
+    last = min(last, ASCII_SIZE - 1)
+    if last < first:
+        return 0
+    return (1 << last + 1) - (1 << first)
+
+
+ASCII_ALPHA = ascii_bits(str.isalpha)
+ASCII_DIGIT = ascii_bits(str.isdigit)
+TRANS_BITS = {'w': ASCII_ALPHA | ASCII_DIGIT | 1 << ord('_'), 's': ascii_bits(lambda ch: ch in empty_chars),
+              'd': ASCII_DIGIT}
+
+
+def merge_ranges(codes: list) -> tuple:
+    """ Turn code points into sorted, disjoint (first, last) ranges """
+    ranges: list = []
+    for code in sorted(set(codes)):
+        if ranges and ranges[-1][1] + 1 == code:
+            ranges[-1][1] = code
+        else:
+            ranges.append([code, code])
+    return tuple((first, last) for first, last in ranges)
+
+
+@arg_type(0, list)
+def charset_class(charset: list, negative: bool = False) -> CharClass:
+    """ Compile the set_member_t list of a '[]' charset into a character class """
+    return compile_members(tuple(charset), negative)
+
+
+@functools.lru_cache(maxsize=1024)
+def compile_members(charset: tuple, negative: bool) -> CharClass:
+    """ charset_class() for a tuple of members, cached since patterns repeat the same charsets.
+    The bitmap is built from the members with bit operations, and only ranges reaching above ASCII
+    look at the characters one by one """
+    bitmap = 0
+    codes = []
+    alpha = False
+    digit = False
+    decimals = 0
+    for kind, value in charset:
+        if kind == Kind.NORMAL:
+            code = ord(value)
+            if code < ASCII_SIZE:
+                bitmap |= 1 << code
+            else:
+                codes.append(code)
+        elif kind == Kind.TRANS:
+            bitmap |= TRANS_BITS[value]
+            if value == 'w':
+                alpha = digit = True
+            elif value == 'd':
+                digit = True
+        elif kind == Kind.ALPHA_RANGE:
+            l, r = ord(value[0]), ord(value[1])
+            bitmap |= span_bits(l, r) & ASCII_ALPHA
+            codes.extend(code for code in range(max(l, ASCII_SIZE), r + 1) if chr(code).isalpha())
+        else:
+            l, r = value
+            bitmap |= span_bits(ord('0') + l, ord('0') + r)
+            for k in range(l, r + 1):
+                decimals |= 1 << k
+    if negative:
+        bitmap ^= (1 << ASCII_SIZE) - 1
+    return CharClass(bitmap, merge_ranges(codes), alpha, digit, decimals, negative)
+
+
+@arg_type(0, str)
+def literal_class(ch: str) -> CharClass:
+    """ Compile a single character into a character class """
+    return compile_members((set_member_t(Kind.NORMAL, ch),), False)
+
+
+WORD = charset_class([set_member_t(Kind.TRANS, 'w')])
+SPACE = charset_class([set_member_t(Kind.TRANS, 's')])
+DIGIT = charset_class([set_member_t(Kind.TRANS, 'd')])
+ALPHA = CharClass(ASCII_ALPHA, alpha=True)
+# '.' accepts anything but a line feed
+ANY = charset_class([set_member_t(Kind.NORMAL, '\n')], negative=True)
+ALL = CharClass((1 << ASCII_SIZE) - 1, negative=True)
@@ -1,3 +1,5 @@
+import functools
+from collections import namedtuple
 from typing import Union
 
 empty_chars = ['\n', '\t', '\r', '\f']
@@ -15,6 +17,39 @@ class Kind:
     NEG_SET = 'neg-charset'
     ALPHA_RANGE = 'alpha_range'
     DIGIT_RANGE = 'digit_range'
+    COUNT_PUSH = 'count_push'
+    COUNT_LOOP = 'count_loop'
+    COUNT_INC = 'count_inc'
+    COUNT_EXIT = 'count_exit'
+
+
+# a member of a '[]' charset: kind is a Kind and value the character, the letter of a '\\w', '\\s' or '\\d' class,
+# or the (first, last) bounds of a range, letters for Kind.ALPHA_RANGE and digit values for Kind.DIGIT_RANGE
+set_member_t = namedtuple("set_member_t", "kind value")
+
+
+class Trace:
+    """ Switch for the verbose tracing of NFA construction and of every simulated event.
+    Off by default, so the matching hot path formats no log messages """
+    enabled: bool = False
+
+
+def set_trace(enabled: bool = True) -> None:
+    """ Turn the verbose tracing on or off. Messages go to the 'discrete_event' and
+    'regex_fa_construction' loggers at INFO level, configure logging to see them """
+    Trace.enabled = enabled
+
+
+class Validation:
+    """ Switch for the argument checks of arg_type, arg_callable and element_type.
+    On by default. The checks sit on public entry points and on NFA construction, never in the matching
+    loops, so turning them off only saves the isinstance calls at those boundaries """
+    enabled: bool = True
+
+
+def set_validation(enabled: bool = True) -> None:
+    """ Turn the argument checks of the decorated functions on or off """
+    Validation.enabled = enabled
 
 
 def arg_type(arg_index: Union[int, list], arg_type):
@@ -22,7 +57,10 @@ def arg_type(arg_index: Union[int, list], arg_type):
     lst_type = [arg_type] if not isinstance(arg_type, list) else arg_type
 
     def trace(f):
+        @functools.wraps(f)
         def traced(*args, **kwargs):
+            if not Validation.enabled:
+                return f(*args, **kwargs)
             flag: bool = True
             arg = None
             tp = None
@@ -42,8 +80,9 @@ def arg_type(arg_index: Union[int, list], arg_type):
 
 def arg_callable(arg_index: int):
     def trace(f):
+        @functools.wraps(f)
         def traced(*args, **kwargs):
-            if callable(args[arg_index]):
+            if not Validation.enabled or callable(args[arg_index]):
                 return f(*args, **kwargs)
             else:
                 raise TypeError('The type of argument {} is not callable'.format(args[arg_index]))
@@ -55,7 +94,10 @@ def arg_callable(arg_index: int):
 
 def element_type(arg_index: int, elem_type):
     def trace(f):
+        @functools.wraps(f)
         def traced(*args, **kwargs):
+            if not Validation.enabled:
+                return f(*args, **kwargs)
             for elem in args[arg_index]:
                 if not isinstance(elem, elem_type):
                     raise TypeError('The type of element in list must be {} type'.format(elem_type))
@@ -1,12 +1,14 @@
 import logging
 from typing import Tuple, Union
-from common import arg_callable, arg_type
+from common import arg_callable, arg_type, Trace
 
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
-
-from collections import OrderedDict, namedtuple
+from collections import OrderedDict, deque, namedtuple
 import copy
+import heapq
+import itertools
+import weakref
+
+logger = logging.getLogger(__name__)
 
 event = namedtuple("event", "clock node var val")
 source_event = namedtuple("source_event", "var val latency")
@@ -20,21 +22,49 @@ class Node(object):
         self.name = name
         self.inputs: OrderedDict = OrderedDict()
         self.outputs: OrderedDict = OrderedDict()
+        # the DiscreteEvents whose port index lists this node
+        self._owners: weakref.WeakSet = weakref.WeakSet()
 
     def __repr__(self):
         return "{} inputs: {} outputs: {}".format(self.name, self.inputs, self.outputs)
 
-    @arg_type(1, str)
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_owners']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._owners = weakref.WeakSet()
+
     def input(self, name: str, latency: int = 1) -> None:
         assert name not in self.inputs
         self.inputs[name] = latency
+        for owner in self._owners:
+            owner._index_input(self, name)
 
-    @arg_type(1, str)
     def output(self, name: str, latency: int = 1) -> None:
         assert name not in self.outputs
         self.outputs[name] = latency
+        for owner in self._owners:
+            owner._index_output(self, name)
+
+    def rename_input(self, old: str, new: str, latency: int = None) -> None:
+        """ Move the input port old to new, keeping its latency unless another one is given """
+        old_latency = self.inputs.pop(old)
+        self.inputs[new] = old_latency if latency is None else latency
+        for owner in self._owners:
+            owner._unindex_input(self, old)
+            owner._index_input(self, new)
+
+    def rename_output(self, old: str, new: str, latency: int = None) -> None:
+        """ Move the output port old to new, keeping its latency unless another one is given """
+        old_latency = self.outputs.pop(old)
+        self.outputs[new] = old_latency if latency is None else latency
+        for owner in self._owners:
+            owner._unindex_output(self, old)
+            owner._index_output(self, new)
 
-    @arg_type(1, dict)
     def activate(self, state: dict) -> list:
         args = []
 
@@ -59,15 +89,144 @@ class Node(object):
         return output_events
 
 
+class ListScheduler(object):
+    """ Keep pending events in a list and sort it on every pop. O(n log n) per event """
+
+    def __init__(self):
+        self.events: list = []
+
+    def __len__(self):
+        return len(self.events)
+
+    def push(self, e: event) -> None:
+        self.events.append(e)
+
+    def pop(self) -> event:
+        assert len(self.events) > 0
+        self.events = sorted(self.events, key=lambda e: e.clock)
+        return self.events.pop(0)
+
+
+class HeapScheduler(object):
+    """ Keep pending events in a binary heap. O(log n) per event """
+
+    def __init__(self):
+        self.events: list = []
+        # events with the same clock leave in the order they arrived, like with a stable sort
+        self._seq = itertools.count()
+
+    def __len__(self):
+        return len(self.events)
+
+    def push(self, e: event) -> None:
+        heapq.heappush(self.events, (e.clock, next(self._seq), e))
+
+    def pop(self) -> event:
+        assert len(self.events) > 0
+        return heapq.heappop(self.events)[2]
+
+
+class BucketScheduler(object):
+    """ Keep pending events in one FIFO bucket per integer clock, with a heap of the clocks in use.
+    Events that share a clock cost O(1), so fan-out to many nodes is cheap """
+
+    def __init__(self):
+        self.buckets: dict = {}
+        self.clocks: list = []
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def push(self, e: event) -> None:
+        bucket = self.buckets.get(e.clock)
+        if bucket is None:
+            bucket = self.buckets[e.clock] = deque()
+            heapq.heappush(self.clocks, e.clock)
+        bucket.append(e)
+        self._size += 1
+
+    def pop(self) -> event:
+        assert self._size > 0
+        clock = self.clocks[0]
+        bucket = self.buckets[clock]
+        e = bucket.popleft()
+        if not bucket:
+            heapq.heappop(self.clocks)
+            del self.buckets[clock]
+        self._size -= 1
+        return e
+
+
+schedulers = {
+    'list': ListScheduler,
+    'heap': HeapScheduler,
+    'bucket': BucketScheduler,
+}
+
+
+class History:
+    """ What DiscreteEvent.execute records about a run """
+    OFF = 'off'  # nothing
+    RING = 'ring'  # the last history_size steps
+    DELTA = 'delta'  # every step, storing only the variable that changed
+    FULL = 'full'  # every step with a copy of the whole state
+
+
 class DiscreteEvent(object):
     @arg_type(1, str)
-    def __init__(self, name: str = "anonymous"):
+    def __init__(self, name: str = "anonymous", scheduler: str = 'heap', history: str = History.FULL,
+                 history_size: int = 100):
+        if scheduler not in schedulers:
+            raise ValueError('Unknown scheduler {}, expected one of {}'.format(scheduler, list(schedulers)))
         self.name = name
+        self.scheduler = scheduler
         self.inputs: OrderedDict = OrderedDict()
         self.outputs: OrderedDict = OrderedDict()
         self.nodes: list = []
-        self.state_history: list = []
-        self.event_history: list = []
+        self.set_history(history, history_size)
+        # port name -> (node, latency) pairs that consume it, and nodes that produce it, in node order
+        self._consumers: dict = {}
+        self._producers: dict = {}
+        self._positions: dict = {}
+        # number of events processed by the last run
+        self.steps = 0
+
+    @arg_type(1, str)
+    def set_history(self, history: str, history_size: int = 100) -> None:
+        """ Choose what the following runs record in state_history and event_history """
+        if history not in (History.OFF, History.RING, History.DELTA, History.FULL):
+            raise ValueError('Unknown history policy {}'.format(history))
+        if history == History.RING and history_size < 1:
+            raise ValueError('The size of a ring history must be positive')
+        self.history = history
+        self.history_size = history_size
+        self._reset_history()
+
+    def _reset_history(self) -> None:
+        if self.history == History.RING:
+            self._state_history: Union[list, deque] = deque(maxlen=self.history_size)
+            self._event_history: Union[list, deque] = deque(maxlen=self.history_size)
+        else:
+            self._state_history = []
+            self._event_history = []
+
+    @property
+    def state_history(self) -> list:
+        """ (clock, state) pairs of the last run, as far as the history policy kept them """
+        if self.history != History.DELTA:
+            return list(self._state_history)
+        res = []
+        state: dict = {}
+        for clock, delta in self._state_history:
+            state.update(delta)
+            res.append((clock, copy.copy(state)))
+        return res
+
+    @property
+    def event_history(self) -> list:
+        """ Events processed in the last run, as far as the history policy kept them """
+        return list(self._event_history)
 
     @arg_type(1, str)
     def input_port(self, name: str, latency: int = 1) -> None:
@@ -77,15 +236,61 @@ class DiscreteEvent(object):
     def output_port(self, name: str, latency: int = 1) -> None:
         self.outputs[name] = latency
 
-    @arg_type(1, str)
     def add_node(self, name: str, function) -> Node:
         node = Node(name, function)
-        self.nodes.append(node)
+        self.add_nodes([node])
         return node
 
-    @arg_type(2, int)
+    def add_nodes(self, nodes: list) -> None:
+        """ Add nodes to the simulation. A node that is already in it is skipped, so it is visited once """
+        for node in nodes:
+            if node in self._positions:
+                continue
+            self.nodes.append(node)
+            self._positions[node] = len(self.nodes) - 1
+            node._owners.add(self)
+            for port in node.inputs:
+                self._index_input(node, port)
+            for port in node.outputs:
+                self._index_output(node, port)
+
+    def consumers(self, port: str) -> list:
+        """ Get the (node, latency) pairs that take port as input """
+        return self._consumers.get(port, [])
+
+    def producers(self, port: str) -> list:
+        """ Get the nodes that write to port """
+        return self._producers.get(port, [])
+
+    def _index_input(self, node: Node, port: str) -> None:
+        lst = [c for c in self._consumers.get(port, []) if c[0] is not node]
+        lst.append((node, node.inputs[port]))
+        lst.sort(key=lambda c: self._positions[c[0]])
+        self._consumers[port] = lst
+
+    def _unindex_input(self, node: Node, port: str) -> None:
+        lst = [c for c in self._consumers.get(port, []) if c[0] is not node]
+        if lst:
+            self._consumers[port] = lst
+        else:
+            self._consumers.pop(port, None)
+
+    def _index_output(self, node: Node, port: str) -> None:
+        lst = [n for n in self._producers.get(port, []) if n is not node]
+        lst.append(node)
+        lst.sort(key=lambda n: self._positions[n])
+        self._producers[port] = lst
+
+    def _unindex_output(self, node: Node, port: str) -> None:
+        lst = [n for n in self._producers.get(port, []) if n is not node]
+        if lst:
+            self._producers[port] = lst
+        else:
+            self._producers.pop(port, None)
+
     def _source_events2events(self, source_events: Union[list, tuple], clock: int) -> list:
-        logging.info('_source_events2events. clock: {}'.format(clock))
+        if Trace.enabled:
+            logger.info('_source_events2events. clock: {}'.format(clock))
         events = []
         for se in source_events:
             source_latency = clock + se.latency + self.inputs.get(se.var, 0)
@@ -96,28 +301,26 @@ class DiscreteEvent(object):
                     node=None,
                     var=se.var,
                     val=se.val))
-                logging.info('_source_events2events. event: {}'.format(event(clock=source_latency + target_latency,
-                                                                             node=None, var=se.var, val=se.val)))
-            for node in self.nodes:
-                if se.var in node.inputs:
-                    target_latency = node.inputs[se.var]
-                    events.append(event(
-                        clock=clock + source_latency + target_latency,
-                        node=node,
-                        var=se.var,
-                        val=se.val))
-                    logging.info(
+                if Trace.enabled:
+                    logger.info('_source_events2events. event: {}'.format(event(clock=source_latency + target_latency,
+                                                                                node=None, var=se.var, val=se.val)))
+            for node, target_latency in self._consumers.get(se.var, ()):
+                events.append(event(
+                    clock=clock + source_latency + target_latency,
+                    node=node,
+                    var=se.var,
+                    val=se.val))
+                if Trace.enabled:
+                    logger.info(
                         '_source_events2events. event: {}'.format(event(clock=clock + source_latency + target_latency,
                                                                         node=node, var=se.var, val=se.val)))
         return events
 
-    @arg_type(1, list)
-    def _pop_next_event(self, events: list) -> Tuple[event, list]:
-        assert len(events) > 0
-        events = sorted(events, key=lambda e: e.clock)
-        event = events.pop(0)
-        logging.info('_pop_next_event. event: {}'.format(event))
-        return event, events
+    def _pop_next_event(self, queue) -> event:
+        event = queue.pop()
+        if Trace.enabled:
+            logger.info('_pop_next_event. event: {}'.format(event))
+        return event
 
     def _state_initialize(self) -> dict:
         env: dict = {}
@@ -125,18 +328,23 @@ class DiscreteEvent(object):
             env[var] = None
         return env
 
-    def execute(self, *source_events: Union[tuple, list], limit: int = 10000) -> dict:
-        events: list = []
+    def execute(self, *source_events: Union[tuple, list], limit: int = 10000, stop=None) -> dict:
+        queue = schedulers[self.scheduler]()
+        self.steps = 0
         state = self._state_initialize()
         state_record = self._state_initialize()
         clock = 0
-        self.state_history = [(clock, copy.copy(state))]
-        while (len(events) > 0 or len(source_events) > 0) and limit > 0:
+        self._reset_history()
+        record = self.history != History.OFF
+        if record:
+            self._state_history.append((clock, copy.copy(state)))
+        while (len(queue) > 0 or len(source_events) > 0) and limit > 0:
             limit -= 1
-            new_events = self._source_events2events(source_events, clock)
-            events.extend(new_events)
-            if len(events) == 0: break
-            event, events = self._pop_next_event(events)
+            for new_event in self._source_events2events(source_events, clock):
+                queue.push(new_event)
+            if len(queue) == 0: break
+            event = self._pop_next_event(queue)
+            self.steps += 1
             state.clear()
             state[event.var] = event.val
             clock = event.clock
@@ -145,12 +353,17 @@ class DiscreteEvent(object):
                 source_events = event.node.activate(state)
             else:
                 source_events = [] # type: ignore
-            logging.info('execute. state: {}'.format(state))
+            if Trace.enabled:
+                logger.info('execute. state: {}'.format(state))
             state_record.update(state)
-            self.state_history.append((clock, copy.copy(state_record)))
-            self.event_history.append(event)
-            if 'Output' in state_record and state_record['Output'] == '': break
-        if limit == 0: print("limit reached")
+            if record:
+                if self.history == History.DELTA:
+                    self._state_history.append((clock, copy.copy(state)))
+                else:
+                    self._state_history.append((clock, copy.copy(state_record)))
+                self._event_history.append(event)
+            if stop is not None and stop(state_record): break
+        if limit == 0: logger.warning('{} reached the event limit'.format(self.name))
         return state_record
 
     def visualize(self) -> str:
@@ -0,0 +1,381 @@
+import threading
+from collections import namedtuple
+from typing import Optional, Union
+
+from regex_fa_construction import RegexFaConstruction
+from regex_program import Op, Program, compile_program
+from char_class import non_ascii_signatures
+from common import arg_type
+
+DEFAULT_MAX_STATES = 10000
+DEFAULT_CACHE_STATES = 1000
+
+dfa_info_t = namedtuple("dfa_info_t", "states classes states_built flushes max_states states_unminimized")
+
+
+class DfaSizeError(Exception):
+    """ Raised when subset construction needs more states than the DFA is allowed to have """
+
+
+class RegexDfa(object):
+    """ Deterministic automaton built from a compiled program by subset construction.
+    A DFA state is a set of threads, a thread being a program state with the counters of its counted repeats.
+    Characters are grouped into classes by the set of character classes that accept them,
+    so the transition table has one integer column per class instead of one per character. """
+
+    @arg_type(1, (Program, RegexFaConstruction))
+    def __init__(self, program: Union[Program, RegexFaConstruction], max_states: int = DEFAULT_MAX_STATES):
+        if isinstance(program, RegexFaConstruction):
+            program = compile_program(program)
+        self.program = program
+        self.max_states = max_states
+        # states with equal character classes share an operand, so each distinct class
+        # is tested once per character
+        self._predicates: list = program.classes
+
+        self.table: list = []
+        self.accept: list = []
+        self.accept_end: list = []
+        self._state_sets: list = []
+        self._state_ids: dict = {}
+        self._pending: list = []
+        self._signatures: list = []
+        self._class_ids: dict = {}
+        self._class_of: dict = {}
+        self._lock = threading.RLock()
+        self.states_built = 0
+        self.flushes = 0
+        # the number of states before the last minimization, or None
+        self.states_unminimized: Optional[int] = None
+
+        self.dead = self._add_state((frozenset(), False, False))
+        self.start = self._add_state(self._closure([(program.start, ())]))
+        self._fill()
+        for code in range(128):
+            self._new_char(chr(code))
+
+    def __len__(self):
+        return len(self.table)
+
+    def info(self) -> dfa_info_t:
+        """ Get the size of the automaton and how many states were built so far """
+        return dfa_info_t(len(self.table), len(self._signatures), self.states_built, self.flushes, self.max_states,
+                          self.states_unminimized)
+
+    def _closure(self, threads) -> tuple:
+        """ Follow split, end and counted repeat states from threads, (state, counters) pairs,
+        and return the key of the resulting DFA state: the threads on CHAR states,
+        whether MATCH is reached, and whether it is reached at the end of text """
+        program = self.program
+        ops = program.ops
+        steps = set()
+        accept = False
+        accept_end = False
+        seen = set()
+        stack = [(pc, counters, False) for pc, counters in threads]
+        while stack:
+            thread = stack.pop()
+            if thread in seen:
+                continue
+            seen.add(thread)
+            pc, counters, at_end = thread
+            op = ops[pc]
+            if op == Op.MATCH:
+                if at_end:
+                    accept_end = True
+                else:
+                    accept = True
+            elif op == Op.SPLIT:
+                stack.extend((t, counters, at_end) for t in program.targets(pc))
+            elif op == Op.END:
+                stack.extend((t, counters, True) for t in program.targets(pc))
+            elif op >= Op.PUSH:
+                counters = program.count(pc, counters)
+                if counters is not None:
+                    stack.extend((t, counters, at_end) for t in program.targets(pc))
+            elif not at_end:
+                steps.add((pc, counters))
+        return frozenset(steps), accept, accept or accept_end
+
+    def _add_state(self, key: tuple) -> int:
+        state = self._state_ids.get(key)
+        if state is not None:
+            return state
+        if len(self.table) >= self.max_states:
+            raise DfaSizeError('The DFA needs more than {} states'.format(self.max_states))
+        state = len(self.table)
+        self.states_built += 1
+        self._state_ids[key] = state
+        self._state_sets.append(key[0])
+        self.accept.append(key[1])
+        self.accept_end.append(key[2])
+        self.table.append([None] * len(self._signatures))
+        self._pending.append(state)
+        return state
+
+    def _move(self, state: int, cls: int) -> int:
+        signature = self._signatures[cls]
+        threads = self._step(state, signature)
+        if not threads:
+            return self.dead
+        return self._add_state(self._closure(threads))
+
+    def _step(self, state: int, signature: tuple) -> list:
+        """ Get the threads that follow the CHAR states of a DFA state whose class is in signature """
+        program = self.program
+        operands = program.operands
+        threads = []
+        for pc, counters in self._state_sets[state]:
+            if signature[operands[pc]]:
+                threads.extend((t, counters) for t in program.targets(pc))
+        return threads
+
+    def _fill(self) -> None:
+        """ Compute the missing rows of newly created states """
+        while self._pending:
+            state = self._pending.pop()
+            row = self.table[state]
+            for cls in range(len(row)):
+                if row[cls] is None:
+                    row[cls] = self._move(state, cls)
+
+    def _new_char(self, ch: str) -> int:
+        """ Assign a character to its class, adding a column to the table if the class is new """
+        with self._lock:
+            cls = self._class_of.get(ch)
+            if cls is not None:
+                return cls
+            cls = self._add_class(tuple(ch in char_class for char_class in self._predicates))
+            self._class_of[ch] = cls
+            return cls
+
+    def _add_class(self, signature: tuple) -> int:
+        """ Get the class of the characters with the given signature, adding a column to the table if it is new """
+        cls = self._class_ids.get(signature)
+        if cls is None:
+            cls = len(self._signatures)
+            self._signatures.append(signature)
+            for row in self.table:
+                row.append(None)
+            self._pending.extend(range(len(self.table)))
+            self._fill()
+            self._class_ids[signature] = cls
+        return cls
+
+    def minimize(self) -> tuple:
+        """ Merge equivalent states by Hopcroft's partition refinement and return the state counts before and after.
+        The classes of characters above ASCII are added first, so that states are only merged
+        when no character tells them apart and the table needs no new column later.
+        Classes whose columns become equal are merged too """
+        with self._lock:
+            for signature in non_ascii_signatures(self._predicates):
+                self._add_class(signature)
+            table = self.table
+            before = len(table)
+            columns = len(self._signatures)
+            inverse = [[[] for _ in range(before)] for _ in range(columns)]
+            for state, row in enumerate(table):
+                for cls, nxt in enumerate(row):
+                    inverse[cls][nxt].append(state)
+
+            groups: dict = {}
+            for state in range(before):
+                groups.setdefault((self.accept[state], self.accept_end[state]), []).append(state)
+            blocks = []
+            block_of = [0] * before
+            for members in groups.values():
+                for state in members:
+                    block_of[state] = len(blocks)
+                blocks.append(set(members))
+            pending = set(range(len(blocks)))
+            while pending:
+                splitter = list(blocks[pending.pop()])
+                for cls in range(columns):
+                    touched: dict = {}
+                    for nxt in splitter:
+                        for state in inverse[cls][nxt]:
+                            touched.setdefault(block_of[state], []).append(state)
+                    for block, inside in touched.items():
+                        if len(inside) == len(blocks[block]):
+                            continue
+                        part = set(inside)
+                        blocks[block] -= part
+                        new = len(blocks)
+                        blocks.append(part)
+                        for state in part:
+                            block_of[state] = new
+                        if block in pending or len(part) <= len(blocks[block]):
+                            pending.add(new)
+                        else:
+                            pending.add(block)
+
+            # number the blocks by their first state, so the dead and start states keep their order
+            ids: dict = {}
+            representatives = []
+            for state in range(before):
+                if block_of[state] not in ids:
+                    ids[block_of[state]] = len(representatives)
+                    representatives.append(state)
+            rows = [[ids[block_of[nxt]] for nxt in table[state]] for state in representatives]
+            merged: dict = {}
+            column_of = [merged.setdefault(tuple(row[cls] for row in rows), len(merged)) for cls in range(columns)]
+            firsts = {}
+            for cls in range(columns):
+                firsts.setdefault(column_of[cls], cls)
+            self.table = [[row[firsts[k]] for k in range(len(merged))] for row in rows]
+            self._signatures = [self._signatures[firsts[k]] for k in range(len(merged))]
+            self._class_ids = {signature: column_of[cls] for signature, cls in self._class_ids.items()}
+            self._class_of = {ch: column_of[cls] for ch, cls in self._class_of.items()}
+            self.accept = [self.accept[state] for state in representatives]
+            self.accept_end = [self.accept_end[state] for state in representatives]
+            self._state_sets = [self._state_sets[state] for state in representatives]
+            self._state_ids = {(self._state_sets[i], self.accept[i], self.accept_end[i]): i
+                               for i in range(len(representatives))}
+            self.dead = ids[block_of[self.dead]]
+            self.start = ids[block_of[self.start]]
+            self.states_unminimized = before
+            return before, len(self.table)
+
+    def _lazy_move(self, state: int, cls: int) -> int:
+        """ Compute a transition that is not in the table yet """
+        with self._lock:
+            nxt = self._move(state, cls)
+            self.table[state][cls] = nxt
+            return nxt
+
+    def match_at(self, text: str, pos: int = 0) -> Optional[int]:
+        """ Run the DFA from position pos and return the end of the longest match, or None """
+        table = self.table
+        accept = self.accept
+        class_of = self._class_of
+        dead = self.dead
+        state = self.start
+        end = pos if accept[state] else None
+        for i in range(pos, len(text)):
+            cls = class_of.get(text[i])
+            if cls is None:
+                cls = self._new_char(text[i])
+            nxt = table[state][cls]
+            if nxt is None:
+                nxt = self._lazy_move(state, cls)
+                table = self.table
+                accept = self.accept
+            state = nxt
+            if state == dead:
+                return end
+            if accept[state]:
+                end = i + 1
+        if self.accept_end[state]:
+            end = len(text)
+        return end
+
+    def _run(self, text: str, pos: int, at_end: bool) -> tuple:
+        """ match_at() for text that may go on after its end, the end of text anchor holding there only when at_end
+        is set. Return the end of the longest match, or None, and whether the run was still alive at the end """
+        table = self.table
+        accept = self.accept
+        class_of = self._class_of
+        dead = self.dead
+        state = self.start
+        end = pos if accept[state] else None
+        for i in range(pos, len(text)):
+            cls = class_of.get(text[i])
+            if cls is None:
+                cls = self._new_char(text[i])
+            nxt = table[state][cls]
+            if nxt is None:
+                nxt = self._lazy_move(state, cls)
+                table = self.table
+                accept = self.accept
+            state = nxt
+            if state == dead:
+                return end, False
+            if accept[state]:
+                end = i + 1
+        if at_end and self.accept_end[state]:
+            end = len(text)
+        return end, True
+
+    def scan(self, text: str, stop: int, at_end: bool, prefix: str = '') -> tuple:
+        """ Search for non-overlapping matches from position 0 like repeated match_at() calls, trying the starts
+        before stop. text may go on past stop; at_end tells whether it ends where the whole text does.
+        If not, a run alive at the end of text leaves its start undecided, and the search stops there.
+        Return the matches found and the undecided start, or stop. Starts that do not begin with prefix are skipped """
+        with self._lock:
+            matches = []
+            length = len(text)
+            i = 0
+            while i < stop:
+                if prefix:
+                    found = text.find(prefix, i, stop + len(prefix) - 1)
+                    if found == -1:
+                        # the text that follows decides the starts too close to the end to hold the prefix
+                        found = max(i, length - len(prefix) + 1)
+                        if at_end or found >= stop:
+                            break
+                        return matches, found
+                    i = found
+                end, alive = self._run(text, i, at_end)
+                if alive and not at_end:
+                    return matches, i
+                if end is None:
+                    i += 1
+                else:
+                    matches.append((i, end))
+                    i = end if end > i else end + 1
+            return matches, stop
+
+
+class LazyDfa(RegexDfa):
+    """ DFA whose states are built only when the input reaches them.
+    At most max_states states are cached; when the cache is full it is flushed and rebuilt on demand,
+    so pathological patterns cost no more memory than the budget allows. """
+
+    @arg_type(1, (Program, RegexFaConstruction))
+    def __init__(self, program: Union[Program, RegexFaConstruction], max_states: int = DEFAULT_CACHE_STATES):
+        if max_states < 3:
+            raise ValueError('The state cache of a lazy DFA must hold at least 3 states')
+        super().__init__(program, max_states)
+
+    def _fill(self) -> None:
+        self._pending.clear()
+
+    def minimize(self) -> tuple:
+        raise ValueError('A lazy DFA is built on demand and cannot be minimized')
+
+    def _flush(self) -> None:
+        """ Forget every cached state except the dead and start states """
+        start_key = (self._state_sets[self.start], self.accept[self.start], self.accept_end[self.start])
+        dead_key = (frozenset(), False, False)
+        self.table = []
+        self.accept = []
+        self.accept_end = []
+        self._state_sets = []
+        self._state_ids = {}
+        self.flushes += 1
+        self.dead = self._add_state(dead_key)
+        self.start = self._add_state(start_key)
+
+    def _lazy_move(self, state: int, cls: int) -> int:
+        with self._lock:
+            signature = self._signatures[cls]
+            threads = self._step(state, signature)
+            if not threads:
+                nxt = self.table[state][cls] = self.dead
+            else:
+                key = self._closure(threads)
+                if key not in self._state_ids and len(self.table) >= self.max_states:
+                    # the state we come from is flushed too, but the caller only needs the new one
+                    self._flush()
+                    nxt = self._add_state(key)
+                else:
+                    nxt = self._add_state(key)
+                    self.table[state][cls] = nxt
+            self._pending.clear()
+            return nxt
+
+    def match_at(self, text: str, pos: int = 0) -> Optional[int]:
+        """ Run the DFA from position pos and return the end of the longest match, or None """
+        # a flush renumbers the states, so runs on the same automaton must not interleave
+        with self._lock:
+            return super().match_at(text, pos)
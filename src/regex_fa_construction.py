@@ -1,32 +1,111 @@
 import logging
 from typing import Optional, Iterable
 
-logging.basicConfig(level=logging.DEBUG,
-                    format='%(asctime)s - %(filename)s[line:%(lineno)d] - %(levelname)s: %(message)s')
+from discrete_event import DiscreteEvent, Node, History, source_event
+from common import Kind, element_type, arg_type, Trace
+from char_class import CharClass, charset_class, literal_class, WORD, SPACE, DIGIT, ALPHA, ANY, ALL
 
-from discrete_event import DiscreteEvent, Node, source_event
-from common import empty_chars, Kind, element_type, arg_type
+logger = logging.getLogger(__name__)
+
+
+class Cursor(object):
+    """ A position in the text being matched. Nodes pass cursors instead of the rest of the text,
+    so consuming a character costs O(1) instead of copying the remaining input.
+    counters holds the iteration counts of the counted repeats the cursor is inside, innermost last """
+    __slots__ = ('text', 'pos', 'counters')
+
+    def __init__(self, text: str, pos: int = 0, counters: tuple = ()):
+        self.text = text
+        self.pos = pos
+        self.counters = counters
+
+    def __repr__(self):
+        if self.counters:
+            return "Cursor({}, counters={})".format(self.pos, self.counters)
+        return "Cursor({})".format(self.pos)
+
+    def peek(self) -> Optional[str]:
+        """ Get the character under the cursor, or None at the end of text """
+        return self.text[self.pos] if self.pos < len(self.text) else None
+
+    def advance(self) -> 'Cursor':
+        """ Get a cursor pointing at the next character """
+        return Cursor(self.text, self.pos + 1, self.counters)
+
+    def at_end(self) -> bool:
+        """ Determine whether the cursor is at the end of text """
+        return self.pos >= len(self.text)
+
+
+def char_step(char_class: CharClass):
+    """ Build the function of a node that consumes one character of char_class.
+    The class is kept on the function so that other engines can test characters without a cursor """
+
+    def function(cursor: Optional[Cursor]) -> Optional[Cursor]:
+        if cursor is None: return None
+        ch = cursor.peek()
+        if ch is None or ch not in char_class: return None
+        return cursor.advance()
+
+    function.char_class = char_class
+    return function
+
+
+def count_step(kind: str, bound: int):
+    """ Build the function of a node of a counted repeat. The kind and bound are kept on the function,
+    the change to the counters is done by apply_counter """
+
+    def function(cursor: Optional[Cursor]) -> Optional[Cursor]:
+        if cursor is None: return None
+        counters = apply_counter(kind, bound, cursor.counters)
+        if counters is None: return None
+        return Cursor(cursor.text, cursor.pos, counters)
+
+    function.count_kind = kind
+    function.bound = bound
+    return function
+
+
+def apply_counter(kind: str, bound: int, counters: tuple) -> Optional[tuple]:
+    """ Update the counters of a thread passing a node of a counted repeat, or return None if it cannot pass.
+    'count_push' enters the repeat, 'count_loop' lets the thread into another iteration while fewer than
+    bound iterations were made (bound -1 means always), 'count_inc' ends an iteration, counting at most up to bound,
+    and 'count_exit' leaves the repeat after at least bound iterations """
+    if kind == Kind.COUNT_PUSH:
+        return counters + (0,)
+    if kind == Kind.COUNT_LOOP:
+        return counters if bound == -1 or counters[-1] < bound else None
+    if kind == Kind.COUNT_INC:
+        return counters[:-1] + (min(counters[-1] + 1, bound),)
+    return counters[:-1] if counters[-1] >= bound else None
 
 
 class RegexFaConstruction:
 
-    def __init__(self, name='NFA'):
+    def __init__(self, name='NFA', history: str = History.OFF):
         self.name = name
-        self.m = DiscreteEvent(name)
-        logging.info('Initialize a new NFA {}'.format(name))
+        # matching only needs the final state, so by default nothing is recorded
+        self.m = DiscreteEvent(name, history=history)
+        if Trace.enabled:
+            logger.info('Initialize a new NFA {}'.format(name))
         self.input_port: str = 'Input'
         self.output_port: str = 'Output'
         self.m.input_port(self.input_port, latency=1)
         self.m.output_port(self.output_port, latency=1)
         self.state: dict = {}
-        self._matched_str: str = None
-        self._matched_index: int = 0
+        self._matched_str: Optional[str] = None
+        self._matched_index: Optional[int] = None
 
     @element_type(1, Node)
     def extend_nodes(self, nodes: list[Node]) -> None:
         """ Add nodes to the current NFA """
-        logging.info('NFA {} adds nodes {}'.format(self.name, nodes))
-        self.m.nodes.extend(nodes)
+        self._extend_nodes(nodes)
+
+    def _extend_nodes(self, nodes: list) -> None:
+        """ Add nodes that are known to be nodes, such as the nodes of another NFA, without checking them """
+        if Trace.enabled:
+            logger.info('NFA {} adds nodes {}'.format(self.name, nodes))
+        self.m.add_nodes(nodes)
 
     def get_node_list(self) -> Iterable[Node]:
         """ Get nodes list of current NFA """
@@ -34,141 +113,114 @@ class RegexFaConstruction:
 
     def get_input_node(self) -> Optional[Node]:
         """ Find the input node of NFA """
-        for node in self.m.nodes:
-            if self.input_port in node.inputs:
-                logging.info('NFA {} gets its input node: {}'.format(self.name, node))
-                return node
+        for node, _ in self.m.consumers(self.input_port):
+            if Trace.enabled:
+                logger.info('NFA {} gets its input node: {}'.format(self.name, node))
+            return node
         return None
 
     @arg_type(1, str)
     def set_input_node(self, new_name: str, latency: int = 1) -> None:
         """ Change the input port of the input node """
-        for node in self.m.nodes:
-            if self.input_port in node.inputs:
-                node.inputs.pop(self.input_port)
-                node.inputs[new_name] = latency
-                logging.info('NFA {} rename the input port of its input node to {}'.format(self.name, new_name))
+        for node, _ in list(self.m.consumers(self.input_port)):
+            node.rename_input(self.input_port, new_name, latency)
+            if Trace.enabled:
+                logger.info('NFA {} rename the input port of its input node to {}'.format(self.name, new_name))
 
     def get_output_node(self) -> Optional[Node]:
         """ Find the output node of NFA """
-        for node in self.m.nodes:
-            if self.output_port in node.outputs:
-                logging.info('NFA {} gets its output node: {}'.format(self.name, node))
-                return node
+        for node in self.m.producers(self.output_port):
+            if Trace.enabled:
+                logger.info('NFA {} gets its output node: {}'.format(self.name, node))
+            return node
         return None
 
     @arg_type(1, str)
     def set_output_node(self, new_name: str, latency: int = 1) -> None:
         """ Change the output port of the input node """
-        for node in self.m.nodes:
-            if self.output_port in node.outputs:
-                node.outputs.pop(self.output_port)
-                node.outputs[new_name] = latency
-                logging.info('NFA {} rename the input port of its input node to {}'.format(self.name, new_name))
+        for node in list(self.m.producers(self.output_port)):
+            node.rename_output(self.output_port, new_name, latency)
+            if Trace.enabled:
+                logger.info('NFA {} rename the input port of its input node to {}'.format(self.name, new_name))
 
     @arg_type([1, 2], [str, str])
     def add_da_node(self, a: str, b: str, c: str = None) -> None:
         """ Add nodes that recognize letters, numbers, and underscores.
         Corresponding to the regular expression of '\w' """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            if text is None or len(text) < 1: return None
-            if text[0].isdigit() or text[0].isalpha() or text[0] == '_':
-                return text[1:] if len(text) else ''
-            else:
-                return None
-
-        n = self.m.add_node('digit_alpha', lambda text: function(text))
+        n = self.m.add_node('digit_alpha', char_step(WORD))
         n.input(a, latency=1)
         n.output(b, latency=1)
         if c is not None:
             n.output(c, latency=1)
-            logging.info(r'NFA {} adds a "\w" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds a "\w" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
         else:
-            logging.info(r'NFA {} adds a "\w" node. input port: {} output port: {}'.format(self.name, a, b))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds a "\w" node. input port: {} output port: {}'.format(self.name, a, b))
 
     @arg_type([1, 2], [str, str])
     def add_empty_char_node(self, a: str, b: str, c: str = None) -> None:
         """ Add nodes that recognize '\n', '\t', '\r' and '\f'.
         Corresponding to the regular expression of '\s' """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            if text is None or len(text) < 1: return None
-            if text[0] in empty_chars:
-                return text[1:] if len(text) else ''
-            else:
-                return None
-
-        n = self.m.add_node('empty_char', lambda text: function(text))
+        n = self.m.add_node('empty_char', char_step(SPACE))
         n.input(a, latency=1)
         n.output(b, latency=1)
         if c is not None:
             n.output(c, latency=1)
-            logging.info(r'NFA {} adds a "\s" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds a "\s" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
         else:
-            logging.info(r'NFA {} adds a "\s" node. input port: {} output port: {}'.format(self.name, a, b))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds a "\s" node. input port: {} output port: {}'.format(self.name, a, b))
 
     @arg_type([1, 2], [str, str])
     def add_digit_node(self, a: str, b: str, c: str = None) -> None:
         """ Add nodes that recognize numbers.
         Corresponding to the regular expression of '\d' """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            if text is None or len(text) < 1: return None
-            if text[0].isdigit():
-                return text[1:] if len(text) else ''
-            else:
-                return None
-
-        n = self.m.add_node('digit', lambda text: function(text))
+        n = self.m.add_node('digit', char_step(DIGIT))
         n.input(a, latency=1)
         n.output(b, latency=1)
         if c is not None:
             n.output(c, latency=1)
-            logging.info(r'NFA {} adds a "\d" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds a "\d" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
         else:
-            logging.info(r'NFA {} adds a "\d" node. input port: {} output port: {}'.format(self.name, a, b))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds a "\d" node. input port: {} output port: {}'.format(self.name, a, b))
 
     @arg_type([1, 2], [str, str])
     def add_alpha_node(self, a: str, b: str, c: str = None) -> None:
         """ Add nodes that recognize letters. """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            if text is None or len(text) < 1: return None
-            if text[0].isalpha():
-                return text[1:] if len(text) else ''
-            else:
-                return None
-
-        n = self.m.add_node('alpha', lambda text: function(text))
+        n = self.m.add_node('alpha', char_step(ALPHA))
         n.input(a, latency=1)
         n.output(b, latency=1)
         if c is not None:
             n.output(c, latency=1)
-            logging.info(r'NFA {} adds an "alpha" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds an "alpha" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
         else:
-            logging.info(r'NFA {} adds an "alpha" node. input port: {} output port: {}'.format(self.name, a, b))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds an "alpha" node. input port: {} output port: {}'.format(self.name, a, b))
 
     @arg_type([1, 2], [str, str])
     def add_any_node(self, a: str, b: str, c: str = None) -> None:
         """ Add a node that can accept any input except for '\n'.
         Corresponding to the regular expression of '.' """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            if text is None or len(text) < 1: return None
-            if text[0] != '\n':
-                return text[1:] if len(text) else ''
-            else:
-                return None
-
-        n = self.m.add_node('any', lambda text: function(text))
+        n = self.m.add_node('any', char_step(ANY))
         n.input(a, latency=1)
         n.output(b, latency=1)
         if c is not None:
             n.output(c, latency=1)
-            logging.info(r'NFA {} adds a "." node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds a "." node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
         else:
-            logging.info(r'NFA {} adds a "." node. input port: {} output port: {}'.format(self.name, a, b))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds a "." node. input port: {} output port: {}'.format(self.name, a, b))
 
     @arg_type([1, 2], [str, str])
     def add_normal_node(self, a: str, b: str, pattern_char: str, c: str = None) -> None:
@@ -176,160 +228,177 @@ class RegexFaConstruction:
 
         if len(pattern_char) > 1: pattern_char = pattern_char[0]
 
-        def function(text: Optional[str]) -> Optional[str]:
-            if text is None or len(text) < 1: return None
-            if text[0] == pattern_char:
-                return text[1:] if len(text) else ''
-            else:
-                return None
-
-        n = self.m.add_node('normal', lambda text: function(text))
+        n = self.m.add_node('normal', char_step(literal_class(pattern_char)))
         n.input(a, latency=1)
         n.output(b, latency=1)
         if c is not None:
             n.output(c, latency=1)
-            logging.info(
-                r'NFA {} adds a "normal" node. pattern char: {} input port: {} output port: {}, {}'.format(self.name,
-                                                                                                           pattern_char,
-                                                                                                           a, b, c))
+            if Trace.enabled:
+                logger.info(
+                    r'NFA {} adds a "normal" node. pattern char: {} input port: {} output port: {}, {}'.format(self.name,
+                                                                                                               pattern_char,
+                                                                                                               a, b, c))
         else:
-            logging.info(
-                r'NFA {} adds a "normal" node. pattern char: {} input port: {} output port: {}'.format(self.name,
-                                                                                                       pattern_char, a,
-                                                                                                       b))
+            if Trace.enabled:
+                logger.info(
+                    r'NFA {} adds a "normal" node. pattern char: {} input port: {} output port: {}'.format(self.name,
+                                                                                                           pattern_char, a,
+                                                                                                           b))
 
     @arg_type([1, 2], [str, str])
     def add_charset_node(self, a: str, b: str, charset: list, negative: bool, c: str = None) -> None:
         """ Adds a node that recognizes the specified character set.
          Corresponding to the regular expression of '[]' """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            if text is None or len(text) < 1: return None
-            for token in charset:
-                if token.get('type') == Kind.NORMAL:
-                    if token.get('value') == text[0]:
-                        return (text[1:] if len(text) else '') if not negative else None
-                elif token.get('type') == Kind.TRANS:
-                    if token.get('value') == 'w':
-                        if text[0].isalpha() or text[0].isdigit() or text[0] == '_':
-                            return (text[1:] if len(text) else '') if not negative else None
-                    elif token.get('value') == 's':
-                        if text[0] in empty_chars:
-                            return (text[1:] if len(text) else '') if not negative else None
-                    else:
-                        if text[0].isdigit():
-                            return (text[1:] if len(text) else '') if not negative else None
-                elif token.get('type') == Kind.ALPHA_RANGE:
-                    if not text[0].isalpha(): continue
-                    l, r = token.get(Kind.RANGE)[0], token.get(Kind.RANGE)[1]
-                    if l <= text[0] <= r:
-                        return (text[1:] if len(text) else '') if not negative else None
-                else:
-                    if not text[0].isdigit(): continue
-                    l, r = token.get(Kind.RANGE)[0], token.get(Kind.RANGE)[1]
-                    if l <= int(text[0]) <= r:
-                        return (text[1:] if len(text) else '') if not negative else None
-            return (text[1:] if len(text) else '') if negative else None
-
         node_name = Kind.SET if not negative else Kind.NEG_SET
-        n = self.m.add_node(node_name, lambda text: function(text))
+        n = self.m.add_node(node_name, char_step(charset_class(charset, negative)))
         n.input(a, latency=1)
         n.output(b, latency=1)
         if c is not None:
             n.output(c, latency=1)
-            logging.info(
-                r'NFA {} adds a "charset" node. pattern char: {} input port: {} output port: {}, {}'.format(self.name,
-                                                                                                            charset, a,
-                                                                                                            b, c))
+            if Trace.enabled:
+                logger.info(
+                    r'NFA {} adds a "charset" node. pattern char: {} input port: {} output port: {}, {}'.format(self.name,
+                                                                                                                charset, a,
+                                                                                                                b, c))
         else:
-            logging.info(
-                r'NFA {} adds a "charset" node. pattern char: {} input port: {} output port: {}'.format(self.name,
-                                                                                                        charset, a, b))
+            if Trace.enabled:
+                logger.info(
+                    r'NFA {} adds a "charset" node. pattern char: {} input port: {} output port: {}'.format(self.name,
+                                                                                                            charset, a, b))
 
     @arg_type([1, 2], [str, str])
     def add_end_node(self, a: str, b: str) -> None:
         """ Add a node that can recognize the end of text """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            return '' if text == '' else None
+        def function(cursor: Optional[Cursor]) -> Optional[Cursor]:
+            return cursor if cursor is not None and cursor.at_end() else None
 
-        n = self.m.add_node('end', lambda text: function(text))
+        n = self.m.add_node('end', function)
         n.input(a, latency=1)
         n.output(b, latency=1)
-        logging.info(r'NFA {} adds an "end" node. input port: {} output port: {}'.format(self.name, a, b))
+        if Trace.enabled:
+            logger.info(r'NFA {} adds an "end" node. input port: {} output port: {}'.format(self.name, a, b))
 
     @arg_type([1, 2], [str, str])
     def add_all_node(self, a: str, b: str, c: str = None) -> None:
         """ Add a node that can recognize any input. """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            if text is None or len(text) < 1: return None
-            return text[1:] if len(text) else ''
-
-        n = self.m.add_node('all', lambda text: function(text))
+        n = self.m.add_node('all', char_step(ALL))
         n.input(a, latency=1)
         n.output(b, latency=1)
         if c is not None:
             n.output(c, latency=1)
-            logging.info(r'NFA {} adds an "all" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds an "all" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
         else:
-            logging.info(r'NFA {} adds an "all" node. input port: {} output port: {}'.format(self.name, a, b))
+            if Trace.enabled:
+                logger.info(r'NFA {} adds an "all" node. input port: {} output port: {}'.format(self.name, a, b))
 
     @arg_type([1, 2], [str, str])
     def add_null_11_node(self, a: str, b: str) -> None:
         """ Add an null node that has one input and one output """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            return text
+        def function(cursor: Optional[Cursor]) -> Optional[Cursor]:
+            return cursor
 
-        n = self.m.add_node('null_11', lambda text: function(text))
+        n = self.m.add_node('null_11', function)
         n.input(a, latency=1)
         n.output(b, latency=1)
-        logging.info(r'NFA {} adds a "null" node. input port: {} output port: {}'.format(self.name, a, b))
+        if Trace.enabled:
+            logger.info(r'NFA {} adds a "null" node. input port: {} output port: {}'.format(self.name, a, b))
 
     @arg_type([1, 2, 3], [str, str, str])
     def add_null_12_node(self, a: str, b: str, c: str) -> None:
         """ Add an null node that has one input and two outputs """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            return text
+        def function(cursor: Optional[Cursor]) -> Optional[Cursor]:
+            return cursor
 
-        n = self.m.add_node('null_12', lambda text: function(text))
+        n = self.m.add_node('null_12', function)
         n.input(a, latency=1)
         n.output(b, latency=1)
         n.output(c, latency=1)
-        logging.info(r'NFA {} adds a "null" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
+        if Trace.enabled:
+            logger.info(r'NFA {} adds a "null" node. input port: {} output port: {}, {}'.format(self.name, a, b, c))
 
     @arg_type([1, 2, 3], [str, str, str])
     def add_null_21_node(self, a: str, b: str, c: str) -> None:
         """ Add an null node that has two inputs and one output """
 
-        def function(text: Optional[str]) -> Optional[str]:
-            return text
+        def function(cursor: Optional[Cursor]) -> Optional[Cursor]:
+            return cursor
 
-        n = self.m.add_node('null_21', lambda text: function(text))
+        n = self.m.add_node('null_21', function)
         n.input(a, latency=1)
         n.input(b, latency=1)
         n.output(c, latency=1)
-        logging.info(r'NFA {} adds a "null" node. input port: {}, {} output port: {}'.format(self.name, a, b, c))
+        if Trace.enabled:
+            logger.info(r'NFA {} adds a "null" node. input port: {}, {} output port: {}'.format(self.name, a, b, c))
 
-    @arg_type(1, str)
-    def execute(self, text: str) -> None:
-        """ Execute NFA and record matched string """
-
-        logging.info(r'NFA {} execution'.format(self.name))
-        self.state = self.m.execute(source_event(self.input_port, text, 0))
-        if self.is_matched():
-            output = self.state.get(self.output_port)
-            if output == '':
-                self._matched_index = len(text)
-                self._matched_str = text
-            else:
-                for i in range(len(text)):
-                    if text[i:] == output:
-                        self._matched_index = i
-                        break
-                self._matched_str = text[0:self._matched_index]
+    @arg_type([1, 2], [str, str])
+    def add_count_push_node(self, a: str, b: str) -> None:
+        """ Add a node that starts counting the iterations of a counted repeat """
+
+        n = self.m.add_node(Kind.COUNT_PUSH, count_step(Kind.COUNT_PUSH, 0))
+        n.input(a, latency=1)
+        n.output(b, latency=1)
+        if Trace.enabled:
+            logger.info(r'NFA {} adds a "count_push" node. input port: {} output port: {}'.format(self.name, a, b))
+
+    @arg_type([1, 2, 3], [str, str, int])
+    def add_count_loop_node(self, a: str, b: str, high: int) -> None:
+        """ Add a node that lets a counted repeat start another iteration while fewer than high were made.
+        high is -1 for a repeat without a maximum """
+
+        n = self.m.add_node(Kind.COUNT_LOOP, count_step(Kind.COUNT_LOOP, high))
+        n.input(a, latency=1)
+        n.output(b, latency=1)
+        if Trace.enabled:
+            logger.info(r'NFA {} adds a "count_loop" node. max: {} input port: {} output port: {}'.format(
+                self.name, high, a, b))
+
+    @arg_type([1, 2, 3], [str, str, int])
+    def add_count_inc_node(self, a: str, b: str, cap: int) -> None:
+        """ Add a node that counts one more iteration of a counted repeat.
+        The count stops at cap, beyond which the repeat does not need to tell counts apart """
+
+        n = self.m.add_node(Kind.COUNT_INC, count_step(Kind.COUNT_INC, cap))
+        n.input(a, latency=1)
+        n.output(b, latency=1)
+        if Trace.enabled:
+            logger.info(r'NFA {} adds a "count_inc" node. cap: {} input port: {} output port: {}'.format(
+                self.name, cap, a, b))
+
+    @arg_type([1, 2, 3], [str, str, int])
+    def add_count_exit_node(self, a: str, b: str, low: int) -> None:
+        """ Add a node that leaves a counted repeat after at least low iterations """
+
+        n = self.m.add_node(Kind.COUNT_EXIT, count_step(Kind.COUNT_EXIT, low))
+        n.input(a, latency=1)
+        n.output(b, latency=1)
+        if Trace.enabled:
+            logger.info(r'NFA {} adds a "count_exit" node. min: {} input port: {} output port: {}'.format(
+                self.name, low, a, b))
+
+    def execute(self, text: str, pos: int = 0) -> None:
+        """ Execute NFA from position pos of text and record the longest matched string """
+
+        if Trace.enabled:
+            logger.info(r'NFA {} execution'.format(self.name))
+        self._matched_str = None
+        self._matched_index = None
+        end = len(text)
+
+        def stop(state: dict) -> bool:
+            cursor = state.get(self.output_port)
+            if cursor is not None and (self._matched_index is None or cursor.pos > self._matched_index):
+                self._matched_index = cursor.pos
+            return self._matched_index == end
+
+        self.state = self.m.execute(source_event(self.input_port, Cursor(text, pos), 0), stop=stop)
+        if self._matched_index is not None:
+            self._matched_str = text[pos:self._matched_index]
 
     def visualize(self) -> str:
         """ Visualizing NFA """
@@ -337,15 +406,12 @@ class RegexFaConstruction:
 
     def is_matched(self) -> bool:
         """ Determine whether NFA matches text """
-        if self.state.get(self.output_port) is None:
-            return False
-        else:
-            return True
+        return self._matched_index is not None
 
     def get_matched_str(self) -> str:
         """ Get the matched string """
         return self._matched_str
 
-    def get_matched_index(self) -> int:
-        """ Get the matched index """
+    def get_matched_index(self) -> Optional[int]:
+        """ Get the position in text where the match ends """
         return self._matched_index
@@ -0,0 +1,197 @@
+import struct
+import sys
+import threading
+from array import array
+
+from char_class import CharClass, ASCII_SIZE
+from regex_program import Program
+from regex_dfa import RegexDfa
+
+FORMAT_MAGIC = b'RXPC'
+FORMAT_VERSION = 1
+
+
+class FormatError(ValueError):
+    """ Raised when bytes are not a compiled pattern, or one written by an unsupported version of the format """
+
+
+class Writer(object):
+    """ Collects the little-endian binary encoding of compiled automata """
+    __slots__ = ('parts',)
+
+    def __init__(self):
+        self.parts: list = [FORMAT_MAGIC, struct.pack('<H', FORMAT_VERSION)]
+
+    def getvalue(self) -> bytes:
+        return b''.join(self.parts)
+
+    def pack(self, fmt: str, *values) -> None:
+        self.parts.append(struct.pack('<' + fmt, *values))
+
+    def ints(self, values) -> None:
+        """ Write a length-prefixed array of 32-bit integers """
+        data = array('i', values)
+        if sys.byteorder == 'big':
+            data.byteswap()
+        self.pack('I', len(data))
+        self.parts.append(data.tobytes())
+
+    def bytes(self, data: bytes) -> None:
+        self.pack('I', len(data))
+        self.parts.append(data)
+
+    def text(self, value: str) -> None:
+        self.bytes(value.encode('utf-8'))
+
+
+class Reader(object):
+    """ Reads back what a Writer wrote, raising FormatError on foreign or truncated data """
+    __slots__ = ('data', 'pos')
+
+    def __init__(self, data: bytes):
+        self.data = memoryview(data)
+        self.pos = 0
+        if bytes(self.data[:len(FORMAT_MAGIC)]) != FORMAT_MAGIC:
+            raise FormatError('The data is not a compiled pattern')
+        self.pos = len(FORMAT_MAGIC)
+        version, = self.unpack('H')
+        if version != FORMAT_VERSION:
+            raise FormatError('Compiled pattern format version {} is not supported, expected {}'.format(
+                version, FORMAT_VERSION))
+
+    def unpack(self, fmt: str) -> tuple:
+        fmt = '<' + fmt
+        size = struct.calcsize(fmt)
+        if self.pos + size > len(self.data):
+            raise FormatError('The compiled pattern is truncated')
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += size
+        return values
+
+    def _take(self, size: int) -> bytes:
+        if self.pos + size > len(self.data):
+            raise FormatError('The compiled pattern is truncated')
+        self.pos += size
+        return bytes(self.data[self.pos - size:self.pos])
+
+    def bytes(self) -> bytes:
+        size, = self.unpack('I')
+        return self._take(size)
+
+    def ints(self) -> array:
+        count, = self.unpack('I')
+        data = array('i')
+        data.frombytes(self._take(count * data.itemsize))
+        if sys.byteorder == 'big':
+            data.byteswap()
+        return data
+
+    def signatures(self, count: int, width: int) -> list:
+        """ Read count tuples of width membership flags """
+        flags = self._take(count * width)
+        return [tuple(bool(flag) for flag in flags[i * width:(i + 1) * width]) for i in range(count)]
+
+    def text(self) -> str:
+        return self.bytes().decode('utf-8')
+
+
+def write_class(w: Writer, char_class: CharClass) -> None:
+    w.bytes(char_class.bitmap.to_bytes(ASCII_SIZE // 8, 'little'))
+    w.pack('BH', char_class.alpha | char_class.digit << 1 | char_class.negative << 2, char_class.decimals)
+    w.ints(code for bounds in char_class.ranges for code in bounds)
+
+
+def read_class(r: Reader) -> CharClass:
+    bitmap = int.from_bytes(r.bytes(), 'little')
+    flags, decimals = r.unpack('BH')
+    codes = r.ints()
+    ranges = tuple((codes[i], codes[i + 1]) for i in range(0, len(codes), 2))
+    return CharClass(bitmap, ranges, bool(flags & 1), bool(flags & 2), decimals, bool(flags & 4))
+
+
+def write_program(w: Writer, program: Program) -> None:
+    """ Write the state arrays, the character classes and the start state of a program """
+    w.bytes(program.ops.tobytes())
+    w.ints(program.operands)
+    w.ints(program.first)
+    w.ints(program.nexts)
+    w.pack('iI', program.start, len(program.classes))
+    for char_class in program.classes:
+        write_class(w, char_class)
+
+
+def read_program(r: Reader) -> Program:
+    program = Program()
+    program.ops.frombytes(r.bytes())
+    program.operands = r.ints()
+    program.first = r.ints()
+    program.nexts = r.ints()
+    program.start, count = r.unpack('iI')
+    for _ in range(count):
+        char_class = read_class(r)
+        program._class_ids[char_class] = len(program.classes)
+        program.classes.append(char_class)
+    if len(program.operands) != len(program.ops) or len(program.first) != len(program.ops) + 1:
+        raise FormatError('The compiled pattern is corrupt')
+    return program
+
+
+def write_dfa(w: Writer, dfa: RegexDfa) -> None:
+    """ Write the transition table of a DFA with what it needs to add the classes of characters not seen yet:
+    the thread set of every state and the signatures of the known classes """
+    with dfa._lock:
+        unminimized = -1 if dfa.states_unminimized is None else dfa.states_unminimized
+        w.pack('iiiiiI', dfa.max_states, dfa.dead, dfa.start, dfa.states_built, unminimized, len(dfa._signatures))
+        w.ints(nxt for row in dfa.table for nxt in row)
+        w.bytes(bytes(dfa.accept))
+        w.bytes(bytes(dfa.accept_end))
+        threads = []
+        for state_set in dfa._state_sets:
+            threads.append(len(state_set))
+            for pc, counters in state_set:
+                threads.append(pc)
+                threads.append(len(counters))
+                threads.extend(counters)
+        w.ints(threads)
+        w.parts.append(bytes(flag for signature in dfa._signatures for flag in signature))
+        w.pack('I', len(dfa._class_ids))
+        w.parts.append(bytes(flag for signature in dfa._class_ids for flag in signature))
+        w.ints(dfa._class_ids.values())
+        w.ints(ord(ch) for ch in dfa._class_of)
+        w.ints(dfa._class_of.values())
+
+
+def read_dfa(r: Reader, program: Program) -> RegexDfa:
+    dfa = RegexDfa.__new__(RegexDfa)
+    dfa.program = program
+    dfa._predicates = program.classes
+    dfa._lock = threading.RLock()
+    dfa._pending = []
+    dfa.flushes = 0
+    dfa.max_states, dfa.dead, dfa.start, dfa.states_built, unminimized, columns = r.unpack('iiiiiI')
+    dfa.states_unminimized = None if unminimized == -1 else unminimized
+    cells = r.ints()
+    dfa.table = [cells[i:i + columns].tolist() for i in range(0, len(cells), columns)] if columns else []
+    dfa.accept = [bool(flag) for flag in r.bytes()]
+    dfa.accept_end = [bool(flag) for flag in r.bytes()]
+    threads = r.ints()
+    dfa._state_sets = []
+    i = 0
+    while i < len(threads):
+        state_set = []
+        for _ in range(threads[i]):
+            pc, size = threads[i + 1], threads[i + 2]
+            state_set.append((pc, tuple(threads[i + 3:i + 3 + size])))
+            i += 2 + size
+        dfa._state_sets.append(frozenset(state_set))
+        i += 1
+    dfa._state_ids = {(state_set, dfa.accept[state], dfa.accept_end[state]): state
+                      for state, state_set in enumerate(dfa._state_sets)}
+    dfa._signatures = r.signatures(columns, len(program.classes))
+    count, = r.unpack('I')
+    dfa._class_ids = dict(zip(r.signatures(count, len(program.classes)), r.ints()))
+    chars = [chr(code) for code in r.ints()]
+    dfa._class_of = dict(zip(chars, r.ints()))
+    if len(dfa.accept) != len(dfa.table) or len(dfa._state_sets) != len(dfa.table):
+        raise FormatError('The compiled pattern is corrupt')
+    return dfa
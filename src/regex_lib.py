@@ -1,89 +1,637 @@
-from regex_to_nfa import regex_to_nfa
-from typing import Optional
+import functools
+import mmap
+import threading
+from collections import OrderedDict, deque, namedtuple
+from concurrent.futures import Executor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import BinaryIO, Iterable, Iterator, Optional
+
+from regex_parser import regex_to_tokens, extract_literals
+from regex_to_nfa import regex_to_nfa, eliminate_null_nodes
+from regex_program import compile_program
+from regex_dfa import RegexDfa, LazyDfa, DfaSizeError, dfa_info_t
+from regex_vm import PikeVm, StreamMatcher
+from regex_set import RegexSet
+from regex_format import Writer, Reader, FormatError, write_program, read_program, write_dfa, read_dfa
 from common import arg_type
 
+ENGINES = ('pike', 'nfa', 'dfa', 'lazy')
+DEFAULT_CHUNK_SIZE = 1 << 16
+DEFAULT_BATCH_SIZE = 256
+# batches submitted to an executor but not yet yielded, so that huge inputs are not read ahead as a whole
+MAX_PENDING_BATCHES = 64
+DEFAULT_SPLIT_SIZE = 1 << 20
+
+cache_info_t = namedtuple("cache_info_t", "hits misses evictions maxsize currsize")
+
+
+def _file_chunks(path: str, chunk_size: int) -> Iterator[str]:
+    """ Map the file into memory and yield it chunk by chunk.
+    Bytes are decoded as latin-1, one character per byte, so text offsets are byte offsets """
+    with open(path, 'rb') as f:
+        try:
+            m = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # an empty file cannot be mapped
+            return
+        with m:
+            for i in range(0, len(m), chunk_size):
+                yield m[i:i + chunk_size].decode('latin-1')
+
+
+def _batches(texts: Iterable[str], size: int) -> Iterator[tuple]:
+    """ Cut texts into lists of size items, yielding each with the index of its first item """
+    it = iter(texts)
+    first = 0
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield first, batch
+        first += len(batch)
+
+
+@functools.lru_cache(maxsize=16)
+def _loaded(data: bytes) -> 'Pattern':
+    """ Load a pattern once per worker, however many batches use it """
+    return loads(data)
+
+
+def _runner(pattern: 'Pattern', method: str, repl: str, count: int):
+    """ Get the function of one text that a batch method applies """
+    if method == 'sub':
+        return lambda text: pattern.sub(repl, text, count)
+    return getattr(pattern, method)
+
+
+def _scan_chunk(data: bytes, text: str, stop: int, at_end: bool) -> list:
+    """ Scan a chunk of a split text in a worker of an executor, see Pattern._scan() """
+    return _loaded(data)._scan(text, stop, at_end)
+
+
+def _run_batch(data: bytes, method: str, texts: list, repl: str, count: int) -> list:
+    """ Run a method of a serialized pattern over a batch of texts, in a worker of an executor """
+    run = _runner(_loaded(data), method, repl, count)
+    return [run(text) for text in texts]
+
+
+class Pattern(object):
+    """ A compiled regular expression that can be reused across calls """
+
+    @arg_type(1, str)
+    def __init__(self, regex: str, engine: str = 'pike', minimize: bool = False):
+        if engine not in ENGINES:
+            raise ValueError('Unknown engine {}, expected one of {}'.format(engine, ENGINES))
+        self.pattern = regex
+        # literals every match starts with and contains, to skip text where the automaton cannot match
+        self._prefix, self._required = extract_literals(regex_to_tokens(regex))
+        self._anchored = regex[0] == '^'
+        if self._required == self._prefix:
+            self._required = ''
+        # the discrete-event engine runs on the NFA as built: removing null nodes changes the order of its events,
+        # and some patterns would then reach the event limit
+        self._nfa = regex_to_nfa(regex)
+        # the array form of the automaton that the pike, dfa and lazy engines run on
+        self._program = compile_program(eliminate_null_nodes(self._nfa))
+        # the NFA keeps the result of its last run, so runs must not interleave
+        self._lock = threading.Lock()
+        self._dfa: Optional[RegexDfa] = None
+        self._vm: Optional[PikeVm] = None
+        if engine == 'dfa':
+            try:
+                self._dfa = RegexDfa(self._program)
+                if minimize:
+                    self._dfa.minimize()
+            except DfaSizeError:
+                # the Pike VM runs in linear time on the same program, without the event limit of the NFA
+                self._dfa = None
+                self._vm = PikeVm(self._program)
+                engine = 'pike'
+        elif engine == 'lazy':
+            self._dfa = LazyDfa(self._program)
+        elif engine == 'pike':
+            self._vm = PikeVm(self._program)
+        self.engine = engine
+
+    def __repr__(self):
+        return "Pattern({!r}, engine={!r})".format(self.pattern, self.engine)
+
+    def __reduce__(self):
+        # a pickle holds the compiled automaton, so unpickling does not compile the pattern again
+        return loads, (dumps(self),)
+
+    def info(self) -> Optional[dfa_info_t]:
+        """ Get the state counts of the DFA behind the pattern, or None when it runs on another engine """
+        if self._dfa is None:
+            return None
+        return self._dfa.info()
+
+    def _match_at(self, text: str, pos: int) -> Optional[int]:
+        """ Run the automaton at position pos and return the end of the match, or None """
+        if self._vm is not None:
+            return self._vm.match_at(text, pos)
+        if self._dfa is not None:
+            try:
+                return self._dfa.match_at(text, pos)
+            except DfaSizeError:
+                # a character class seen for the first time made the DFA too large
+                self._vm = PikeVm(self._program)
+                self._dfa = None
+                self.engine = 'pike'
+                return self._vm.match_at(text, pos)
+        with self._lock:
+            if self._nfa is None:
+                # a loaded pattern has no node graph until the discrete-event engine needs one
+                self._nfa = regex_to_nfa(self.pattern)
+            self._nfa.execute(text, pos)
+            return self._nfa.get_matched_index()
+
+    def _search(self, text: str, pos: int) -> Optional[tuple]:
+        """ Find the leftmost match that starts at a character of text at or after pos """
+        if self._required and text.find(self._required, pos) == -1:
+            return None
+        if self._vm is not None:
+            return self._vm.search(text, pos, last_start=len(text) - 1, prefix=self._prefix)
+        i = pos
+        while i < len(text):
+            if self._prefix:
+                i = text.find(self._prefix, i)
+                if i == -1:
+                    return None
+            end = self._match_at(text, i)
+            if end is not None:
+                return i, end
+            i += 1
+        return None
+
+    @arg_type(1, str)
+    def match(self, text: str) -> Optional[tuple]:
+        """ Try to match the pattern from the beginning of the string.
+        If the match is not successful at the beginning, match() returns none. """
+        if not text.startswith(self._prefix) or self._required not in text:
+            return None
+        end = self._match_at(text, 0)
+        if end is not None:
+            return 0, end
+        return None
+
+    @arg_type(1, str)
+    def search(self, text: str, executor: Optional[Executor] = None,
+               chunk_size: int = DEFAULT_SPLIT_SIZE) -> Optional[tuple]:
+        """ Scan the entire string and return the first successful match.
+        With an executor the text is split into chunks scanned in parallel, see _finditer_split() """
+        if self._anchored:
+            return self.match(text)
+        if executor is not None:
+            return next(self._finditer_split(text, executor, chunk_size), None)
+        return self._search(text, 0)
+
+    @arg_type(1, str)
+    def finditer(self, text: str, executor: Optional[Executor] = None,
+                 chunk_size: int = DEFAULT_SPLIT_SIZE) -> Iterator[tuple]:
+        """ Lazily yield the (start, end) span of every non-overlapping match, from left to right.
+        With an executor the text is split into chunks scanned in parallel, see _finditer_split() """
+        if executor is not None and not self._anchored:
+            yield from self._finditer_split(text, executor, chunk_size)
+            return
+        if self._anchored:
+            m = self.match(text)
+            if m is not None:
+                yield m
+            return
+        i = 0
+        while i < len(text):
+            m = self._search(text, i)
+            if m is None:
+                return
+            yield m
+            # an empty match would be found again at the same place
+            i = m[1] if m[1] > m[0] else m[1] + 1
+
+    def _scan(self, text: str, stop: int, at_end: bool) -> tuple:
+        """ Search the chunk text[:stop] of a split text as if a match had just ended at its start, on the DFA of
+        the pattern when it has one and in one pass of the Pike VM otherwise. text may go on past stop;
+        at_end tells whether it ends where the whole text does. Return the matches that start before stop
+        and no text after them can change, and the first start before stop left undecided or stop:
+        every other start before it has no match """
+        if self._dfa is not None:
+            return self._dfa.scan(text, stop, at_end, self._prefix)
+        vm = self._vm if self._vm is not None else PikeVm(self._program)
+        matches = []
+        for start, end in vm.scan(text, 0, prefix=self._prefix, at_end=at_end):
+            if start >= stop:
+                break
+            if end is None:
+                return matches, start
+            matches.append((start, end))
+        return matches, stop
+
+    def _finditer_split(self, text: str, executor: Executor, chunk_size: int) -> Iterator[tuple]:
+        """ Split text into chunks, scan them on the executor and stitch their matches into those of a sequential scan.
+        Each chunk is searched from its start as if a match had just ended there, see _scan(). When matches are
+        at most max_length() long, a chunk is given the max_length() + 1 characters after it, so its starts are all
+        decided. The stitching is one Pike VM scan over the text that carries its threads across chunk boundaries.
+        Whenever no thread is alive at a position the chunk's search also went through, it skips what the chunk
+        decided, so it only runs where a chunk could not decide, such as a match that crosses the end of its chunk,
+        and in linear time however many chunks such a match spans """
+        if chunk_size <= 0:
+            raise ValueError('The chunk size must be positive')
+        length = self._program.max_length()
+        overlap = 0 if length is None else length + 1
+        data = dumps(self)
+        n = len(text)
+
+        def submit(a: int) -> tuple:
+            b = min(a + chunk_size, n)
+            last = min(b + overlap, n)
+            return a, b, executor.submit(_scan_chunk, data, text[a:last], b - a, last == n)
+
+        starts = iter(range(0, n, chunk_size))
+        chunks = deque(submit(a) for a in islice(starts, MAX_PENDING_BATCHES))
+        # the chunk that holds the scan position: its bounds, matches, first undecided start,
+        # and the index of its first match the scan has not passed
+        current = [0, 0, [], 0, 0]
+
+        def skip(i: int) -> tuple:
+            """ Settle the text from i that the chunks decided, see PikeVm.scan() """
+            known = []
+            while i < n:
+                while i >= current[1]:
+                    a, b, future = chunks.popleft()
+                    chunks.extend(submit(following) for following in islice(starts, 1))
+                    matches, undecided = future.result()
+                    current[:] = [a, b, [(start + a, end + a) for start, end in matches], undecided + a, 0]
+                a, b, matches, undecided, j = current
+                while j < len(matches) and matches[j][0] < i:
+                    j += 1
+                current[4] = j
+                # the chunk's search went through i only if it did not skip i inside one of its matches
+                if j == 0:
+                    restart = a
+                else:
+                    restart = matches[j - 1][1] if matches[j - 1][1] > matches[j - 1][0] else matches[j - 1][1] + 1
+                if restart > i:
+                    break
+                if j < len(matches):
+                    start, end = matches[j]
+                    known.append((start, end))
+                    i = end if end > start else end + 1
+                elif i < undecided:
+                    i = undecided
+                else:
+                    break
+            return known, i
+
+        vm = self._vm if self._vm is not None else PikeVm(self._program)
+        try:
+            yield from vm.scan(text, 0, skip, self._prefix)
+        finally:
+            for chunk in chunks:
+                chunk[2].cancel()
+
+    @arg_type(1, str)
+    def findall(self, text: str) -> list:
+        """ Return the list of all matched substrings """
+        return [text[start:end] for start, end in self.finditer(text)]
+
+    def stream(self) -> StreamMatcher:
+        """ Start an incremental matcher for text that arrives in chunks through feed() """
+        vm = self._vm if self._vm is not None else PikeVm(self._program)
+        return StreamMatcher(vm, self._anchored)
+
+    @arg_type(1, str)
+    def finditer_file(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple]:
+        """ Lazily yield the (start, end) byte offsets of every match in a file.
+        The file is memory-mapped and fed to a stream matcher chunk by chunk, so it is never read as a whole """
+        if chunk_size <= 0:
+            raise ValueError('The chunk size must be positive')
+        m = self.stream()
+        for chunk in _file_chunks(path, chunk_size):
+            for start, end, _ in m.feed(chunk):
+                yield start, end
+        for start, end, _ in m.close():
+            yield start, end
+
+    @arg_type(1, str)
+    def search_file(self, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[tuple]:
+        """ Return the byte offsets of the first match in a file, reading only as far as needed """
+        return next(self.finditer_file(path, chunk_size), None)
+
+    @arg_type([1, 2], [str, str])
+    def sub(self, repl: str, text: str, count: int = 0) -> str:
+        """ Replace matches in string """
+        t_count = count if count != 0 else len(repl)
+        if self._anchored:
+            end = self._match_at(text, 0)
+            if end is not None:
+                return repl + text[end:]
+            return text
+        res = []
+        last = 0
+        i = 0
+        j = 0
+        while i < len(text) and j < t_count:
+            m = self._search(text, i)
+            if m is None:
+                break
+            res.append(text[last:m[0]])
+            res.append(repl)
+            last = m[1]
+            j += 1
+            # the character right after a replacement is never the start of the next match
+            i = m[1] + 1
+        res.append(text[last:])
+        return "".join(res)
+
+    def match_many(self, texts: Iterable[str], executor: Optional[Executor] = None,
+                   chunksize: int = DEFAULT_BATCH_SIZE, ordered: bool = True) -> Iterator:
+        """ Lazily yield match() of every text, see _many() for the executor and ordering """
+        return self._many('match', texts, executor, chunksize, ordered)
+
+    def search_many(self, texts: Iterable[str], executor: Optional[Executor] = None,
+                    chunksize: int = DEFAULT_BATCH_SIZE, ordered: bool = True) -> Iterator:
+        """ Lazily yield search() of every text, see _many() for the executor and ordering """
+        return self._many('search', texts, executor, chunksize, ordered)
+
+    @arg_type(1, str)
+    def sub_many(self, repl: str, texts: Iterable[str], count: int = 0, executor: Optional[Executor] = None,
+                 chunksize: int = DEFAULT_BATCH_SIZE, ordered: bool = True) -> Iterator:
+        """ Lazily yield sub() of every text, see _many() for the executor and ordering """
+        return self._many('sub', texts, executor, chunksize, ordered, repl, count)
+
+    def _many(self, method: str, texts: Iterable[str], executor: Optional[Executor], chunksize: int,
+              ordered: bool, repl: str = '', count: int = 0) -> Iterator:
+        """ Run a method over texts, in this thread or in batches of chunksize texts on an executor.
+        A process pool receives the serialized pattern and loads it once per worker.
+        Results come in input order, or with ordered=False as (index, result) pairs as soon as their batch is done """
+        if chunksize <= 0:
+            raise ValueError('The chunk size must be positive')
+        if executor is None:
+            run = _runner(self, method, repl, count)
+            for i, text in enumerate(texts):
+                yield run(text) if ordered else (i, run(text))
+            return
+        data = dumps(self)
+        pending: dict = {}
+        window: deque = deque()
+        try:
+            for first, batch in _batches(texts, chunksize):
+                future = executor.submit(_run_batch, data, method, batch, repl, count)
+                pending[future] = first
+                window.append(future)
+                while len(pending) >= MAX_PENDING_BATCHES:
+                    yield from self._collect(pending, window, ordered)
+            while pending:
+                yield from self._collect(pending, window, ordered)
+        finally:
+            for future in pending:
+                future.cancel()
+
+    @staticmethod
+    def _collect(pending: dict, window: deque, ordered: bool) -> Iterator:
+        """ Yield the results of the oldest batch, or with ordered=False of every finished batch """
+        if ordered:
+            future = window.popleft()
+            results = future.result()
+            del pending[future]
+            yield from results
+            return
+        done, _ = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield from enumerate(future.result(), pending.pop(future))
+
+    @arg_type(1, str)
+    def split(self, text: str, maxsplit: int = 0) -> list:
+        """ The method divides the string according to the substring that can be matched and returns the list """
+        res_lst = []
+        t_count = maxsplit if maxsplit != 0 else len(text)
+        if self._anchored:
+            end = self._match_at(text, 0)
+            if end is not None:
+                res_lst.append('')
+                res_lst.append(text[end:])
+            return res_lst
+        i = 0
+        j = 0
+        while i < len(text) and j < t_count:
+            m = self._search(text, i)
+            if m is None:
+                i = len(text)
+                break
+            res_lst.append(text[i:m[0]])
+            i = m[1]
+            j += 1
+        res_lst.append(text[i:])
+        return res_lst
+
+
+class PatternCache(object):
+    """ A bounded, thread-safe LRU cache of compiled patterns """
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 0:
+            raise ValueError('The size of the pattern cache must not be negative')
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._patterns: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._patterns)
+
+    @arg_type(1, str)
+    def get(self, regex: str, engine: str = 'pike', minimize: bool = False) -> Pattern:
+        """ Return the compiled pattern for regex, compiling it on a miss """
+        key = (regex, engine, minimize)
+        with self._lock:
+            pattern = self._patterns.get(key)
+            if pattern is not None:
+                self._patterns.move_to_end(key)
+                self.hits += 1
+                return pattern
+            self.misses += 1
+        # compile outside the lock so that a slow pattern does not block the other threads
+        pattern = Pattern(regex, engine, minimize)
+        with self._lock:
+            if key in self._patterns:
+                self._patterns.move_to_end(key)
+                return self._patterns[key]
+            self._patterns[key] = pattern
+            self._evict()
+        return pattern
+
+    @arg_type(1, int)
+    def resize(self, maxsize: int) -> None:
+        """ Change the capacity of the cache, evicting the least recently used patterns if needed """
+        if maxsize < 0:
+            raise ValueError('The size of the pattern cache must not be negative')
+        with self._lock:
+            self.maxsize = maxsize
+            self._evict()
+
+    def clear(self) -> None:
+        """ Drop every cached pattern and reset the counters """
+        with self._lock:
+            self._patterns.clear()
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+
+    def info(self) -> cache_info_t:
+        """ Get the hit, miss and eviction counters of the cache """
+        with self._lock:
+            return cache_info_t(self.hits, self.misses, self.evictions, self.maxsize, len(self._patterns))
+
+    def _evict(self) -> None:
+        while len(self._patterns) > self.maxsize:
+            self._patterns.popitem(last=False)
+            self.evictions += 1
+
+
+_cache = PatternCache()
+
+
+def compile(regex: str, engine: str = 'pike', minimize: bool = False) -> Pattern:
+    """ Compile a regular expression into a reusable pattern object.
+    By default the pattern runs on a Pike VM that searches in one pass over the text.
+    With engine='nfa' it runs on the discrete-event simulation of the NFA.
+    With engine='dfa' the pattern runs on a subset-construction DFA,
+    falling back to the Pike VM when the DFA would be too large.
+    With engine='lazy' DFA states are built on demand in a bounded cache.
+    With minimize=True the DFA of the 'dfa' engine is minimized once it is built,
+    and its info() reports the state count before minimization. """
+    return _cache.get(regex, engine, minimize)
+
+
+def set_cache_size(maxsize: int) -> None:
+    """ Set how many compiled patterns the module-level functions keep """
+    _cache.resize(maxsize)
+
+
+def cache_info() -> cache_info_t:
+    """ Get the statistics of the module-level pattern cache """
+    return _cache.info()
+
+
+def purge() -> None:
+    """ Clear the module-level pattern cache """
+    _cache.clear()
+
+
+def dumps(pattern: Pattern) -> bytes:
+    """ Serialize a compiled pattern into the versioned binary format of regex_format.
+    The bytes hold the program, the transition table of a 'dfa' engine and the anchor and literal prefixes,
+    so loading them skips parsing, NFA construction and subset construction """
+    w = Writer()
+    w.text(pattern.pattern)
+    w.text(pattern.engine)
+    w.text(pattern._prefix)
+    w.text(pattern._required)
+    w.pack('B', pattern._anchored)
+    write_program(w, pattern._program)
+    dfa = pattern._dfa if pattern.engine == 'dfa' else None
+    w.pack('B', dfa is not None)
+    if dfa is not None:
+        write_dfa(w, dfa)
+    return w.getvalue()
+
+
+def loads(data: bytes) -> Pattern:
+    """ Rebuild a pattern from the bytes dumps() returned, raising FormatError if they are not valid """
+    r = Reader(data)
+    pattern = Pattern.__new__(Pattern)
+    pattern.pattern = r.text()
+    pattern.engine = r.text()
+    if pattern.engine not in ENGINES:
+        raise FormatError('Unknown engine {} in the compiled pattern'.format(pattern.engine))
+    pattern._prefix = r.text()
+    pattern._required = r.text()
+    pattern._anchored = bool(r.unpack('B')[0])
+    pattern._program = read_program(r)
+    pattern._nfa = None
+    pattern._lock = threading.Lock()
+    pattern._dfa = read_dfa(r, pattern._program) if r.unpack('B')[0] else None
+    pattern._vm = None
+    if pattern.engine == 'lazy':
+        pattern._dfa = LazyDfa(pattern._program)
+    elif pattern.engine == 'pike':
+        pattern._vm = PikeVm(pattern._program)
+    return pattern
+
+
+def dump(pattern: Pattern, file: BinaryIO) -> None:
+    """ Write a compiled pattern to a binary file """
+    file.write(dumps(pattern))
+
+
+def load(file: BinaryIO) -> Pattern:
+    """ Read a compiled pattern that dump() wrote to a binary file """
+    return loads(file.read())
+
 
-@arg_type([0, 1], [str, str])
 def match(regex: str, text: str) -> Optional[tuple]:
     """ Try to match a pattern from the beginning of the string.
     If the match is not successful at the beginning, match() returns none. """
-    nfa = regex_to_nfa(regex)
-    nfa.execute(text)
-    if nfa.is_matched():
-        res = (0, nfa.get_matched_index())
-        return res
-    return None
+    return _cache.get(regex).match(text)
 
 
-@arg_type([0, 1], [str, str])
-def search(regex: str, text: str) -> Optional[tuple]:
+def search(regex: str, text: str, executor: Optional[Executor] = None,
+           chunk_size: int = DEFAULT_SPLIT_SIZE) -> Optional[tuple]:
     """ Scan the entire string and return the first successful match. """
-    nfa = regex_to_nfa(regex)
-    if regex[0] == '^':
-        nfa.execute(text)
-        if nfa.is_matched():
-            res = (0, nfa.get_matched_index())
-            return res
-    else:
-        for i in range(len(text)):
-            nfa.execute(text[i:])
-            if nfa.is_matched():
-                res = (i, i + nfa.get_matched_index())
-                return res
-    return None
-
-
-@arg_type([0, 1, 2], [str, str, str])
+    return _cache.get(regex).search(text, executor, chunk_size)
+
+
+def finditer(regex: str, text: str, executor: Optional[Executor] = None,
+             chunk_size: int = DEFAULT_SPLIT_SIZE) -> Iterator[tuple]:
+    """ Lazily yield the (start, end) span of every non-overlapping match """
+    return _cache.get(regex).finditer(text, executor, chunk_size)
+
+
+def findall(regex: str, text: str) -> list:
+    """ Return the list of all matched substrings """
+    return _cache.get(regex).findall(text)
+
+
+def stream(regex: str) -> StreamMatcher:
+    """ Start an incremental matcher for text that arrives in chunks """
+    return _cache.get(regex).stream()
+
+
+def search_file(regex: str, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Optional[tuple]:
+    """ Return the byte offsets of the first match in a file without loading it into memory """
+    return _cache.get(regex).search_file(path, chunk_size)
+
+
+def finditer_file(regex: str, path: str, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[tuple]:
+    """ Lazily yield the byte offsets of every match in a file without loading it into memory """
+    return _cache.get(regex).finditer_file(path, chunk_size)
+
+
 def sub(regex: str, repl: str, text: str, count: int = 0) -> str:
     """ Replace matches in string """
-    nfa = regex_to_nfa(regex)
-    repl_len = len(repl)
-    res = "".join(text)
-    t_count = count if count != 0 else repl_len
-    i = 0
-    j = 0
-    if regex[0] == '^':
-        nfa.execute(res)
-        if nfa.is_matched():
-            mst = nfa.get_matched_str()
-            res = res.replace(mst, repl, 1)
-    else:
-        while i < len(res) and j < t_count:
-            nfa.execute(res[i:])
-            if nfa.is_matched():
-                mst = nfa.get_matched_str()
-                res = res[0:i] + res[i:].replace(mst, repl, 1)
-                i += repl_len
-                j += 1
-            i += 1
-    return res
+    return _cache.get(regex).sub(repl, text, count)
 
 
-@arg_type([0, 1], [str, str])
 def split(regex: str, text: str, maxsplit: int = 0) -> list:
     """ The method divides the string according to the substring that can be matched and returns the list """
-    nfa = regex_to_nfa(regex)
-    res_lst = []
-    t_count = maxsplit if maxsplit != 0 else len(text)
-    i = 0
-    j = 0
-    if regex[0] == '^':
-        nfa.execute(text)
-        if nfa.is_matched():
-            mst = nfa.get_matched_str()
-            tmp = text.replace(mst, '', 1)
-            res_lst.append('')
-            res_lst.append(tmp)
-    else:
-        k = 0
-        while i < len(text) and j < t_count:
-            nfa.execute(text[i:])
-            if nfa.is_matched():
-                res_lst.append(text[k:i])
-                i += nfa.get_matched_index()
-                k = i
-                j += 1
-            else:
-                i += 1
-        res_lst.append(text[i:])
-    return res_lst
+    return _cache.get(regex).split(text, maxsplit)
+
+
+def match_many(regex: str, texts: Iterable[str], executor: Optional[Executor] = None,
+               chunksize: int = DEFAULT_BATCH_SIZE, ordered: bool = True) -> Iterator:
+    """ Compile a pattern once and lazily yield the match of every text """
+    return _cache.get(regex).match_many(texts, executor, chunksize, ordered)
+
+
+def search_many(regex: str, texts: Iterable[str], executor: Optional[Executor] = None,
+                chunksize: int = DEFAULT_BATCH_SIZE, ordered: bool = True) -> Iterator:
+    """ Compile a pattern once and lazily yield the first match in every text """
+    return _cache.get(regex).search_many(texts, executor, chunksize, ordered)
+
+
+def sub_many(regex: str, repl: str, texts: Iterable[str], count: int = 0, executor: Optional[Executor] = None,
+             chunksize: int = DEFAULT_BATCH_SIZE, ordered: bool = True) -> Iterator:
+    """ Compile a pattern once and lazily yield every text with its matches replaced """
+    return _cache.get(regex).sub_many(repl, texts, count, executor, chunksize, ordered)
@@ -1,222 +1,305 @@
-from regex_fa_construction import *
-from common import sp_chars, Kind, element_type
-from typing import Tuple
+from typing import Tuple, Optional
 
+from common import sp_chars, Kind, set_member_t, element_type, arg_type
 
-@arg_type(0, str)
-def regex_to_tokens(regex: str) -> list:
-    """ Convert the regular expression to a token list.
-    By analyzing the token list, we can get the semantics of metacharacter in regular expression. """
 
-    tokens = []  # type 0 denotes operators, type 1 denotes normal operands
-    lst = list(regex)
-    i = 0
-    while i < len(lst):
-        if lst[i] == '\\':
-            if i + 1 < len(lst):
-                d = process_trans(lst[i + 1])
-                i += 1
-        elif lst[i] == '.':
-            d = {'value': lst[i], 'type': 1, 'kind': Kind.DOT}
-        elif lst[i] == '[':
-            inc, d = process_set(regex[i:])
-            i += inc
-        elif lst[i] == '*' or lst[i] == '+' or lst[i] == '^' or lst[i] == '$' or lst[i] == '(' or lst[i] == ')':
-            d = {'value': lst[i], 'type': 0, 'kind': Kind.NORMAL}
-        elif lst[i] == '{':
-            inc, d = process_range(regex[i:])
-            i += inc
-        else:
-            d = {'value': lst[i], 'type': 1, 'kind': Kind.NORMAL}
-        tokens.append(d)
-        i += 1
-    add_concat(tokens)
-    return tokens
+class TokenKind:
+    # operands
+    CHAR = 0
+    DOT = 1
+    TRANS = 2
+    SET = 3
+    NEG_SET = 4
+    # operators
+    STAR = 5
+    PLUS = 6
+    RANGE = 7
+    LEFT = 8
+    RIGHT = 9
+    PREFIX = 10
+    POSTFIX = 11
+    CONCAT = 12
 
 
-@arg_type(0, list)
-@element_type(0, dict)
-def add_concat(tokens: list) -> None:
-    """ Adding concat operation to the regular expression token list """
-    concat = {'value': 'concat', 'type': 0, 'kind': Kind.CONCAT}
-    con_index = []
-    for i in (range(len(tokens) - 1)):
-        if (is_repeat(tokens[i]) and is_left_bracket(tokens[i + 1])) or \
-                (is_repeat(tokens[i]) and tokens[i + 1].get('type') == 1):
-            con_index.append(i + 1)
-        elif (is_right_bracket(tokens[i]) and is_left_bracket(tokens[i + 1])) or \
-                (is_right_bracket(tokens[i]) and tokens[i + 1].get('type') == 1):
-            con_index.append(i + 1)
-        elif (tokens[i].get('type') == 1 and is_left_bracket(tokens[i + 1])) or \
-                (tokens[i].get('type') == 1 and tokens[i + 1].get('type') == 1):
-            con_index.append(i + 1)
-    for i in reversed(con_index):
-        tokens.insert(i, concat)
-
-
-@arg_type(0, dict)
-def is_repeat(token: dict) -> bool:
-    """ Judge whether the token is a repeated operation """
-    if token.get('kind') == Kind.NORMAL:
-        if token.get('value') == '*' or token.get('value') == '+':
-            return True
-    else:
-        if token.get('kind') == Kind.RANGE:
-            return True
-    return False
+OPERATORS = {'*': TokenKind.STAR, '+': TokenKind.PLUS, '^': TokenKind.PREFIX, '$': TokenKind.POSTFIX,
+             '(': TokenKind.LEFT, ')': TokenKind.RIGHT}
 
 
-@arg_type(0, dict)
-def is_left_bracket(token: dict) -> bool:
-    """ Judge whether the token is left bracket """
-    if token.get('type') == 0 and token.get('value') == '(':
-        return True
-    return False
+class Token(object):
+    """ A token of a regular expression. value is the text of the token, or the character after '\\'.
+    A charset keeps the set_member_t list of its inside in members, a '{}' repeat keeps its (min, max) counts
+    in bounds, -1 denoting infinity. The flags are computed once, when the token is made """
+    __slots__ = ('kind', 'value', 'members', 'bounds', 'is_operand', 'is_repeat', 'is_bracket')
 
+    def __init__(self, kind: int, value: str, members: Optional[list] = None, bounds: Optional[tuple] = None):
+        self.kind = kind
+        self.value = value
+        self.members = members
+        self.bounds = bounds
+        self.is_operand = kind <= TokenKind.NEG_SET
+        self.is_repeat = kind == TokenKind.STAR or kind == TokenKind.PLUS or kind == TokenKind.RANGE
+        self.is_bracket = kind == TokenKind.LEFT or kind == TokenKind.RIGHT
 
-@arg_type(0, dict)
-def is_right_bracket(token: dict) -> bool:
-    """ Judge whether the token is right bracket """
-    if token.get('type') == 0 and token.get('value') == ')':
-        return True
-    return False
+    def __repr__(self):
+        if self.members is not None:
+            return "Token({}, {!r}, members={!r})".format(self.kind, self.value, self.members)
+        if self.bounds is not None:
+            return "Token({}, {!r}, bounds={!r})".format(self.kind, self.value, self.bounds)
+        return "Token({}, {!r})".format(self.kind, self.value)
 
+    def __eq__(self, other):
+        return isinstance(other, Token) and (self.kind, self.value, self.members, self.bounds) == \
+               (other.kind, other.value, other.members, other.bounds)
 
-@arg_type(0, dict)
-def is_concat(token: dict) -> bool:
-    """ Judge whether the token is concat """
-    if token.get('kind') == Kind.CONCAT:
-        return True
-    return False
 
+CONCAT = Token(TokenKind.CONCAT, 'concat')
 
-@arg_type(0, dict)
-def is_prefix(token: dict) -> bool:
-    """ Judge whether the token is a header match """
-    if token.get('type') == 0 and token.get('value') == '^':
-        return True
-    return False
 
+class RegexSyntaxError(ValueError):
+    """ Raised when a regular expression cannot be parsed.
+    pos is the index in the pattern where the problem was found, when it is known """
 
-@arg_type(0, dict)
-def is_postfix(token: dict) -> bool:
-    """ Judge whether the token is a tail match """
-    if token.get('type') == 0 and token.get('value') == '$':
-        return True
-    return False
+    def __init__(self, msg: str, pattern: Optional[str] = None, pos: Optional[int] = None):
+        self.msg = msg
+        self.pattern = pattern
+        self.pos = pos
+        if pos is not None:
+            msg = '{} at position {}'.format(msg, pos)
+        super().__init__(msg)
 
 
 @arg_type(0, str)
-def process_trans(character: str) -> dict:
-    """ Process characters after '\' """
-    if character in sp_chars:
-        d = {'value': character, 'type': 1, 'kind': Kind.NORMAL}
-    elif character == 'w' or character == 's' or character == 'd':
-        d = {'value': character, 'type': 1, 'kind': Kind.TRANS}
-    return d
+def regex_to_tokens(regex: str) -> list:
+    """ Convert the regular expression to a token list.
+    By analyzing the token list, we can get the semantics of metacharacter in regular expression.
+    The pattern is read once from left to right, concat operations are added on the way """
 
+    if not regex:
+        raise RegexSyntaxError('Empty pattern', regex, 0)
+    tokens: list = []
+    opened = []  # positions of the brackets that are not closed yet
+    i = 0
+    while i < len(regex):
+        start = i
+        ch = regex[i]
+        if ch == '\\':
+            if i + 1 >= len(regex):
+                raise RegexSyntaxError('Dangling backslash', regex, i)
+            token = process_trans(regex[i + 1], regex, i)
+            i += 2
+        elif ch == '.':
+            token = Token(TokenKind.DOT, ch)
+            i += 1
+        elif ch == '[':
+            i, token = parse_set(regex, i)
+        elif ch in OPERATORS:
+            token = Token(OPERATORS[ch], ch)
+            i += 1
+        elif ch == '{':
+            i, token = parse_range(regex, i)
+        else:
+            token = Token(TokenKind.CHAR, ch)
+            i += 1
+        if token.kind == TokenKind.LEFT:
+            opened.append(start)
+        elif token.kind == TokenKind.RIGHT:
+            if not opened:
+                raise RegexSyntaxError('Unbalanced parenthesis', regex, start)
+            if tokens[-1].kind == TokenKind.LEFT:
+                raise RegexSyntaxError('Empty group', regex, opened[-1])
+            opened.pop()
+        elif token.is_repeat:
+            prev = tokens[-1] if tokens else None
+            if prev is None or not (prev.is_operand or prev.is_repeat or prev.kind == TokenKind.RIGHT):
+                raise RegexSyntaxError('Nothing to repeat', regex, start)
+        if tokens and needs_concat(tokens[-1], token):
+            tokens.append(CONCAT)
+        tokens.append(token)
+    if opened:
+        raise RegexSyntaxError('Missing )', regex, opened[-1])
+    return tokens
+
+
+@arg_type(0, list)
+@element_type(0, Token)
+def add_concat(tokens: list) -> None:
+    """ Adding concat operation to the regular expression token list """
+    res = []
+    for token in tokens:
+        if res and needs_concat(res[-1], token):
+            res.append(CONCAT)
+        res.append(token)
+    tokens[:] = res
+
+
+def needs_concat(prev: Token, token: Token) -> bool:
+    """ Judge whether a concat operation goes between two adjacent tokens """
+    if prev.is_operand or prev.is_repeat or prev.kind == TokenKind.RIGHT:
+        return token.is_operand or token.kind == TokenKind.LEFT
+    return False
 
-@arg_type(0, str)
-def process_set(substr: str) -> Tuple[int, dict]:
-    """ Process characters in '[]' """
-    increment = 0
-    while substr[increment] != ']': increment += 1
-    if substr[1] == '^':
-        d = {'value': substr[0:increment + 1], 'type': 1, 'kind': Kind.NEG_SET,
-             Kind.NEG_SET: charset_parser(substr[1:increment])}
-    else:
-        d = {'value': substr[0:increment + 1], 'type': 1, 'kind': Kind.SET,
-             Kind.SET: charset_parser(substr[1:increment])}
-    return increment, d
+
+def process_trans(character: str, pattern: Optional[str] = None, pos: Optional[int] = None) -> Token:
+    """ Process characters after '\\'. Other punctuation stands for itself, like the special characters.
+    pattern and pos locate the backslash for error messages """
+    if character in sp_chars or not character.isalnum():
+        return Token(TokenKind.CHAR, character)
+    if character == 'w' or character == 's' or character == 'd':
+        return Token(TokenKind.TRANS, character)
+    raise RegexSyntaxError('Bad escape \\{}'.format(character), pattern, pos)
 
 
 @arg_type(0, str)
-def charset_parser(charset: str) -> list:
-    """ Analyze the string in '[]' and convert it to token list """
-    set_token_lst = []
+def process_set(substr: str) -> Tuple[int, Token]:
+    """ Process characters in '[]' """
+    end, token = parse_set(substr, 0)
+    return end - 1, token
 
-    alp_nfa = RegexFaConstruction('alpha')
-    alp_nfa.add_alpha_node(alp_nfa.input_port, 'n1')
-    alp_nfa.add_normal_node('n1', 'n2', '-')
-    alp_nfa.add_alpha_node('n2', alp_nfa.output_port)
 
-    dig_nfa = RegexFaConstruction('digit')
-    dig_nfa.add_digit_node(dig_nfa.input_port, 'n1')
-    dig_nfa.add_normal_node('n1', 'n2', '-')
-    dig_nfa.add_digit_node('n2', dig_nfa.output_port)
+def parse_set(regex: str, start: int) -> Tuple[int, Token]:
+    """ Parse the '[]' charset that begins at position start of regex.
+    Returns the position after the closing ']' and the token """
+    i = start + 1
+    while i < len(regex) and regex[i] != ']':
+        # an escaped ']' does not close the charset
+        i += 2 if regex[i] == '\\' else 1
+    if i >= len(regex):
+        raise RegexSyntaxError('Unterminated character set', regex, start)
+    kind = TokenKind.NEG_SET if i > start + 1 and regex[start + 1] == '^' else TokenKind.SET
+    # the '^' of a negated set is not one of its members
+    begin = start + 2 if kind == TokenKind.NEG_SET else start + 1
+    return i + 1, Token(kind, regex[start:i + 1], members=parse_charset(regex, begin, i))
 
-    i = 0
-    while i < len(charset):
-        if charset[i] == '\\' and i + 1 < len(charset):
-            if charset[i + 1] in sp_chars:
-                d = {'type': Kind.NORMAL, 'value': charset[i + 1]}
-                i += 1
-            elif charset[i + 1] in ['w', 's', 'd']:
-                d = {'type': Kind.TRANS, 'value': charset[i + 1]}
-                i += 1
-        elif charset[i].isalpha() and i + 2 < len(charset) and charset[i + 1] == '-':
-            alp_nfa.execute(charset[i:i + 3])
-            if alp_nfa.is_matched():
-                d = {'type': 'alpha_' + Kind.RANGE, Kind.RANGE: [charset[i], charset[i + 2]]} # type: ignore
-                i += 2
-        elif charset[i].isdigit() and i + 2 < len(charset) and charset[i + 1] == '-':
-            dig_nfa.execute(charset[i:i + 3])
-            if dig_nfa.is_matched():
-                d = {'type': 'digit_' + Kind.RANGE, Kind.RANGE: [int(charset[i]), int(charset[i + 2])]} # type: ignore
-                i += 2
+
+@arg_type(0, str)
+def charset_parser(charset: str) -> list:
+    """ Analyze the string in '[]' and convert it to a list of set_member_t """
+    return parse_charset(charset, 0, len(charset))
+
+
+def parse_charset(regex: str, begin: int, end: int) -> list:
+    """ Convert the part of regex between begin and end, the inside of a '[]', to a list of set_member_t """
+    members = []
+    i = begin
+    while i < end:
+        ch = regex[i]
+        if ch == '\\' and i + 1 < end:
+            if regex[i + 1] in sp_chars or not regex[i + 1].isalnum():
+                member = set_member_t(Kind.NORMAL, regex[i + 1])
+            elif regex[i + 1] in ('w', 's', 'd'):
+                member = set_member_t(Kind.TRANS, regex[i + 1])
+            else:
+                raise RegexSyntaxError('Bad escape \\{}'.format(regex[i + 1]), regex, i)
+            i += 2
+        elif (ch.isalpha() or ch.isdecimal()) and i + 2 < end and regex[i + 1] == '-':
+            last = regex[i + 2]
+            if ch.isalpha() and last.isalpha() and ch <= last:
+                member = set_member_t(Kind.ALPHA_RANGE, (ch, last))
+            elif ch.isdecimal() and last.isdecimal() and int(ch) <= int(last):
+                member = set_member_t(Kind.DIGIT_RANGE, (int(ch), int(last)))
+            else:
+                raise RegexSyntaxError('Bad character range {}-{}'.format(ch, last), regex, i)
+            i += 3
         else:
-            d = {'type': Kind.NORMAL, 'value': charset[i]}
-        set_token_lst.append(d)
-        i += 1
-    return set_token_lst
+            member = set_member_t(Kind.NORMAL, ch)
+            i += 1
+        members.append(member)
+    return members
 
 
 @arg_type(0, str)
-def process_range(substr: str) -> Tuple[int, dict]:
+def process_range(substr: str) -> Tuple[int, Token]:
     """ Process repeated operation with '{}' """
-    increment = 0
-    while substr[increment] != '}': increment += 1
-
-    m1 = RegexFaConstruction('{n}')
-    m1.add_normal_node(m1.input_port, 'n1', '{')
-    m1.add_digit_node('n1', 'n2')
-    m1.add_normal_node('n2', m1.output_port, '}')
-
-    m2 = RegexFaConstruction('{min,}')
-    m2.add_normal_node(m2.input_port, 'n1', '{')
-    m2.add_digit_node('n1', 'n2')
-    m2.add_normal_node('n2', 'n3', ',')
-    m2.add_normal_node('n3', m2.output_port, '}')
-
-    m3 = RegexFaConstruction('{,max}')
-    m3.add_normal_node(m3.input_port, 'n1', '{')
-    m3.add_normal_node('n1', 'n2', ',')
-    m3.add_digit_node('n2', 'n3')
-    m3.add_normal_node('n3', m3.output_port, '}')
-
-    m4 = RegexFaConstruction('{min,max}')
-    m4.add_normal_node(m4.input_port, 'n1', '{')
-    m4.add_digit_node('n1', 'n2')
-    m4.add_normal_node('n2', 'n3', ',')
-    m4.add_digit_node('n3', 'n4')
-    m4.add_normal_node('n4', m4.output_port, '}')
-
-    input_str = substr[0:increment + 1]
-    m1.execute(input_str)
-    m2.execute(input_str)
-    m3.execute(input_str)
-    m4.execute(input_str)
-
-    if m1.is_matched():
-        d = {'value': substr[0:increment + 1], 'type': 0, 'kind': Kind.RANGE,
-             Kind.RANGE: [int(substr[1]), int(substr[1])]}
-    elif m2.is_matched():
-        # -1 denotes infinity
-        d = {'value': substr[0:increment + 1], 'type': 0, 'kind': Kind.RANGE, Kind.RANGE: [int(substr[1]), -1]}
-    elif m3.is_matched():
-        d = {'value': substr[0:increment + 1], 'type': 0, 'kind': Kind.RANGE, Kind.RANGE: [0, int(substr[2])]}
-    elif m4.is_matched():
-        d = {'value': substr[0:increment + 1], 'type': 0, 'kind': Kind.RANGE,
-             Kind.RANGE: [int(substr[1]), int(substr[3])]}
-    return increment, d
+    end, token = parse_range(substr, 0)
+    return end - 1, token
+
+
+def parse_range(regex: str, start: int) -> Tuple[int, Token]:
+    """ Parse the '{}' repeat that begins at position start of regex: '{n}', '{min,}', '{,max}' or '{min,max}'.
+    Returns the position after the closing '}' and the token """
+    end = regex.find('}', start)
+    if end == -1:
+        raise RegexSyntaxError('Unterminated repeat', regex, start)
+    low, comma, high = regex[start + 1:end].partition(',')
+    for part in (low, high):
+        if not all('0' <= ch <= '9' for ch in part):
+            raise RegexSyntaxError('Bad repeat {}'.format(regex[start:end + 1]), regex, start)
+    if low == '' and (high == '' or not comma):
+        raise RegexSyntaxError('Bad repeat {}'.format(regex[start:end + 1]), regex, start)
+    # -1 denotes infinity
+    bounds = (int(low) if low else 0, int(high) if high else (-1 if comma else int(low)))
+    if bounds[1] != -1 and bounds[0] > bounds[1]:
+        raise RegexSyntaxError('Bad repeat {}, min is greater than max'.format(regex[start:end + 1]), regex, start)
+    return end + 1, Token(TokenKind.RANGE, regex[start:end + 1], bounds=bounds)
+
+
+def repeat_bounds(token: Token) -> Tuple[int, int]:
+    """ Get the minimum and maximum count of a repeated operation, -1 denotes infinity """
+    if token.kind == TokenKind.RANGE:
+        return token.bounds
+    if token.kind == TokenKind.PLUS:
+        return 1, -1
+    return 0, -1
+
 
+@arg_type(0, list)
+def extract_literals(tokens: list) -> Tuple[str, str]:
+    """ Find the literal strings every match must contain by analyzing the token list.
+    Returns the literal every match starts with and the longest literal every match contains,
+    either of them is empty when there is none """
+    runs, prefix = literal_runs([token for token in tokens if token.kind != TokenKind.CONCAT])
+    return prefix, max(runs, key=len, default='')
+
+
+def fold_repeats(tokens: list, i: int) -> Tuple[int, int, int]:
+    """ Combine the repeat tokens stacked from position i into the bounds of one repeat, -1 denoting infinity.
+    Returns the minimum and maximum count and the position after the last repeat token """
+    low, high = 1, 1
+    while i < len(tokens) and tokens[i].is_repeat:
+        l, h = repeat_bounds(tokens[i])
+        low *= l
+        high = 0 if high == 0 or h == 0 else (-1 if high == -1 or h == -1 else high * h)
+        i += 1
+    return low, high, i
+
+
+def literal_runs(tokens: list) -> Tuple[list, str]:
+    """ Collect the runs of literal characters that every match contains, in order,
+    and the run at the beginning of the token list. The tokens must not contain concat operations """
+    runs = []
+    run = ''
+    prefix = None
+    i = 1 if len(tokens) > 0 and tokens[0].kind == TokenKind.PREFIX else 0
+    while i <= len(tokens):
+        if i < len(tokens) and tokens[i].kind == TokenKind.CHAR:
+            char = tokens[i].value
+            low, high, end = fold_repeats(tokens, i + 1)
+            run += char * low
+            if low == high and low > 0:
+                i = end
+                continue
+            # the character is optional or more copies of it may follow, so the run ends here
+            i = end - 1
+        # anything else ends the current run, it may match strings of any content
+        if prefix is None:
+            prefix = run
+        if run:
+            runs.append(run)
+        run = ''
+        if i < len(tokens) and tokens[i].kind == TokenKind.LEFT:
+            depth = 0
+            j = i
+            while j < len(tokens):
+                if tokens[j].kind == TokenKind.LEFT:
+                    depth += 1
+                elif tokens[j].kind == TokenKind.RIGHT:
+                    depth -= 1
+                    if depth == 0:
+                        break
+                j += 1
+            low, _, end = fold_repeats(tokens, j + 1)
+            if low > 0:
+                runs.extend(literal_runs(tokens[i + 1:j])[0])
+            i = end - 1
+        i += 1
+    return runs, prefix
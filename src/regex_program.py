@@ -0,0 +1,179 @@
+from array import array
+from typing import Optional
+
+from regex_fa_construction import RegexFaConstruction, apply_counter
+from char_class import CharClass
+from common import Kind, arg_type
+
+NULL_NODES = ('null_11', 'null_12', 'null_21')
+END_NODE = 'end'
+# the most threads max_length() explores before it gives up on a bound
+MAX_LENGTH_THREADS = 100000
+
+
+class Op:
+    SPLIT = 0  # jump to every target without consuming input
+    CHAR = 1  # consume one character of the operand class, then jump to every target
+    END = 2  # jump to every target only at the end of text
+    MATCH = 3
+    # the states of a counted repeat, the operand is their bound, see apply_counter
+    PUSH = 4
+    LOOP = 5
+    INC = 6
+    EXIT = 7
+
+
+COUNT_OPS = {Kind.COUNT_PUSH: Op.PUSH, Kind.COUNT_LOOP: Op.LOOP, Kind.COUNT_INC: Op.INC, Kind.COUNT_EXIT: Op.EXIT}
+COUNT_KINDS = {op: kind for kind, op in COUNT_OPS.items()}
+
+
+class Program(object):
+    """ A compiled automaton stored in parallel arrays indexed by integer state ids.
+    ops holds the opcode of every state and operands the index of its character class in classes,
+    the bound of a counted repeat state, or -1.
+    The targets of state pc are nexts[first[pc]:first[pc + 1]]. Equal character classes are stored once,
+    so engines can test a character against each distinct class only once """
+    __slots__ = ('ops', 'operands', 'first', 'nexts', 'classes', 'start', '_class_ids')
+
+    def __init__(self):
+        self.ops = array('b')
+        self.operands = array('i')
+        self.first = array('i', [0])
+        self.nexts = array('i')
+        self.classes: list = []
+        self.start = 0
+        self._class_ids: dict = {}
+
+    def __len__(self):
+        return len(self.ops)
+
+    def __repr__(self):
+        return "Program({} states, {} classes, start={})".format(len(self), len(self.classes), self.start)
+
+    def add(self, op: int, targets=(), char_class: Optional[CharClass] = None, bound: int = -1) -> int:
+        """ Append a state and return its id """
+        operand = bound
+        if char_class is not None:
+            operand = self._class_ids.get(char_class, -1)
+            if operand == -1:
+                operand = self._class_ids[char_class] = len(self.classes)
+                self.classes.append(char_class)
+        self.ops.append(op)
+        self.operands.append(operand)
+        self.nexts.extend(targets)
+        self.first.append(len(self.nexts))
+        return len(self.ops) - 1
+
+    def extend(self, other: 'Program') -> int:
+        """ Append the states of another program and return the id its state 0 gets """
+        base = len(self)
+        for pc in range(len(other)):
+            self.add(other.ops[pc], [base + t for t in other.targets(pc)], other.char_class(pc), other.operands[pc])
+        return base
+
+    def targets(self, pc: int) -> array:
+        """ Get the states state pc jumps to """
+        return self.nexts[self.first[pc]:self.first[pc + 1]]
+
+    def char_class(self, pc: int) -> Optional[CharClass]:
+        """ Get the character class a CHAR state consumes, or None for other states """
+        return self.classes[self.operands[pc]] if self.ops[pc] == Op.CHAR else None
+
+    @property
+    def counted(self) -> bool:
+        """ Whether the program has counted repeats, so that threads must carry counters """
+        return any(op >= Op.PUSH for op in self.ops)
+
+    def count(self, pc: int, counters: tuple) -> Optional[tuple]:
+        """ Get the counters of a thread after counted repeat state pc, or None if the thread cannot pass """
+        return apply_counter(COUNT_KINDS[self.ops[pc]], self.operands[pc], counters)
+
+    def max_length(self, limit: int = MAX_LENGTH_THREADS) -> Optional[int]:
+        """ Get the length of the longest text a match can span, or None when it is unbounded.
+        Threads, states with the counters of their repeats, are explored from the start state; the bound is the
+        most CHAR states on a path to MATCH. A loop on such a path, or more than limit threads, counts as unbounded """
+        start = (self.start, ())
+        edges: dict = {}
+        stack = [start]
+        while stack:
+            thread = stack.pop()
+            if thread in edges:
+                continue
+            if len(edges) >= limit:
+                return None
+            pc, counters = thread
+            op = self.ops[pc]
+            if op >= Op.PUSH:
+                counters = self.count(pc, counters)
+            nexts = [] if counters is None or op == Op.MATCH else [(t, counters) for t in self.targets(pc)]
+            edges[thread] = nexts
+            stack.extend(nexts)
+
+        useful = {thread for thread in edges if self.ops[thread[0]] == Op.MATCH}
+        predecessors: dict = {}
+        for thread, nexts in edges.items():
+            for nxt in nexts:
+                predecessors.setdefault(nxt, []).append(thread)
+        stack = list(useful)
+        while stack:
+            for thread in predecessors.get(stack.pop(), ()):
+                if thread not in useful:
+                    useful.add(thread)
+                    stack.append(thread)
+        if start not in useful:
+            return 0
+
+        # longest path by depth-first search, a thread on the stack seen again closes a loop
+        longest: dict = {}
+        on_stack = {start}
+        stack = [(start, iter(edges[start]))]
+        while stack:
+            thread, nexts = stack[-1]
+            nxt = next((t for t in nexts if t in useful and t not in longest), None)
+            if nxt is None:
+                stack.pop()
+                on_stack.discard(thread)
+                weight = 1 if self.ops[thread[0]] == Op.CHAR else 0
+                longest[thread] = max((weight + longest[t] for t in edges[thread] if t in useful), default=0)
+            elif nxt in on_stack:
+                return None
+            else:
+                on_stack.add(nxt)
+                stack.append((nxt, iter(edges[nxt])))
+        return longest[start]
+
+    def nbytes(self) -> int:
+        """ Get the size in bytes of the state arrays, not counting the shared character classes """
+        return sum(a.itemsize * len(a) for a in (self.ops, self.operands, self.first, self.nexts))
+
+
+@arg_type(0, RegexFaConstruction)
+def compile_program(nfa: RegexFaConstruction) -> Program:
+    """ Flatten the node graph of an NFA into a program.
+    Every node becomes one state whose targets are the states reading its output ports,
+    followed by a MATCH state for the output port and a SPLIT start state for the input port """
+    nodes = list(nfa.get_node_list())
+    index = {node: i for i, node in enumerate(nodes)}
+    match_pc = len(nodes)
+
+    def targets(ports) -> list:
+        res = []
+        for port in ports:
+            if port == nfa.output_port:
+                res.append(match_pc)
+            res.extend(index[node] for node, _ in nfa.m.consumers(port))
+        return res
+
+    program = Program()
+    for node in nodes:
+        if node.name in NULL_NODES:
+            program.add(Op.SPLIT, targets(node.outputs))
+        elif node.name == END_NODE:
+            program.add(Op.END, targets(node.outputs))
+        elif node.name in COUNT_OPS:
+            program.add(COUNT_OPS[node.name], targets(node.outputs), bound=node.function.bound)
+        else:
+            program.add(Op.CHAR, targets(node.outputs), node.function.char_class)
+    program.add(Op.MATCH)
+    program.start = program.add(Op.SPLIT, targets([nfa.input_port]))
+    return program
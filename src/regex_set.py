@@ -0,0 +1,203 @@
+import threading
+from array import array
+
+from regex_to_nfa import regex_to_nfa, eliminate_null_nodes
+from regex_program import Op, Program, compile_program
+from regex_vm import thread_set, add_thread
+from regex_dfa import DEFAULT_CACHE_STATES
+from common import arg_type, element_type
+
+
+class RegexSet(object):
+    """ Many regular expressions matched together in one pass over the text.
+    The program of every pattern is appended to one shared program, and each state
+    remembers the pattern it belongs to. matches() runs a lazily built DFA over the shared program,
+    so its cost per character does not depend on the number of patterns once the states it needs exist.
+    search() runs a Pike VM over the patterns that matched to find where they match. """
+
+    @element_type(1, str)
+    def __init__(self, patterns: list, max_states: int = DEFAULT_CACHE_STATES):
+        if max_states < 2:
+            raise ValueError('The state cache of a regex set must hold at least 2 states')
+        self.patterns = list(patterns)
+        self.max_states = max_states
+        self.program = Program()
+        # index of the pattern every state belongs to
+        self.owner = array('i')
+        self.starts: list = []
+        self.anchored: list = []
+        for index, regex in enumerate(self.patterns):
+            program = compile_program(eliminate_null_nodes(regex_to_nfa(regex)))
+            base = self.program.extend(program)
+            self.owner.extend([index] * len(program))
+            self.starts.append(base + program.start)
+            self.anchored.append(regex[0] == '^')
+        self.counted = self.program.counted
+        self._signatures: list = []
+        self._class_ids: dict = {}
+        self._class_of: dict = {}
+        # states are sets of (instruction, counters) threads, numbered in the order they are built
+        self._states: list = []
+        self._state_ids: dict = {}
+        self._table: list = []
+        self._inject: list = []
+        self._accepts: list = []
+        self._accepts_end: list = []
+        self._lock = threading.Lock()
+        self.flushes = 0
+        self._all = self._closure([(self.starts[i], ()) for i in range(len(self))])
+        self._anchored_only = self._closure([(self.starts[i], ()) for i in range(len(self)) if self.anchored[i]])
+        self._unanchored = self._closure([(self.starts[i], ()) for i in range(len(self)) if not self.anchored[i]])
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __repr__(self):
+        return "RegexSet({!r})".format(self.patterns)
+
+    def _closure(self, threads, at_end: bool = False) -> frozenset:
+        res = thread_set(self.program, self.counted)
+        for pc, counters in threads:
+            add_thread(self.program, res, pc, 0, at_end, counters)
+        return frozenset(zip(res.dense[:res.size], res.counters[:res.size]))
+
+    def _add_state(self, threads: frozenset) -> int:
+        state = self._state_ids.get(threads)
+        if state is not None:
+            return state
+        if len(self._states) >= self.max_states:
+            self._flush()
+        state = len(self._states)
+        self._state_ids[threads] = state
+        self._states.append(threads)
+        self._table.append([None] * len(self._signatures))
+        self._inject.append(None)
+        self._accepts.append(frozenset(self.owner[pc] for pc, _ in threads if self.program.ops[pc] == Op.MATCH))
+        self._accepts_end.append(None)
+        return state
+
+    def _flush(self) -> None:
+        """ Forget every cached state; the caller keeps the set of instructions it is in """
+        self._states = []
+        self._state_ids = {}
+        self._table = []
+        self._inject = []
+        self._accepts = []
+        self._accepts_end = []
+        self.flushes += 1
+
+    def _char_class(self, ch: str) -> int:
+        cls = self._class_of.get(ch)
+        if cls is not None:
+            return cls
+        signature = tuple(ch in char_class for char_class in self.program.classes)
+        cls = self._class_ids.get(signature)
+        if cls is None:
+            cls = len(self._signatures)
+            self._signatures.append(signature)
+            self._class_ids[signature] = cls
+            for row in self._table:
+                row.append(None)
+        self._class_of[ch] = cls
+        return cls
+
+    def _move(self, state: int, cls: int) -> int:
+        program = self.program
+        signature = self._signatures[cls]
+        targets = []
+        for pc, counters in self._states[state]:
+            if program.ops[pc] == Op.CHAR and signature[program.operands[pc]]:
+                targets.extend((t, counters) for t in program.targets(pc))
+        nxt = self._closure(targets)
+        # a flush while adding the new state only drops the row we come from, so it is safe to fill it in after
+        row = self._table[state]
+        row[cls] = self._add_state(nxt)
+        return row[cls]
+
+    def _with_starts(self, state: int) -> int:
+        """ Add the threads of every unanchored pattern starting at the current position """
+        inject = self._inject
+        nxt = inject[state]
+        if nxt is None:
+            nxt = self._add_state(self._states[state] | self._unanchored)
+            inject[state] = nxt
+        return nxt
+
+    def _end_accepts(self, state: int) -> frozenset:
+        accepts = self._accepts_end[state]
+        if accepts is None:
+            threads = self._closure(self._states[state], at_end=True)
+            accepts = frozenset(self.owner[pc] for pc, _ in threads if self.program.ops[pc] == Op.MATCH)
+            self._accepts_end[state] = accepts
+        return accepts
+
+    @arg_type(1, str)
+    def matches(self, text: str) -> list:
+        """ Return the sorted indexes of the patterns that search() would find somewhere in text """
+        length = len(text)
+        found = set()
+        with self._lock:
+            state = self._add_state(self._all if length > 0 else self._anchored_only)
+            for i in range(length):
+                if i > 0:
+                    state = self._with_starts(state)
+                found |= self._accepts[state]
+                if len(found) == len(self):
+                    break
+                ch = text[i]
+                cls = self._class_of.get(ch)
+                if cls is None:
+                    cls = self._char_class(ch)
+                nxt = self._table[state][cls]
+                if nxt is None:
+                    nxt = self._move(state, cls)
+                state = nxt
+            else:
+                found |= self._accepts[state]
+                found |= self._end_accepts(state)
+        return sorted(found)
+
+    @arg_type(1, str)
+    def search(self, text: str) -> list:
+        """ Find the leftmost-longest match of every pattern that occurs in text.
+        Returns a list of (pattern index, start, end) ordered by pattern index """
+        indexes = self.matches(text)
+        if not indexes:
+            return []
+        program = self.program
+        ops, operands, classes = program.ops, program.operands, program.classes
+        first, nexts = program.first, program.nexts
+        owner = self.owner
+        length = len(text)
+        clist = thread_set(program, self.counted)
+        nlist = thread_set(program, self.counted)
+        best: dict = {index: None for index in indexes}
+        i = 0
+        while True:
+            for index in indexes:
+                if best[index] is None and (i == 0 if self.anchored[index] else i < length):
+                    add_thread(program, clist, self.starts[index], i, i == length)
+            if len(clist) == 0:
+                break
+            ch = text[i] if i < length else None
+            for k in range(clist.size):
+                pc = clist.dense[k]
+                start = clist.starts[k]
+                index = owner[pc]
+                b = best[index]
+                if b is not None and start > b[0]:
+                    continue
+                op = ops[pc]
+                if op == Op.MATCH:
+                    if b is None or start < b[0] or i > b[1]:
+                        best[index] = (start, i)
+                    continue
+                if op == Op.CHAR and ch is not None and ch in classes[operands[pc]]:
+                    for j in range(first[pc], first[pc + 1]):
+                        add_thread(program, nlist, nexts[j], start, i + 1 == length, clist.counters[k])
+            if i >= length:
+                break
+            clist, nlist = nlist, clist
+            nlist.clear()
+            i += 1
+        return [(index, best[index][0], best[index][1]) for index in indexes]
@@ -1,8 +1,15 @@
 import copy
+import itertools
 
 from regex_parser import *
 from common import arg_type
 from regex_fa_construction import RegexFaConstruction
+from regex_program import NULL_NODES
+
+# '{}' repeats whose copies would have more nodes than this are built with counters instead
+MAX_UNROLLED_NODES = 64
+
+copy_ids = itertools.count(1)
 
 
 @arg_type(0, str)
@@ -14,69 +21,74 @@ def regex_to_nfa(regex: str) -> RegexFaConstruction:
     node_index = 0
     for token in re_lst:
         # current token is operand
-        if token.get('type') == 1:
+        if token.is_operand:
             f = RegexFaConstruction()
-            if token.get('kind') == Kind.NORMAL:
-                f.add_normal_node(f.input_port, f.output_port, pattern_char=token.get('value'))
+            if token.kind == TokenKind.CHAR:
+                f.add_normal_node(f.input_port, f.output_port, pattern_char=token.value)
             else:
-                if token.get('kind') == Kind.SET:
-                    f.add_charset_node(f.input_port, f.output_port, charset=token.get(Kind.SET), negative=False)
-                elif token.get('kind') == Kind.NEG_SET:
-                    f.add_charset_node(f.input_port, f.output_port, charset=token.get(Kind.SET), negative=True)
-                elif token.get('kind') == Kind.TRANS:
-                    if token.get('value') == 'w':
+                if token.kind == TokenKind.SET:
+                    f.add_charset_node(f.input_port, f.output_port, charset=token.members, negative=False)
+                elif token.kind == TokenKind.NEG_SET:
+                    f.add_charset_node(f.input_port, f.output_port, charset=token.members, negative=True)
+                elif token.kind == TokenKind.TRANS:
+                    if token.value == 'w':
                         f.add_da_node(f.input_port, f.output_port)
-                    elif token.get('value') == 's':
+                    elif token.value == 's':
                         f.add_empty_char_node(f.input_port, f.output_port)
                     else:
                         f.add_digit_node(f.input_port, f.output_port)
-                elif token.get('kind') == Kind.DOT:
+                elif token.kind == TokenKind.DOT:
                     f.add_any_node(f.input_port, f.output_port)
             nfa_stack.append(f)
             node_index += 1
         # current token is operator
         else:
-            if is_left_bracket(token):
+            if token.kind == TokenKind.LEFT:
                 op_stack.append(token)
-            elif is_repeat(token):
+            elif token.is_repeat:
                 f = nfa_stack.pop()
-                if token.get('kind') == Kind.NORMAL:
-                    if token.get('value') == '*':
+                if token.kind != TokenKind.RANGE:
+                    if token.kind == TokenKind.STAR:
                         f, inc = nodes_repeat_ge_zero(f, node_index)
                         node_index += inc
-                    elif token.get('value') == '+':
+                    elif token.kind == TokenKind.PLUS:
                         f, inc = nodes_repeat_ge_one(f, node_index)
                         node_index += inc
                     nfa_stack.append(f)
                 else:
-                    r = token.get(Kind.RANGE)
-                    if r[0] == r[1]:
+                    r = token.bounds
+                    copies = r[1] if r[1] != -1 else r[0] + 1
+                    if len(f.get_node_list()) * copies > MAX_UNROLLED_NODES:
+                        new_f, inc = nodes_repeat_count(f, node_index, r[0], r[1])
+                        node_index += inc
+                    elif r[0] == r[1]:
                         new_f = nodes_repeat_eq(f, r[0])
                     else:
                         new_f, inc = nodes_repeat_range(f, node_index, r[0], r[1])
+                        node_index += inc
                     nfa_stack.append(new_f)
-            elif is_prefix(token) or is_postfix(token):
-                while len(op_stack) > 0 and not is_left_bracket(op_stack[-1]):
+            elif token.kind == TokenKind.PREFIX or token.kind == TokenKind.POSTFIX:
+                while len(op_stack) > 0 and op_stack[-1].kind != TokenKind.LEFT:
                     op = op_stack.pop()
-                    if is_concat(op):
+                    if op.kind == TokenKind.CONCAT:
                         f1 = nfa_stack.pop()
                         f2 = nfa_stack.pop()
                         new_f = concat_nfa(f2, f1, 'con' + str(node_index))
                         nfa_stack.append(new_f)
                         node_index += 1
-                    elif is_postfix(op):
+                    elif op.kind == TokenKind.POSTFIX:
                         f = nfa_stack.pop()
                         f, inc = nodes_postfix(f, node_index)
                         node_index += inc
                         nfa_stack.append(f)
-                    elif is_prefix(op):
+                    elif op.kind == TokenKind.PREFIX:
                         f = nfa_stack.pop()
                         f, inc = nodes_prefix(f, node_index)
                         node_index += inc
                         nfa_stack.append(f)
                 op_stack.append(token)
-            elif is_concat(token):
-                while len(op_stack) > 0 and is_concat(op_stack[-1]):
+            elif token.kind == TokenKind.CONCAT:
+                while len(op_stack) > 0 and op_stack[-1].kind == TokenKind.CONCAT:
                     op_stack.pop()
                     f1 = nfa_stack.pop()
                     f2 = nfa_stack.pop()
@@ -84,21 +96,21 @@ def regex_to_nfa(regex: str) -> RegexFaConstruction:
                     nfa_stack.append(new_f)
                     node_index += 1
                 op_stack.append(token)
-            elif is_right_bracket(token):
-                while len(op_stack) > 0 and not is_left_bracket(op_stack[-1]):
+            elif token.kind == TokenKind.RIGHT:
+                while len(op_stack) > 0 and op_stack[-1].kind != TokenKind.LEFT:
                     op = op_stack.pop()
-                    if is_concat(op):
+                    if op.kind == TokenKind.CONCAT:
                         f1 = nfa_stack.pop()
                         f2 = nfa_stack.pop()
                         new_f = concat_nfa(f2, f1, 'con' + str(node_index))
                         nfa_stack.append(new_f)
                         node_index += 1
-                    elif is_postfix(op):
+                    elif op.kind == TokenKind.POSTFIX:
                         f = nfa_stack.pop()
                         f, inc = nodes_postfix(f, node_index)
                         node_index += inc
                         nfa_stack.append(f)
-                    elif is_prefix(op):
+                    elif op.kind == TokenKind.PREFIX:
                         f = nfa_stack.pop()
                         f, inc = nodes_prefix(f, node_index)
                         node_index += inc
@@ -106,18 +118,18 @@ def regex_to_nfa(regex: str) -> RegexFaConstruction:
                 op_stack.pop()
     while len(op_stack):
         op = op_stack.pop()
-        if is_concat(op):
+        if op.kind == TokenKind.CONCAT:
             f1 = nfa_stack.pop()
             f2 = nfa_stack.pop()
             new_f = concat_nfa(f2, f1, 'con' + str(node_index))
             nfa_stack.append(new_f)
             node_index += 1
-        elif is_postfix(op):
+        elif op.kind == TokenKind.POSTFIX:
             f = nfa_stack.pop()
             f, inc = nodes_postfix(f, node_index)
             node_index += inc
             nfa_stack.append(f)
-        elif is_prefix(op):
+        elif op.kind == TokenKind.PREFIX:
             f = nfa_stack.pop()
             f, inc = nodes_prefix(f, node_index)
             node_index += inc
@@ -126,6 +138,58 @@ def regex_to_nfa(regex: str) -> RegexFaConstruction:
     return nfa
 
 
+@arg_type(0, RegexFaConstruction)
+def eliminate_null_nodes(nfa: RegexFaConstruction) -> RegexFaConstruction:
+    """ Build an NFA without the null nodes of nfa. The output ports of every other node are replaced by
+    the ports their value reaches through null nodes, so consuming nodes pass cursors to each other directly.
+    The new NFA accepts the same strings and only serves to compile a smaller program, with no split states
+    for the null nodes. It is not meant for the discrete-event simulation: paths through null nodes lose their
+    latencies, which changes the order of events, and nested repeats such as '(.*.)*$' may then need more events
+    than the event limit allows """
+    closures: dict = {}
+
+    def closure(port: str) -> list:
+        """ The ports reached from port through null nodes that another node or the output reads """
+        res = closures.get(port)
+        if res is not None:
+            return res
+        res = []
+        seen = {port}
+        stack = [port]
+        while stack:
+            p = stack.pop()
+            consumers = nfa.m.consumers(p)
+            if p == nfa.output_port or any(node.name not in NULL_NODES for node, _ in consumers):
+                res.append(p)
+            for node, _ in consumers:
+                if node.name in NULL_NODES:
+                    for o in node.outputs:
+                        if o not in seen:
+                            seen.add(o)
+                            stack.append(o)
+        closures[port] = res
+        return res
+
+    new_nfa = RegexFaConstruction(nfa.name)
+    starts = closure(nfa.input_port)
+    for node in nfa.get_node_list():
+        if node.name in NULL_NODES:
+            continue
+        n = new_nfa.m.add_node(node.name, node.function)
+        for port, latency in node.inputs.items():
+            n.input(port, latency)
+        if nfa.input_port not in node.inputs and any(port in starts for port in node.inputs):
+            n.input(nfa.input_port, latency=1)
+        for port in node.outputs:
+            for p in closure(port):
+                if p not in n.outputs:
+                    n.output(p, latency=1)
+    if nfa.output_port in starts:
+        # the empty string matches, the output is reached without consuming anything
+        new_nfa.add_null_11_node(new_nfa.input_port, new_nfa.output_port)
+    return new_nfa
+
+
 @arg_type([0, 1], [RegexFaConstruction, int])
 def nodes_repeat_ge_zero(nfa: RegexFaConstruction, node_index: int) -> Tuple[RegexFaConstruction, int]:
     """ Repeated operation, the number of repetitions is greater than or equal to 0.
@@ -183,7 +247,7 @@ def nodes_repeat_range(nfa: RegexFaConstruction, node_index: int, gt: int, lt: i
         nfa.set_input_node(str(node_index + 3))
         nfa.set_output_node(str(node_index + 4))
         node_inc = 6
-        f1.extend_nodes(nfa.get_node_list())
+        f1._extend_nodes(nfa.get_node_list())
     else:
         f2 = repeat_or_output_nfa(nfa, lt - gt)
         f1 = concat_nfa(f1, f2, 'con' + str(node_index))
@@ -191,6 +255,24 @@ def nodes_repeat_range(nfa: RegexFaConstruction, node_index: int, gt: int, lt: i
     return f1, node_inc
 
 
+@arg_type([0, 1, 2, 3], [RegexFaConstruction, int, int, int])
+def nodes_repeat_count(nfa: RegexFaConstruction, node_index: int, low: int, high: int) -> Tuple[RegexFaConstruction, int]:
+    """ Repeated operation that counts the iterations instead of copying the NFA.
+     Corresponding to '{n}', '{min,}' and '{min,max}' functions with large counts, high is -1 for no maximum """
+    if not nfa.get_node_list():
+        raise ValueError('There is no node in nfa')
+    nfa.set_input_node(str(node_index + 2))
+    nfa.set_output_node(str(node_index + 3))
+    nfa.add_count_push_node(nfa.input_port, str(node_index))
+    nfa.add_null_21_node(str(node_index), str(node_index + 4), str(node_index + 1))
+    nfa.add_count_loop_node(str(node_index + 1), str(node_index + 2), high)
+    # past min iterations only the minimum matters when there is no maximum, so the count stops there
+    nfa.add_count_inc_node(str(node_index + 3), str(node_index + 4), low if high == -1 else high)
+    nfa.add_count_exit_node(str(node_index + 1), nfa.output_port, low)
+    node_inc = 5
+    return nfa, node_inc
+
+
 @arg_type([0, 1], [RegexFaConstruction, int])
 def nodes_prefix(nfa: RegexFaConstruction, node_index: int) -> Tuple[RegexFaConstruction, int]:
     """ Operation of matching header. Corresponding to '^' function """
@@ -242,7 +324,7 @@ def concat_nfa(nfa1: RegexFaConstruction, nfa2: RegexFaConstruction, node_index:
     """ Concat nfa2 to nfa1 """
     nfa1.set_output_node(node_index)
     nfa2.set_input_node(node_index)
-    nfa1.extend_nodes(nfa2.get_node_list())
+    nfa1._extend_nodes(nfa2.get_node_list())
     return nfa1
 
 
@@ -257,29 +339,26 @@ def repeat_nfa(nfa: RegexFaConstruction, times: int) -> RegexFaConstruction:
     if times <= 0:
         new_nfa.add_null_11_node(new_nfa.input_port, new_nfa.output_port)
         return new_nfa
-    new_nodes.extend(copy.deepcopy(nodes))
-    for i in range(times - 1):
-        postfix = '_' + str(i + 1)
+    for i in range(times):
+        # every copy gets its own ports, so copies never share ports with the NFA or with other repeats
+        postfix = '_' + str(next(copy_ids))
         tmp_nodes = copy.deepcopy(nodes)
         con = 'c' + postfix
         for t_node in tmp_nodes:
-            for key_in, val_in in t_node.inputs.items():
+            for key_in in list(t_node.inputs):
                 if key_in != nfa.input_port:
-                    t_node.inputs[key_in + postfix] = val_in
-                    t_node.inputs.pop(key_in)
-            for key_out, val_out in t_node.outputs.items():
+                    t_node.rename_input(key_in, key_in + postfix)
+            for key_out in list(t_node.outputs):
                 if key_out != nfa.output_port:
-                    t_node.outputs[key_out + postfix] = val_out
-                    t_node.outputs.pop(key_out)
-            if nfa.input_port in t_node.inputs:
-                t_node.inputs.pop(nfa.input_port)
-                t_node.inputs[con] = 1
-        for node in new_nodes:
-            if new_nfa.output_port in node.outputs:
-                node.outputs.pop(new_nfa.output_port)
-                node.outputs[con] = 1
+                    t_node.rename_output(key_out, key_out + postfix)
+            if i > 0 and nfa.input_port in t_node.inputs:
+                t_node.rename_input(nfa.input_port, con, 1)
+        if i > 0:
+            for node in new_nodes:
+                if new_nfa.output_port in node.outputs:
+                    node.rename_output(new_nfa.output_port, con, 1)
         new_nodes.extend(tmp_nodes)
-    new_nfa.extend_nodes(new_nodes)
+    new_nfa._extend_nodes(new_nodes)
     return new_nfa
 
 
@@ -295,27 +374,25 @@ def repeat_or_output_nfa(nfa: RegexFaConstruction, times: int) -> RegexFaConstru
     if times <= 0:
         new_nfa.add_null_11_node(new_nfa.input_port, new_nfa.output_port)
         return new_nfa
-    new_nodes.extend(copy.deepcopy(nodes))
-    for i in range(times - 1):
-        postfix = '_' + str(i + 1)
+    for i in range(times):
+        # every copy gets its own ports, so copies never share ports with the NFA or with other repeats
+        postfix = '_' + str(next(copy_ids))
         tmp_nodes = copy.deepcopy(nodes)
         con = 'c' + postfix
         for t_node in tmp_nodes:
-            for key_in, val_in in t_node.inputs.items():
+            for key_in in list(t_node.inputs):
                 if key_in != nfa.input_port:
-                    t_node.inputs[key_in + postfix] = val_in
-                    t_node.inputs.pop(key_in)
-            for key_out, val_out in t_node.outputs.items():
+                    t_node.rename_input(key_in, key_in + postfix)
+            for key_out in list(t_node.outputs):
                 if key_out != nfa.output_port:
-                    t_node.outputs[key_out + postfix] = val_out
-                    t_node.outputs.pop(key_out)
-            if nfa.input_port in t_node.inputs:
-                t_node.inputs.pop(nfa.input_port)
-                t_node.inputs[con] = 1
-        for node in new_nodes:
-            if new_nfa.output_port in node.outputs:
-                node.outputs[con] = 1
+                    t_node.rename_output(key_out, key_out + postfix)
+            if i > 0 and nfa.input_port in t_node.inputs:
+                t_node.rename_input(nfa.input_port, con, 1)
+        if i > 0:
+            for node in new_nodes:
+                if new_nfa.output_port in node.outputs:
+                    node.output(con, latency=1)
         new_nodes.extend(tmp_nodes)
-    new_nfa.extend_nodes(new_nodes)
+    new_nfa._extend_nodes(new_nodes)
     new_nfa.add_null_11_node(new_nfa.input_port, new_nfa.output_port)
     return new_nfa
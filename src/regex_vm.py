@@ -0,0 +1,373 @@
+from typing import Callable, Iterator, Optional, Union
+
+from regex_fa_construction import RegexFaConstruction
+from regex_program import Op, Program, compile_program
+from common import arg_type
+
+
+class SparseSet(object):
+    """ Set of instruction indexes with O(1) insert, lookup and clear that remembers insertion order """
+
+    def __init__(self, size: int):
+        self.dense: list = [0] * size
+        self.sparse: list = [0] * size
+        self.starts: list = [0] * size
+        self.counters: list = [()] * size
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, pc: int) -> bool:
+        i = self.sparse[pc]
+        return i < self.size and self.dense[i] == pc
+
+    def add(self, pc: int, start: int, counters: tuple = ()) -> None:
+        self.sparse[pc] = self.size
+        self.dense[self.size] = pc
+        self.starts[self.size] = start
+        self.counters[self.size] = counters
+        self.size += 1
+
+    def clear(self) -> None:
+        self.size = 0
+
+
+class CountedSet(object):
+    """ Set of threads of a program with counted repeats, in insertion order.
+    A thread is an instruction index with the counters it carries, so one instruction may hold several threads """
+
+    def __init__(self, size: int = 0):
+        self.dense: list = []
+        self.starts: list = []
+        self.counters: list = []
+        self.size = 0
+        self._threads: set = set()
+
+    def __len__(self):
+        return self.size
+
+    def has(self, pc: int, counters: tuple) -> bool:
+        return (pc, counters) in self._threads
+
+    def add(self, pc: int, start: int, counters: tuple = ()) -> None:
+        self._threads.add((pc, counters))
+        self.dense.append(pc)
+        self.starts.append(start)
+        self.counters.append(counters)
+        self.size += 1
+
+    def clear(self) -> None:
+        self._threads.clear()
+        self.dense.clear()
+        self.starts.clear()
+        self.counters.clear()
+        self.size = 0
+
+
+def thread_set(program: Program, counted: bool) -> Union[SparseSet, CountedSet]:
+    """ Make an empty thread set for a program, counted tells whether it has counted repeats """
+    return CountedSet() if counted else SparseSet(len(program))
+
+
+def add_thread(program: Program, threads: Union[SparseSet, CountedSet], pc: int, start: int, at_end: bool,
+               counters: tuple = ()) -> None:
+    """ Add pc and every state reachable from it without consuming input.
+    counters are the iteration counts of the counted repeats the thread is inside """
+    if isinstance(threads, CountedSet):
+        add_counted_thread(program, threads, pc, start, at_end, counters)
+        return
+    ops = program.ops
+    first = program.first
+    nexts = program.nexts
+    stack = [pc]
+    while stack:
+        pc = stack.pop()
+        if pc in threads:
+            continue
+        threads.add(pc, start)
+        op = ops[pc]
+        if op == Op.SPLIT or (op == Op.END and at_end):
+            # push in reverse so that targets are visited in order
+            stack.extend(reversed(nexts[first[pc]:first[pc + 1]]))
+
+
+def add_counted_thread(program: Program, threads: CountedSet, pc: int, start: int, at_end: bool,
+                       counters: tuple) -> None:
+    """ add_thread for programs with counted repeats, where the counters are part of every thread """
+    ops = program.ops
+    first = program.first
+    nexts = program.nexts
+    stack = [(pc, counters)]
+    while stack:
+        pc, counters = stack.pop()
+        if threads.has(pc, counters):
+            continue
+        threads.add(pc, start, counters)
+        op = ops[pc]
+        if op >= Op.PUSH:
+            counters = program.count(pc, counters)
+            if counters is None:
+                continue
+        elif op != Op.SPLIT and (op != Op.END or not at_end):
+            continue
+        stack.extend((target, counters) for target in reversed(nexts[first[pc]:first[pc + 1]]))
+
+
+class PikeVm(object):
+    """ Thompson/Pike simulation of a flattened NFA. All threads advance together over the text,
+    each remembering where its match started, so a search is a single left-to-right pass.
+    Matches are leftmost-longest, like the other engines """
+
+    @arg_type(1, (Program, RegexFaConstruction))
+    def __init__(self, program: Union[Program, RegexFaConstruction]):
+        if isinstance(program, RegexFaConstruction):
+            program = compile_program(program)
+        self.program = program
+        self.start = program.start
+        self.counted = program.counted
+
+    def __len__(self):
+        return len(self.program)
+
+    def search(self, text: str, pos: int = 0, last_start: int = None, anchored: bool = False,
+               prefix: str = '') -> Optional[tuple]:
+        """ Find the leftmost-longest match starting between pos and last_start (the end of text by default).
+        When every match starts with the literal prefix, threads are only started where it occurs,
+        and while no thread is alive str.find skips to the next occurrence. Returns (start, end) or None """
+        length = len(text)
+        if last_start is None:
+            last_start = length
+        if anchored:
+            last_start = pos
+        program = self.program
+        ops, operands, classes = program.ops, program.operands, program.classes
+        first, nexts = program.first, program.nexts
+        clist = thread_set(program, self.counted)
+        nlist = thread_set(program, self.counted)
+        best: Optional[tuple] = None
+        i = pos
+        while True:
+            if best is None and i <= last_start:
+                if prefix and clist.size == 0:
+                    i = text.find(prefix, i)
+                    if i == -1 or i > last_start:
+                        break
+                if not prefix or text.startswith(prefix, i):
+                    add_thread(program, clist, self.start, i, i == length)
+            if len(clist) == 0:
+                break
+            ch = text[i] if i < length else None
+            for k in range(clist.size):
+                pc = clist.dense[k]
+                start = clist.starts[k]
+                if best is not None and start > best[0]:
+                    # threads are ordered by start, the rest can only give a match further right
+                    break
+                op = ops[pc]
+                if op == Op.MATCH:
+                    if best is None or start < best[0] or i > best[1]:
+                        best = (start, i)
+                    continue
+                if op == Op.CHAR and ch is not None and ch in classes[operands[pc]]:
+                    for j in range(first[pc], first[pc + 1]):
+                        add_thread(program, nlist, nexts[j], start, i + 1 == length, clist.counters[k])
+            if i >= length:
+                break
+            clist, nlist = nlist, clist
+            nlist.clear()
+            i += 1
+        return best
+
+    def scan(self, text: str, pos: int = 0, skip: Optional[Callable[[int], tuple]] = None, prefix: str = '',
+             at_end: bool = True) -> Iterator[tuple]:
+        """ Yield the (start, end) of the non-overlapping leftmost-longest matches starting from pos to the end of text,
+        the same as repeated calls to search() but in one pass, that only goes back to the end of a match.
+        Whenever no thread is alive at a position i, skip(i) may settle the text the caller already knows about:
+        it returns the matches that start at or after i and the position after them where the scan goes on.
+        at_end tells whether the text ends here; if not, the scan stops at the first start whose match
+        depends on the text that follows, and yields (start, None) for it """
+        length = len(text)
+        program = self.program
+        ops, operands, classes = program.ops, program.operands, program.classes
+        first, nexts = program.first, program.nexts
+        clist = thread_set(program, self.counted)
+        nlist = thread_set(program, self.counted)
+        best: Optional[tuple] = None
+        i = pos
+        while True:
+            if best is None and clist.size == 0:
+                while i < length:
+                    if skip is not None:
+                        known, i = skip(i)
+                        yield from known
+                    if not prefix or i >= length:
+                        break
+                    found = text.find(prefix, i)
+                    if found == i:
+                        break
+                    if found == -1:
+                        # the text that follows decides the starts too close to the end to hold the prefix
+                        found = max(i, length - len(prefix) + 1)
+                        if not at_end and found < length:
+                            yield found, None
+                        return
+                    i = found
+                if i >= length:
+                    return
+            if i >= length and not at_end:
+                # the start of a pending match or of the first live thread, the threads being ordered by start
+                undecided = [clist.starts[0]] if clist.size else []
+                if best is not None:
+                    undecided.append(best[0])
+                yield min(undecided), None
+                return
+            if best is None and i < length and (not prefix or text.startswith(prefix, i)):
+                add_thread(program, clist, self.start, i, False)
+            ch = text[i] if i < length else None
+            for k in range(clist.size):
+                pc = clist.dense[k]
+                start = clist.starts[k]
+                if best is not None and start > best[0]:
+                    break
+                op = ops[pc]
+                if op == Op.MATCH:
+                    if best is None or start < best[0] or i > best[1]:
+                        best = (start, i)
+                    continue
+                if op == Op.CHAR and ch is not None and ch in classes[operands[pc]]:
+                    for j in range(first[pc], first[pc + 1]):
+                        add_thread(program, nlist, nexts[j], start, at_end and i + 1 == length, clist.counters[k])
+            clist, nlist = nlist, clist
+            nlist.clear()
+            if best is not None and clist.size == 0:
+                yield best
+                # an empty match would be found again at the same place
+                i = best[1] if best[1] > best[0] else best[1] + 1
+                best = None
+            elif i >= length:
+                return
+            else:
+                i += 1
+
+    def match_at(self, text: str, pos: int = 0) -> Optional[int]:
+        """ Return the end of the longest match starting at pos, or None """
+        res = self.search(text, pos, anchored=True)
+        return res[1] if res is not None else None
+
+
+class StreamMatcher(object):
+    """ Find the matches of a Pike VM in text that arrives in chunks.
+    Threads survive across feed() calls, matches are reported with global offsets as soon as
+    no live thread can change them, and only the undecided suffix of the input is kept.
+    The matches are the same as a search over the whole text from left to right would give """
+
+    def __init__(self, vm: PikeVm, anchored: bool = False):
+        self.vm = vm
+        self.anchored = anchored
+        self._clist = thread_set(vm.program, vm.counted)
+        self._nlist = thread_set(vm.program, vm.counted)
+        self._buffer = ''
+        # global position of the first character in the buffer
+        self._offset = 0
+        # global position of the next character to process
+        self._pos = 0
+        # threads may only start at or after this position
+        self._next_start = 0
+        self._best: Optional[tuple] = None
+        self._closed = False
+
+    @property
+    def offset(self) -> int:
+        """ Global position of the oldest character still held """
+        return self._offset
+
+    @property
+    def pending(self) -> str:
+        """ The undecided suffix of the input that is still held """
+        return self._buffer
+
+    @arg_type(1, str)
+    def feed(self, chunk: str) -> list:
+        """ Add the next chunk of input and return the (start, end, matched string) of the matches decided by it """
+        if self._closed:
+            raise ValueError('The stream is closed')
+        self._buffer += chunk
+        return self._run(False)
+
+    def close(self) -> list:
+        """ Mark the end of input and return the matches that were still undecided """
+        if self._closed:
+            return []
+        self._closed = True
+        res = self._run(True)
+        self._buffer = ''
+        self._offset = self._pos
+        return res
+
+    def _run(self, final: bool) -> list:
+        vm = self.vm
+        program = vm.program
+        ops, operands, classes = program.ops, program.operands, program.classes
+        first, nexts = program.first, program.nexts
+        res = []
+        length = self._offset + len(self._buffer)
+        while True:
+            i = self._pos
+            if i > length or (i == length and not final):
+                break
+            clist, nlist = self._clist, self._nlist
+            if self._best is None and self._next_start <= i and (i == 0 if self.anchored else i < length):
+                add_thread(program, clist, vm.start, i, False)
+            if i == length:
+                # now that the end of text is known, follow the threads waiting on end nodes
+                ended = thread_set(program, vm.counted)
+                for k in range(clist.size):
+                    add_thread(program, ended, clist.dense[k], clist.starts[k], True, clist.counters[k])
+                clist = ended
+            ch = self._buffer[i - self._offset] if i < length else None
+            best = self._best
+            for k in range(clist.size):
+                pc = clist.dense[k]
+                start = clist.starts[k]
+                if best is not None and start > best[0]:
+                    break
+                op = ops[pc]
+                if op == Op.MATCH:
+                    if best is None or start < best[0] or i > best[1]:
+                        best = (start, i)
+                    continue
+                if op == Op.CHAR and ch is not None and ch in classes[operands[pc]]:
+                    for j in range(first[pc], first[pc + 1]):
+                        add_thread(program, nlist, nexts[j], start, False, clist.counters[k])
+            self._best = best
+            clist.clear()
+            # at the end of text clist is the ended set, the threads it was built from must go as well
+            self._clist.clear()
+            self._clist, self._nlist = nlist, self._clist
+            self._pos = i + 1
+            live = self._clist
+            if best is not None and (live.size == 0 or live.starts[0] > best[0]):
+                res.append((best[0], best[1], self._buffer[best[0] - self._offset:best[1] - self._offset]))
+                live.clear()
+                self._best = None
+                self._next_start = best[1] if best[1] > best[0] else best[1] + 1
+                self._pos = self._next_start
+            if self.anchored and self._best is None and self._clist.size == 0 and self._pos > 0:
+                # an anchored pattern has nothing left to look for after the start of text
+                self._pos = self._next_start = max(self._pos, length)
+                break
+        self._trim()
+        return res
+
+    def _trim(self) -> None:
+        """ Drop the part of the buffer that no thread or pending match can refer to any more """
+        keep = self._pos
+        if self._clist.size:
+            keep = min(keep, self._clist.starts[0])
+        if self._best is not None:
+            keep = min(keep, self._best[0])
+        keep = min(max(keep, self._offset), self._offset + len(self._buffer))
+        if keep > self._offset:
+            self._buffer = self._buffer[keep - self._offset:]
+            self._offset = keep
@@ -0,0 +1,74 @@
+import unittest
+
+from regex_parser import charset_parser, regex_to_tokens
+from char_class import *
+
+
+class CharClassTest(unittest.TestCase):
+
+    def test_charset_class(self):
+        self.assertRaises(TypeError, lambda: charset_class(None))
+        cc = charset_class(charset_parser(r'A-Za-z0-9_\-'))
+        for ch in 'aZ09_-':
+            self.assertIn(ch, cc)
+        for ch in ' .[é':
+            self.assertNotIn(ch, cc)
+        self.assertEqual(cc.ranges, ())
+        cc = charset_parser('a-zа-я')
+        self.assertIn('ж', charset_class(cc))
+        self.assertNotIn('ж', charset_class(cc, negative=True))
+        self.assertIn('!', charset_class(cc, negative=True))
+        # bitmaps are built from the members directly, and classes are shared between equal charsets
+        self.assertEqual(literal_class('a').bitmap, 1 << ord('a'))
+        self.assertIs(literal_class('a'), literal_class('a'))
+        self.assertEqual(literal_class('é').ranges, ((0xe9, 0xe9),))
+        self.assertEqual(charset_class(charset_parser('1-3c-e')).bitmap, 0b1110 << ord('0') | 0b111 << ord('c'))
+        self.assertIs(charset_class(charset_parser('1-3')), charset_class(charset_parser('1-3')))
+
+    def test_negation(self):
+        # the tokenizer leaves the '^' of a negated charset out of its members
+        cc = charset_class(regex_to_tokens('[^0-9]')[0].members, negative=True)
+        self.assertIn('^', cc)
+        self.assertNotIn('5', cc)
+        self.assertIn('a', cc)
+        self.assertIn('汉', cc)
+        self.assertNotIn('٣', cc)
+
+    def test_same_as_tokens(self):
+        chars = [chr(code) for code in range(0x500)] + list('汉族٣٩')
+        for charset in [r'\w-', r'\s\d', '3-7', 'A-z', r'\.\[', 'é-ż', '汉']:
+            tokens = charset_parser(charset)
+            for negative in (False, True):
+                cc = charset_class(tokens, negative)
+                for ch in chars:
+                    if ch.isdigit() and not ch.isdecimal():
+                        continue
+                    expected = any(token_contains(token, ch) for token in tokens) != negative
+                    self.assertEqual(ch in cc, expected)
+
+    def test_named_classes(self):
+        self.assertIn('ж', WORD)
+        self.assertIn('_', WORD)
+        self.assertNotIn('-', WORD)
+        self.assertIn('\t', SPACE)
+        self.assertNotIn(' ', SPACE)
+        self.assertIn('٣', DIGIT)
+        self.assertNotIn('a', DIGIT)
+        self.assertIn('ж', ALPHA)
+        self.assertNotIn('\n', ANY)
+        self.assertIn('汉', ANY)
+        self.assertIn('\n', ALL)
+        self.assertEqual(literal_class('é'), charset_class(charset_parser('é')))
+        self.assertIn('é', literal_class('é'))
+        self.assertNotIn('e', literal_class('é'))
+
+    def test_non_ascii_signatures(self):
+        classes = [WORD, DIGIT, ANY, literal_class('é'), charset_class(charset_parser('а-я'))]
+        signatures = non_ascii_signatures(classes)
+        for ch in 'éжЖ汉٣²\u2028😀':
+            self.assertIn(tuple(ch in char_class for char_class in classes), signatures)
+        self.assertEqual(non_ascii_signatures([literal_class('a')]), {(False,)})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,30 @@
+import unittest
+
+from common import *
+
+
+class CommonTest(unittest.TestCase):
+
+    def test_set_validation(self):
+        @arg_type(0, str)
+        @arg_callable(1)
+        @element_type(2, int)
+        def f(a, b, c):
+            """ f """
+            return a
+
+        self.assertEqual(f('a', len, [1]), 'a')
+        self.assertEqual(f.__doc__, ' f ')
+        self.assertRaises(TypeError, lambda: f(1, len, [1]))
+        self.assertRaises(TypeError, lambda: f('a', 1, [1]))
+        self.assertRaises(TypeError, lambda: f('a', len, ['1']))
+        set_validation(False)
+        try:
+            self.assertEqual(f(1, 1, ['1']), 1)
+        finally:
+            set_validation(True)
+        self.assertRaises(TypeError, lambda: f(1, len, [1]))
+
+
+if __name__ == '__main__':
+    unittest.main()
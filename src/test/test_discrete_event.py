@@ -1,6 +1,8 @@
+import copy
 import unittest
 
 from discrete_event import *
+from common import set_trace
 
 
 class DiscreteEventTest(unittest.TestCase):
@@ -28,8 +30,102 @@ class DiscreteEventTest(unittest.TestCase):
             event(clock=7, node=n, var='A', val=False),
             event(clock=9, node=None, var='B', val=True),
         ])
+        self.assertEqual(m.steps, 4)
         self.assertRaises(TypeError, lambda: m.add_node('test', None))
 
+    def test_schedulers(self):
+        self.assertRaises(ValueError, lambda: DiscreteEvent('m', scheduler='calendar'))
+        histories = []
+        for scheduler in schedulers:
+            m = DiscreteEvent('fan_out', scheduler=scheduler)
+            m.input_port('A', latency=1)
+            for i in range(5):
+                n = m.add_node('copy_{}'.format(i), lambda a: a)
+                n.input('A', latency=1)
+                n.output('B{}'.format(i % 2), latency=1)
+            m.output_port('B0', latency=1)
+            m.output_port('B1', latency=1)
+            m.execute(source_event('A', 1, 0), source_event('A', 2, 3))
+            histories.append((m.state_history, [(e.clock, e.node.name if e.node else None, e.var, e.val)
+                                                for e in m.event_history]))
+        for history in histories[1:]:
+            self.assertEqual(history, histories[0])
+
+    def test_history(self):
+        self.assertRaises(ValueError, lambda: DiscreteEvent('m', history='sometimes'))
+        self.assertRaises(ValueError, lambda: DiscreteEvent('m', history=History.RING, history_size=0))
+        runs = {}
+        for history in (History.FULL, History.DELTA, History.RING, History.OFF):
+            m = DiscreteEvent("logic_not", history=history, history_size=2)
+            m.input_port("A", latency=1)
+            m.output_port("B", latency=1)
+            n = m.add_node("not", lambda a: not a if isinstance(a, bool) else None)
+            n.input("A", latency=1)
+            n.output("B", latency=1)
+            for _ in range(2):
+                m.execute(source_event("A", True, 0), source_event("A", False, 5))
+            runs[history] = (m.state_history, [(e.clock, e.var, e.val) for e in m.event_history])
+        full_states, full_events = runs[History.FULL]
+        self.assertEqual(len(full_events), 4)
+        self.assertEqual(runs[History.DELTA], runs[History.FULL])
+        self.assertEqual(runs[History.RING], (full_states[-2:], full_events[-2:]))
+        self.assertEqual(runs[History.OFF], ([], []))
+
+    def test_port_index(self):
+        m = DiscreteEvent('index')
+        n1 = m.add_node('n1', lambda a: a)
+        n2 = m.add_node('n2', lambda a: a)
+        n2.input('A', latency=2)
+        n1.input('A', latency=1)
+        n1.output('B')
+        self.assertEqual(m.consumers('A'), [(n1, 1), (n2, 2)])
+        self.assertEqual(m.producers('B'), [n1])
+        n1.rename_input('A', 'C')
+        n1.rename_output('B', 'D', latency=3)
+        self.assertEqual(m.consumers('A'), [(n2, 2)])
+        self.assertEqual(m.consumers('C'), [(n1, 1)])
+        self.assertEqual(m.producers('B'), [])
+        self.assertEqual(n1.outputs['D'], 3)
+        other = DiscreteEvent('other')
+        copied = copy.deepcopy(n2)
+        other.add_nodes([copied])
+        copied.rename_input('A', 'E')
+        self.assertEqual(m.consumers('A'), [(n2, 2)])
+        self.assertEqual(other.consumers('E'), [(copied, 2)])
+        # a node added twice is kept once, in the list as in the index
+        m.add_nodes([n1, n2, n1])
+        self.assertEqual(m.nodes, [n1, n2])
+        self.assertEqual(m.consumers('A'), [(n2, 2)])
+
+    def test_trace(self):
+        m = DiscreteEvent("trace")
+        m.input_port("A", latency=1)
+        n = m.add_node("copy", lambda a: a)
+        n.input("A", latency=1)
+        with self.assertRaises(AssertionError):
+            with self.assertLogs('discrete_event'):
+                m.execute(source_event("A", True, 0))
+        set_trace(True)
+        try:
+            with self.assertLogs('discrete_event') as logs:
+                m.execute(source_event("A", True, 0))
+            self.assertTrue(any('_pop_next_event' in line for line in logs.output))
+        finally:
+            set_trace(False)
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_stable_order(self):
+        for scheduler in schedulers.values():
+            q = scheduler()
+            q.push(event(clock=4, node=None, var='a', val=1))
+            q.push(event(clock=2, node=None, var='b', val=2))
+            q.push(event(clock=4, node=None, var='c', val=3))
+            q.push(event(clock=2, node=None, var='d', val=4))
+            self.assertEqual(len(q), 4)
+            self.assertEqual([q.pop().var for _ in range(4)], ['b', 'd', 'a', 'c'])
+            self.assertEqual(len(q), 0)
+
 
 class NodeTest(unittest.TestCase):
     def test_logic_not(self):
@@ -0,0 +1,105 @@
+import unittest
+
+from regex_to_nfa import regex_to_nfa
+from regex_dfa import *
+
+
+class RegexDfaTest(unittest.TestCase):
+
+    def test_match_at(self):
+        self.assertRaises(TypeError, lambda: RegexDfa(None))
+        dfa = RegexDfa(regex_to_nfa('[0-9]+'))
+        self.assertEqual(dfa.match_at('1324354657'), 10)
+        self.assertEqual(dfa.match_at('hello1324354657itmo', 5), 15)
+        self.assertEqual(dfa.match_at('hello'), None)
+        dfa = RegexDfa(regex_to_nfa('a*b*'))
+        self.assertEqual(dfa.match_at('aab'), 3)
+        self.assertEqual(dfa.match_at('c'), 0)
+
+    def test_end_node(self):
+        dfa = RegexDfa(regex_to_nfa('itmo$'))
+        self.assertEqual(dfa.match_at('hello itmo', 6), 10)
+        self.assertEqual(dfa.match_at('itmo hello'), None)
+
+    def test_longest_match(self):
+        dfa = RegexDfa(regex_to_nfa('a{1,3}'))
+        self.assertEqual(dfa.match_at('aab'), 2)
+        self.assertEqual(dfa.match_at('aaaa'), 3)
+        dfa = RegexDfa(regex_to_nfa(r'[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+'))
+        self.assertEqual(dfa.match_at('wangxinxin@hdu.edu.cn"'), 21)
+
+    def test_character_classes(self):
+        dfa = RegexDfa(regex_to_nfa(r'[^0-9]+\w'))
+        self.assertEqual(dfa.match_at('ab1'), 3)
+        # characters outside ASCII get their classes when they are first seen
+        self.assertEqual(dfa.match_at('汉族a'), 3)
+        self.assertEqual(dfa.match_at('汉族'), 2)
+
+    def test_counted_repeat(self):
+        dfa = RegexDfa(regex_to_nfa('a{70}'))
+        self.assertEqual(dfa.match_at('a' * 69), None)
+        self.assertEqual(dfa.match_at('a' * 75), 70)
+        dfa = LazyDfa(regex_to_nfa('(ab){2,}c{65,}$'))
+        self.assertEqual(dfa.match_at('abab' + 'c' * 65), 69)
+        self.assertEqual(dfa.match_at('abab' + 'c' * 64), None)
+
+    def test_size_cap(self):
+        self.assertRaises(DfaSizeError, lambda: RegexDfa(regex_to_nfa('.{,5}x'), max_states=4))
+        dfa = RegexDfa(regex_to_nfa('.{,5}x'))
+        self.assertLess(len(dfa), 20)
+        self.assertEqual(dfa.match_at('abx'), 3)
+
+    def test_minimize(self):
+        dfa = RegexDfa(regex_to_nfa(r'\d+(\.\d+)*'))
+        self.assertEqual(dfa.minimize(), (5, 3))
+        self.assertEqual(dfa.info().states_unminimized, 5)
+        self.assertEqual(dfa.match_at('1.23.4.'), 6)
+        self.assertEqual(dfa.match_at('.1'), None)
+        self.assertEqual(dfa.match_at('١٢.٣'), 4)
+        # the states after 'x' and 'y' only differ on a character above ASCII
+        dfa = RegexDfa(regex_to_nfa('x[a-zé]y[a-z]'))
+        dfa.minimize()
+        self.assertEqual(dfa.match_at('xéyb'), 4)
+        self.assertEqual(dfa.match_at('xbyé'), None)
+        self.assertRaises(ValueError, lambda: LazyDfa(regex_to_nfa('a')).minimize())
+
+
+    def test_scan(self):
+        dfa = RegexDfa(regex_to_nfa(r'[a-z]+\d'))
+        text = 'ab1 cd2 ef'
+        self.assertEqual(dfa.scan(text, len(text), True), ([(0, 3), (4, 7)], 10))
+        # the run at 'e' reaches the end of a chunk that the text goes on after
+        self.assertEqual(dfa.scan(text, len(text), False), ([(0, 3), (4, 7)], 8))
+        self.assertEqual(dfa.scan(text, 6, False), ([(0, 3), (4, 7)], 6))
+        self.assertEqual(dfa.scan(text, len(text), True, prefix='c'), ([(4, 7)], 10))
+        # the starts too close to the end to hold the prefix are undecided
+        self.assertEqual(dfa.scan('xcd', 3, False, prefix='cd3'), ([], 1))
+
+
+class LazyDfaTest(unittest.TestCase):
+
+    def test_match_at(self):
+        self.assertRaises(TypeError, lambda: LazyDfa(None))
+        self.assertRaises(ValueError, lambda: LazyDfa(regex_to_nfa('a'), max_states=2))
+        dfa = LazyDfa(regex_to_nfa(r'[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+'))
+        self.assertEqual(dfa.info().states, 2)
+        self.assertEqual(dfa.match_at('wangxinxin@hdu.edu.cn"'), 21)
+        self.assertEqual(dfa.match_at('wangxinxin'), None)
+        built = dfa.info().states_built
+        self.assertGreater(built, 2)
+        dfa.match_at('wangxinxin@hdu.edu.cn"')
+        self.assertEqual(dfa.info().states_built, built)
+
+    def test_flush(self):
+        dfa = LazyDfa(regex_to_nfa('.{,9}x'), max_states=4)
+        text = 'a' * 8 + 'x'
+        self.assertEqual(dfa.match_at(text), 9)
+        info = dfa.info()
+        self.assertLessEqual(info.states, 4)
+        self.assertGreater(info.flushes, 0)
+        self.assertEqual(dfa.match_at(text), 9)
+        self.assertEqual(dfa.match_at('a' * 12 + 'x'), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
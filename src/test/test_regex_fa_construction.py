@@ -213,6 +213,53 @@ class RegexFaConstructionTest(unittest.TestCase):
         nfa.execute('c')
         self.assertEqual(nfa.is_matched(), False)
 
+    def test_add_count_nodes(self):
+        # 'a{2,3}' with counters
+        nfa = RegexFaConstruction('nfa')
+        self.assertRaises(TypeError, lambda: nfa.add_count_loop_node('n1', 'n2', '3'))
+        nfa.add_count_push_node(nfa.input_port, 'n1')
+        nfa.add_null_21_node('n1', 'n5', 'n2')
+        nfa.add_count_loop_node('n2', 'n3', 3)
+        nfa.add_normal_node('n3', 'n4', 'a')
+        nfa.add_count_inc_node('n4', 'n5', 3)
+        nfa.add_count_exit_node('n2', nfa.output_port, 2)
+        nfa.execute('a')
+        self.assertEqual(nfa.is_matched(), False)
+        nfa.execute('aa')
+        self.assertEqual(nfa.get_matched_str(), 'aa')
+        nfa.execute('aaaa')
+        self.assertEqual(nfa.get_matched_str(), 'aaa')
+
+    def test_apply_counter(self):
+        self.assertEqual(apply_counter(Kind.COUNT_PUSH, 0, (1,)), (1, 0))
+        self.assertEqual(apply_counter(Kind.COUNT_LOOP, 3, (1, 2)), (1, 2))
+        self.assertEqual(apply_counter(Kind.COUNT_LOOP, 2, (1, 2)), None)
+        self.assertEqual(apply_counter(Kind.COUNT_LOOP, -1, (1, 200)), (1, 200))
+        self.assertEqual(apply_counter(Kind.COUNT_INC, 3, (1, 2)), (1, 3))
+        self.assertEqual(apply_counter(Kind.COUNT_INC, 2, (2,)), (2,))
+        self.assertEqual(apply_counter(Kind.COUNT_EXIT, 2, (1, 2)), (1,))
+        self.assertEqual(apply_counter(Kind.COUNT_EXIT, 3, (1, 2)), None)
+
+    def test_execute(self):
+        nfa = RegexFaConstruction('nfa')
+        nfa.add_normal_node(nfa.input_port, 'n1', 'a')
+        nfa.add_null_12_node('n1', nfa.input_port, nfa.output_port)
+        nfa.execute('xaab', 1)
+        self.assertEqual(nfa.get_matched_index(), 3)
+        self.assertEqual(nfa.get_matched_str(), 'aa')
+        nfa.execute('xaab')
+        self.assertEqual(nfa.is_matched(), False)
+        self.assertEqual(nfa.get_matched_str(), None)
+
+    def test_cursor(self):
+        cursor = Cursor('ab')
+        self.assertEqual(cursor.peek(), 'a')
+        cursor = cursor.advance().advance()
+        self.assertEqual(cursor.pos, 2)
+        self.assertEqual(cursor.peek(), None)
+        self.assertEqual(cursor.at_end(), True)
+        self.assertEqual(Cursor('ab', 0, (2,)).advance().counters, (2,))
+
     def test_visualize(self):
         nfa = RegexFaConstruction('nfa')
         nfa.add_null_12_node(nfa.input_port, 'n1', 'n2')
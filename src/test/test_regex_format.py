@@ -0,0 +1,54 @@
+import unittest
+
+from regex_to_nfa import regex_to_nfa
+from regex_program import compile_program
+from regex_dfa import RegexDfa
+from char_class import charset_class, WORD
+from regex_parser import charset_parser
+from regex_format import *
+
+
+class FormatTest(unittest.TestCase):
+
+    def test_program(self):
+        program = compile_program(regex_to_nfa(r'[а-я\d]+x{70}$'))
+        w = Writer()
+        write_program(w, program)
+        copy = read_program(Reader(w.getvalue()))
+        self.assertEqual(copy.ops, program.ops)
+        self.assertEqual(copy.operands, program.operands)
+        self.assertEqual(copy.first, program.first)
+        self.assertEqual(copy.nexts, program.nexts)
+        self.assertEqual(copy.classes, program.classes)
+        self.assertEqual(copy.start, program.start)
+
+    def test_class(self):
+        for char_class in (WORD, charset_class(charset_parser('^a-zж0-3'), negative=True)):
+            w = Writer()
+            write_class(w, char_class)
+            self.assertEqual(read_class(Reader(w.getvalue())), char_class)
+
+    def test_dfa(self):
+        dfa = RegexDfa(regex_to_nfa(r'x[a-zé]y\d{2,3}'))
+        dfa.match_at('xéy12')
+        w = Writer()
+        write_dfa(w, dfa)
+        copy = read_dfa(Reader(w.getvalue()), dfa.program)
+        self.assertEqual(copy.table, dfa.table)
+        self.assertEqual(copy.info(), dfa.info())
+        self.assertEqual(copy.match_at('xéy123'), 6)
+        # classes first seen after loading are built from the saved thread sets
+        self.assertEqual(copy.match_at('xay١٢'), 5)
+        self.assertEqual(copy.match_at('xжy12'), None)
+
+    def test_errors(self):
+        w = Writer()
+        write_program(w, compile_program(regex_to_nfa('ab')))
+        data = w.getvalue()
+        self.assertRaises(FormatError, lambda: Reader(b'PK' + data))
+        self.assertRaises(FormatError, lambda: Reader(data[:4] + b'\x09\x00' + data[6:]))
+        self.assertRaises(FormatError, lambda: read_program(Reader(data[:-3])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,9 @@
+import os
+import pickle
+import tempfile
+import timeit
 import unittest
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 
 from regex_lib import *
 
@@ -26,6 +31,10 @@ class RegexLibTest(unittest.TestCase):
         self.assertEqual(search(regex, text), None)
         regex = '^hello'
         self.assertEqual(search(regex, text), (0, 5))
+        # the '^' that negates a set is not one of its members
+        for engine in ENGINES:
+            self.assertEqual(compile('[^a]', engine).search('^'), (0, 1))
+            self.assertEqual(compile('[^^]', engine).search('^^x'), (2, 3))
         regex = 'itmo$'
         self.assertEqual(search(regex, text), (6, 10))
 
@@ -50,6 +59,93 @@ class RegexLibTest(unittest.TestCase):
         regex = r'wxx$'
         self.assertEqual(split(regex, text), ['wxx，wxx，wxx，wxx，', ''])
 
+    def test_finditer(self):
+        self.assertRaises(TypeError, lambda: finditer(0, 1))
+        text = 'The system will be updated at 23:58:01 tomorrow and 00:00:00 next day'
+        it = finditer('[0-2][0-9]:[0-5][0-9]:[0-5][0-9]', text)
+        self.assertEqual(next(it), (30, 38))
+        self.assertEqual(list(it), [(52, 60)])
+        self.assertEqual(list(finditer('x*', 'ab')), [(0, 0), (1, 1)])
+        self.assertEqual(list(finditer('^a', 'aaa')), [(0, 1)])
+        self.assertEqual(list(finditer('[0-9]+', 'hello')), [])
+
+    def test_findall(self):
+        self.assertRaises(TypeError, lambda: findall(0, 1))
+        self.assertEqual(findall(r'\d+', 'a1b22c333'), ['1', '22', '333'])
+        self.assertEqual(findall(r'\w+$', 'wxx，wxx'), ['wxx'])
+        self.assertEqual(compile(r'\d+', 'dfa').findall('a1b22c333'), ['1', '22', '333'])
+
+    def test_stream(self):
+        self.assertRaises(TypeError, lambda: stream(0))
+        text = 'The system will be updated at 23:58:01 tomorrow and 00:00:00 next day'
+        for engine in ('pike', 'dfa'):
+            m = compile('[0-2][0-9]:[0-5][0-9]:[0-5][0-9]', engine).stream()
+            res = []
+            for i in range(0, len(text), 7):
+                res.extend(m.feed(text[i:i + 7]))
+            res.extend(m.close())
+            self.assertEqual(res, [(30, 38, '23:58:01'), (52, 60, '00:00:00')])
+
+    def test_file_search(self):
+        self.assertRaises(TypeError, lambda: search_file(0, 'f'))
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'log.txt')
+            with open(path, 'wb') as f:
+                f.write(b'start 23:58:01\n' + b'.' * 1000 + b' 00:00:00 \xff end')
+            regex = '[0-2][0-9]:[0-5][0-9]:[0-5][0-9]'
+            self.assertEqual(search_file(regex, path), (6, 14))
+            self.assertEqual(list(finditer_file(regex, path, 5)), [(6, 14), (1016, 1024)])
+            self.assertEqual(search_file('end$', path, 3), (1027, 1030))
+            self.assertEqual(search_file('^end', path), None)
+            self.assertRaises(ValueError, lambda: search_file(regex, path, 0))
+            empty = os.path.join(tmp, 'empty.txt')
+            open(empty, 'wb').close()
+            self.assertEqual(search_file(regex, empty), None)
+            self.assertEqual(search_file('x*', empty), None)
+            # the match at 0 is pending while a longer one is still possible when the file ends
+            pending = os.path.join(tmp, 'pending.txt')
+            with open(pending, 'wb') as f:
+                f.write(b'abbac1c 1')
+            for chunk_size in (1, 4, DEFAULT_CHUNK_SIZE):
+                self.assertEqual(list(finditer_file('.*1[^a]', pending, chunk_size)), [(0, 7)])
+            self.assertEqual(list(finditer_file('.*1[^a]', pending)), list(finditer('.*1[^a]', 'abbac1c 1')))
+
+    def test_literal_prefilter(self):
+        for engine in ('pike', 'nfa', 'dfa'):
+            p = compile(r'error: \d+', engine)
+            self.assertEqual(p.search('ok'), None)
+            self.assertEqual(p.search('error: x error: 12'), (9, 18))
+            self.assertEqual(p.findall('error: 1 error: error: 23'), ['error: 1', 'error: 23'])
+            p = compile(r'\w+@\w+', engine)
+            self.assertEqual(p.search('no address here'), None)
+            self.assertEqual(p.search('to bob@itmo'), (3, 11))
+            p = compile('^ab+c', engine)
+            self.assertEqual(p.match('xabbc'), None)
+            self.assertEqual(p.match('abbc'), (0, 4))
+
+    def test_nested_repeat_events(self):
+        # the discrete-event engine runs on the NFA with its null nodes, in the same number of events
+        for regex, text in [(r'(.*.)*$', 'ab1baaabac1'), (r'(.*.)*\d{0,2}$', 'ab1baaabac1'), (r'(a*a)*b', 'aaaab')]:
+            nfa = regex_to_nfa(regex)
+            nfa.execute(text)
+            p = compile(regex, 'nfa')
+            self.assertEqual(p.match(text), (0, nfa.get_matched_index()))
+            self.assertEqual(p._nfa.m.steps, nfa.m.steps)
+            for engine in ENGINES:
+                self.assertEqual(compile(regex, engine).match(text), (0, nfa.get_matched_index()))
+
+    def test_long_repeat(self):
+        self.assertEqual(search('a{10,12}', 'a' * 9 + 'b' + 'a' * 13), (10, 22))
+        self.assertEqual(match('.{,50}x', 'y' * 51 + 'x'), None)
+        self.assertEqual(match('.{,50}x', 'y' * 50 + 'x'), (0, 51))
+        self.assertRaises(ValueError, lambda: compile('a{2,1}'))
+        for engine in ENGINES:
+            p = compile(r'#\d{100}', engine)
+            self.assertEqual(p.search('#' + '1' * 99 + ' #' + '2' * 120), (101, 202))
+            p = compile(r'x.{0,80}y', engine)
+            self.assertEqual(p.search('x' + '-' * 90 + 'xy' + '-' * 79 + 'y'), (91, 173))
+            self.assertEqual(p.search('x' + '-' * 90 + 'xy' + '-' * 80 + 'y'), (91, 93))
+
     def test_time_parsing(self):
         text = 'The system will be updated at 23:58:01 tomorrow'
         regex = '[0-2][0-9]:[0-5][0-9]:[0-5][0-9]'
@@ -66,6 +162,148 @@ class RegexLibTest(unittest.TestCase):
         d = search(regex, json_text)
         self.assertEqual(json_text[d[0]:d[1]], 'wangxinxin@hdu.edu.cn')
 
+    def test_compile(self):
+        self.assertRaises(TypeError, lambda: compile(0))
+        for regex in ('', '()', 'a()b'):
+            self.assertRaises(ValueError, lambda: compile(regex))
+        p = compile('[0-9]+')
+        self.assertIs(compile('[0-9]+'), p)
+        self.assertEqual(p.match('1324354657'), (0, 10))
+        self.assertEqual(p.search('hello1324354657itmo'), (5, 15))
+        self.assertEqual(p.split('a1b22'), ['a', 'b', ''])
+        self.assertEqual(compile('-').sub('', '2004-959-559', 1), '2004959-559')
+
+    def test_compile_dfa(self):
+        self.assertRaises(ValueError, lambda: compile('a', 'backtracking'))
+        p = compile('[0-9]+', 'dfa')
+        self.assertEqual(p.engine, 'dfa')
+        self.assertIsNot(p, compile('[0-9]+'))
+        self.assertEqual(p.search('hello1324354657itmo'), (5, 15))
+        self.assertEqual(compile('itmo$', 'dfa').search('hello itmo'), (6, 10))
+        self.assertEqual(compile(r' #.*$', 'dfa').sub('', '2004-959-559 # this is a phone number', 1),
+                         '2004-959-559')
+        p = compile(r'\d+(\.\d+)*', 'dfa', minimize=True)
+        self.assertIsNot(p, compile(r'\d+(\.\d+)*', 'dfa'))
+        self.assertEqual(p.info().states, 3)
+        self.assertEqual(p.info().states_unminimized, 5)
+        self.assertEqual(p.search('v1.2.30 '), (1, 7))
+
+    def test_dfa_size_fallback(self):
+        # a DFA over the size cap falls back to the Pike VM, which has no event limit on long texts
+        text = 'ab' * 1500
+        p = Pattern('[ab]*a[ab]{14}', 'dfa')
+        self.assertEqual(p.engine, 'pike')
+        self.assertEqual(p.info(), None)
+        self.assertEqual(p.match(text), compile('[ab]*a[ab]{14}').match(text))
+        self.assertEqual(p.match(text), (0, 2999))
+        # a class first seen while matching grows the DFA over the cap
+        p = Pattern('[ab]*é[ab]{3}', 'dfa')
+        p._dfa.max_states = len(p._dfa)
+        text += 'éabab'
+        self.assertEqual(p.search(text), compile('[ab]*é[ab]{3}').search(text))
+        self.assertEqual(p.engine, 'pike')
+
+    def test_compile_lazy(self):
+        p = compile(r'\d+\w', 'lazy')
+        self.assertEqual(p.engine, 'lazy')
+        self.assertEqual(p.match('123b'), (0, 4))
+        self.assertEqual(p.info().flushes, 0)
+        self.assertEqual(compile(r'\d+\w').info(), None)
+
+    def test_dumps_loads(self):
+        for engine in ENGINES:
+            p = compile(r'^[\w-]+@\w+(\.\w+){1,70}', engine)
+            q = loads(dumps(p))
+            self.assertEqual(repr(q), repr(p))
+            self.assertEqual(q.findall('ab@cd.ef gh'), ['ab@cd.ef'])
+            self.assertEqual(q.search('жё@ц.у'), (0, 6))
+            self.assertEqual(q.search(' ab@cd.ef'), None)
+            q = pickle.loads(pickle.dumps(p))
+            self.assertEqual(q.findall('ab@cd.ef gh'), ['ab@cd.ef'])
+        p = compile(r'\d+(\.\d+)*', 'dfa', minimize=True)
+        with tempfile.TemporaryFile() as f:
+            dump(p, f)
+            f.seek(0)
+            q = load(f)
+        self.assertEqual(q.info(), p.info())
+        self.assertEqual(q.search('v1.2.30 '), (1, 7))
+        self.assertRaises(FormatError, lambda: loads(b'not a pattern'))
+
+    def test_batch(self):
+        texts = ['id {} at {}'.format(i, 'x' * (i % 3)) for i in range(50)]
+        p = compile(r'\d+')
+        expected = [p.search(text) for text in texts]
+        self.assertEqual(list(p.search_many(iter(texts))), expected)
+        self.assertEqual(list(match_many(r'id', texts[:3])), [(0, 2)] * 3)
+        self.assertEqual(list(sub_many(r'x+', '-', texts[:3], 1)), ['id 0 at ', 'id 1 at -', 'id 2 at -'])
+        self.assertEqual(list(p.search_many(texts, ordered=False))[7], (7, expected[7]))
+        self.assertRaises(ValueError, lambda: list(p.search_many(texts, chunksize=0)))
+        with ThreadPoolExecutor(2) as executor:
+            self.assertEqual(list(p.search_many(texts, executor, chunksize=4)), expected)
+        with ProcessPoolExecutor(2) as executor:
+            self.assertEqual(list(search_many(r'\d+', texts, executor, chunksize=7)), expected)
+            self.assertEqual(sorted(p.search_many(texts, executor, chunksize=7, ordered=False)),
+                             list(enumerate(expected)))
+            self.assertEqual(list(p.sub_many('#', texts[:2], executor=executor)), ['id # at ', 'id # at x'])
+
+    def test_split_search(self):
+        text = 'ab12 x{} c3 zz99 end'.format('-' * 40)
+        with ProcessPoolExecutor(2) as executor:
+            for regex in (r'[a-z]+\d+', r'-{0,30}', r'\w+$', r'x-+', r'(z9){0,70}'):
+                p = compile(regex)
+                for chunk_size in (1, 3, 7, 64):
+                    self.assertEqual(list(p.finditer(text, executor, chunk_size)), list(p.finditer(text)))
+                    self.assertEqual(p.search(text, executor, chunk_size), p.search(text))
+            self.assertEqual(list(finditer(r'^ab', text, executor, 4)), [(0, 2)])
+            self.assertEqual(search(r'\d', 'abc', executor, 1), None)
+            self.assertRaises(ValueError, lambda: list(compile('a').finditer(text, executor, 0)))
+
+    def test_split_search_scaling(self):
+        # a match that spans every chunk is stitched in one pass, not once per start left open by a chunk
+        text = 'a' * 8000 + '@x'
+        p = compile(r'\w+@x')
+        start = timeit.default_timer()
+        expected = list(p.finditer(text))
+        sequential = timeit.default_timer() - start
+        self.assertEqual(expected, [(0, 8002)])
+        with ThreadPoolExecutor(2) as executor:
+            for chunk_size in (100, 8002):
+                start = timeit.default_timer()
+                self.assertEqual(list(p.finditer(text, executor, chunk_size)), expected)
+                self.assertLess(timeit.default_timer() - start, 10 * sequential + 0.5)
+
+    def test_stacked_repeats(self):
+        self.assertEqual(search('a{2}*b', 'xb'), (1, 2))
+        self.assertEqual(match('a{2}*b', 'b'), (0, 1))
+        self.assertEqual(search('a+*b', 'xb'), (1, 2))
+        self.assertEqual(search('a{1,2}*b', 'cb'), (1, 2))
+        self.assertEqual(search('((ab{0,1}c{2,})){1,2}{0,1}', 'x'), (0, 0))
+
+    def test_pattern_cache(self):
+        cache = PatternCache(2)
+        self.assertRaises(ValueError, lambda: PatternCache(-1))
+        p = cache.get('a')
+        self.assertIs(cache.get('a'), p)
+        cache.get('b')
+        cache.get('a')
+        cache.get('c')
+        self.assertEqual(cache.info(), cache_info_t(hits=2, misses=3, evictions=1, maxsize=2, currsize=2))
+        # 'b' was the least recently used pattern
+        cache.get('b')
+        self.assertEqual(cache.info().misses, 4)
+        cache.resize(0)
+        self.assertEqual(len(cache), 0)
+        cache.clear()
+        self.assertEqual(cache.info(), cache_info_t(0, 0, 0, 0, 0))
+
+    def test_module_cache(self):
+        purge()
+        search('itmo$', 'hello itmo')
+        search('itmo$', 'hello itmo')
+        info = cache_info()
+        self.assertEqual((info.hits, info.misses, info.currsize), (1, 1, 1))
+        set_cache_size(128)
+
 
 if __name__ == '__main__':
     unittest.main()
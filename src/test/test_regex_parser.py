@@ -6,92 +6,106 @@ from regex_parser import *
 class RegexParserTest(unittest.TestCase):
 
     def test_process_trans(self):
-        self.assertEqual(process_trans('$'), {'value': '$', 'type': 1, 'kind': Kind.NORMAL})
-        self.assertEqual(process_trans('w'), {'value': 'w', 'type': 1, 'kind': Kind.TRANS})
-        self.assertEqual(process_trans('s'), {'value': 's', 'type': 1, 'kind': Kind.TRANS})
-        self.assertEqual(process_trans('d'), {'value': 'd', 'type': 1, 'kind': Kind.TRANS})
+        self.assertEqual(process_trans('$'), Token(TokenKind.CHAR, '$'))
+        self.assertEqual(process_trans('w'), Token(TokenKind.TRANS, 'w'))
+        self.assertEqual(process_trans('s'), Token(TokenKind.TRANS, 's'))
+        self.assertEqual(process_trans('d'), Token(TokenKind.TRANS, 'd'))
+        self.assertTrue(process_trans('d').is_operand)
 
     def test_process_set(self):
         inc, d = process_set(r'[a-z\w0-9]')
-        act_d = {'value': '[a-z\\w0-9]', 'type': 1, 'kind': 'charset',
-                 'charset': [{'type': 'alpha_range', 'range': ['a', 'z']},
-                             {'type': 'trans', 'value': 'w'}, {'type': 'digit_range', 'range': [0, 9]}]}
+        act_d = Token(TokenKind.SET, '[a-z\\w0-9]',
+                      members=[set_member_t(Kind.ALPHA_RANGE, ('a', 'z')),
+                               set_member_t(Kind.TRANS, 'w'), set_member_t(Kind.DIGIT_RANGE, (0, 9))])
         self.assertEqual(d, act_d)
         self.assertRaises(TypeError, lambda: process_set(None))
 
     def test_process_range(self):
         inc, d = process_range('{5}')
-        self.assertEqual(d, {'value': '{5}', 'type': 0, 'kind': 'range', 'range': [5, 5]})
+        self.assertEqual(d, Token(TokenKind.RANGE, '{5}', bounds=(5, 5)))
+        self.assertTrue(d.is_repeat)
         inc, d = process_range('{3,}')
-        self.assertEqual(d, {'value': '{3,}', 'type': 0, 'kind': 'range', 'range': [3, -1]})
+        self.assertEqual(d, Token(TokenKind.RANGE, '{3,}', bounds=(3, -1)))
         inc, d = process_range('{3,5}')
-        self.assertEqual(d, {'value': '{3,5}', 'type': 0, 'kind': 'range', 'range': [3, 5]})
+        self.assertEqual(d, Token(TokenKind.RANGE, '{3,5}', bounds=(3, 5)))
         inc, d = process_range('{,5}')
-        self.assertEqual(d, {'value': '{,5}', 'type': 0, 'kind': 'range', 'range': [0, 5]})
+        self.assertEqual(d, Token(TokenKind.RANGE, '{,5}', bounds=(0, 5)))
         self.assertRaises(TypeError, lambda: process_range(None))
+        inc, d = process_range('{12,150}')
+        self.assertEqual((inc, d.bounds), (7, (12, 150)))
+        for substr in ['{', '{}', '{,}', '{x}', '{5,3}']:
+            self.assertRaises(RegexSyntaxError, lambda: process_range(substr))
 
     def test_charset_parser(self):
         charset = r'\w\.%-A-Za-z0-9'
         lst = charset_parser(charset)
-        act_lst = [{'type': 'trans', 'value': 'w'},
-                   {'type': 'normal', 'value': '.'},
-                   {'type': 'normal', 'value': '%'},
-                   {'type': 'normal', 'value': '-'},
-                   {'type': 'alpha_range', 'range': ['A', 'Z']},
-                   {'type': 'alpha_range', 'range': ['a', 'z']},
-                   {'type': 'digit_range', 'range': [0, 9]}]
+        act_lst = [set_member_t(Kind.TRANS, 'w'),
+                   set_member_t(Kind.NORMAL, '.'),
+                   set_member_t(Kind.NORMAL, '%'),
+                   set_member_t(Kind.NORMAL, '-'),
+                   set_member_t(Kind.ALPHA_RANGE, ('A', 'Z')),
+                   set_member_t(Kind.ALPHA_RANGE, ('a', 'z')),
+                   set_member_t(Kind.DIGIT_RANGE, (0, 9))]
         self.assertEqual(lst, act_lst)
         self.assertRaises(TypeError, lambda: charset_parser(None))
 
     def test_regex_to_tokens(self):
         regex = r'(ab)*[^0-9]+\w\s{2,8}{2,}ac{,8}b{6}'
         tokens = regex_to_tokens(regex)
-        act_tokens = [{'value': '(', 'type': 0, 'kind': 'normal'},
-                      {'value': 'a', 'type': 1, 'kind': 'normal'},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': 'b', 'type': 1, 'kind': 'normal'},
-                      {'value': ')', 'type': 0, 'kind': 'normal'},
-                      {'value': '*', 'type': 0, 'kind': 'normal'},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': '[^0-9]', 'type': 1, 'kind': 'neg-charset',
-                       'neg-charset': [{'type': 'normal', 'value': '^'},
-                                       {'type': 'digit_range', 'range': [0, 9]}]},
-                      {'value': '+', 'type': 0, 'kind': 'normal'},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': 'w', 'type': 1, 'kind': 'trans'},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': 's', 'type': 1, 'kind': 'trans'},
-                      {'value': '{2,8}', 'type': 0, 'kind': 'range', 'range': [2, 8]},
-                      {'value': '{2,}', 'type': 0, 'kind': 'range', 'range': [2, -1]},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': 'a', 'type': 1, 'kind': 'normal'},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': 'c', 'type': 1, 'kind': 'normal'},
-                      {'value': '{,8}', 'type': 0, 'kind': 'range', 'range': [0, 8]},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': 'b', 'type': 1, 'kind': 'normal'},
-                      {'value': '{6}', 'type': 0, 'kind': 'range', 'range': [6, 6]}]
+        neg_set = Token(TokenKind.NEG_SET, '[^0-9]', members=[set_member_t(Kind.DIGIT_RANGE, (0, 9))])
+        act_tokens = [Token(TokenKind.LEFT, '('), Token(TokenKind.CHAR, 'a'), CONCAT, Token(TokenKind.CHAR, 'b'),
+                      Token(TokenKind.RIGHT, ')'), Token(TokenKind.STAR, '*'), CONCAT,
+                      neg_set, Token(TokenKind.PLUS, '+'), CONCAT,
+                      Token(TokenKind.TRANS, 'w'), CONCAT,
+                      Token(TokenKind.TRANS, 's'), Token(TokenKind.RANGE, '{2,8}', bounds=(2, 8)),
+                      Token(TokenKind.RANGE, '{2,}', bounds=(2, -1)), CONCAT,
+                      Token(TokenKind.CHAR, 'a'), CONCAT,
+                      Token(TokenKind.CHAR, 'c'), Token(TokenKind.RANGE, '{,8}', bounds=(0, 8)), CONCAT,
+                      Token(TokenKind.CHAR, 'b'), Token(TokenKind.RANGE, '{6}', bounds=(6, 6))]
 
         self.assertEqual(tokens, act_tokens)
+        self.assertEqual(regex_to_tokens('[^^]'),
+                         [Token(TokenKind.NEG_SET, '[^^]', members=[set_member_t(Kind.NORMAL, '^')])])
         self.assertRaises(TypeError, lambda: regex_to_tokens(None))
 
+    def test_syntax_errors(self):
+        for regex, pos in [('ab(c', 2), ('ab)c', 2), ('*a', 0), ('a(+b)', 2), ('a\\', 1), ('ab[cd', 2),
+                           ('[a-9]', 1), ('a{3,1}', 1), ('a{2', 1), (r'x\q', 1), (r'[\q]', 1), ('', 0), ('()', 0),
+                           ('a(b())', 3), ('x()*', 1)]:
+            with self.assertRaises(RegexSyntaxError) as cm:
+                regex_to_tokens(regex)
+            self.assertEqual(cm.exception.pos, pos)
+            self.assertEqual(cm.exception.pattern, regex)
+        self.assertTrue(issubclass(RegexSyntaxError, ValueError))
+        # escaped punctuation stands for itself, an escaped ']' does not close a charset
+        self.assertEqual(regex_to_tokens(r'\-'), [Token(TokenKind.CHAR, '-')])
+        self.assertEqual(regex_to_tokens(r'[\]-]')[0].members,
+                         [set_member_t(Kind.NORMAL, ']'), set_member_t(Kind.NORMAL, '-')])
+
     def test_add_concat(self):
-        tokens = [{'value': 'a', 'type': 1, 'kind': 'normal'},
-                  {'value': 'b', 'type': 1, 'kind': 'normal'},
-                  {'value': '[^0-9]', 'type': 1, 'kind': 'neg-charset',
-                   'neg-charset': [{'type': 'normal', 'value': '^'},
-                                   {'type': 'digit_range', 'range': [0, 9]}]}]
+        neg_set = Token(TokenKind.NEG_SET, '[^0-9]', members=[set_member_t(Kind.DIGIT_RANGE, (0, 9))])
+        tokens = [Token(TokenKind.CHAR, 'a'), Token(TokenKind.CHAR, 'b'), neg_set]
         add_concat(tokens)
-        act_tokens = [{'value': 'a', 'type': 1, 'kind': 'normal'},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': 'b', 'type': 1, 'kind': 'normal'},
-                      {'value': 'concat', 'type': 0, 'kind': 'concat'},
-                      {'value': '[^0-9]', 'type': 1, 'kind': 'neg-charset',
-                       'neg-charset': [{'type': 'normal', 'value': '^'},
-                                       {'type': 'digit_range', 'range': [0, 9]}]}]
+        act_tokens = [Token(TokenKind.CHAR, 'a'), CONCAT, Token(TokenKind.CHAR, 'b'), CONCAT, neg_set]
         self.assertEqual(tokens, act_tokens)
         self.assertRaises(TypeError, lambda: add_concat(None))
 
+    def test_extract_literals(self):
+        self.assertRaises(TypeError, lambda: extract_literals(None))
+        self.assertEqual(extract_literals(regex_to_tokens(' #.*$')), (' #', ' #'))
+        self.assertEqual(extract_literals(regex_to_tokens(r'error: \d+')), ('error: ', 'error: '))
+        self.assertEqual(extract_literals(regex_to_tokens('^a{2,3}bcd')), ('aa', 'bcd'))
+        self.assertEqual(extract_literals(regex_to_tokens('a{3}b*')), ('aaa', 'aaa'))
+        self.assertEqual(extract_literals(regex_to_tokens(r'[\w-]+(\.[\w-]+)*@[\w-]+')), ('', '@'))
+        self.assertEqual(extract_literals(regex_to_tokens('(ab)*c(de){1,2}f')), ('', 'de'))
+        self.assertEqual(extract_literals(regex_to_tokens('x*')), ('', ''))
+        # stacked repeats are folded into one, an atom with a zero minimum is optional
+        self.assertEqual(extract_literals(regex_to_tokens('a{2}*b')), ('', 'b'))
+        self.assertEqual(extract_literals(regex_to_tokens('a+*b')), ('', 'b'))
+        self.assertEqual(extract_literals(regex_to_tokens('a{1,2}*b')), ('', 'b'))
+        self.assertEqual(extract_literals(regex_to_tokens('a{2}{3}b')), ('aaaaaab', 'aaaaaab'))
+        self.assertEqual(extract_literals(regex_to_tokens('((ab{0,1}c{2,})){1,2}{0,1}')), ('', ''))
+
 
 if __name__ == '__main__':
     unittest.main()
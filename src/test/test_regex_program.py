@@ -0,0 +1,56 @@
+import unittest
+
+from regex_to_nfa import regex_to_nfa
+from regex_program import *
+
+
+class ProgramTest(unittest.TestCase):
+
+    def test_compile_program(self):
+        self.assertRaises(TypeError, lambda: compile_program(None))
+        program = compile_program(regex_to_nfa('ab'))
+        self.assertEqual(list(program.ops), [Op.CHAR, Op.CHAR, Op.MATCH, Op.SPLIT])
+        self.assertEqual(list(program.targets(program.start)), [0])
+        self.assertEqual(list(program.targets(0)), [1])
+        self.assertEqual(list(program.targets(1)), [2])
+        self.assertEqual('a' in program.char_class(0), True)
+        self.assertEqual('b' in program.char_class(0), False)
+        self.assertEqual(program.char_class(2), None)
+
+    def test_shared_classes(self):
+        program = compile_program(regex_to_nfa(r'\d+-\d+'))
+        self.assertEqual(len(program.classes), 2)
+        self.assertEqual(program.operands[program.ops.index(Op.MATCH)], -1)
+
+    def test_extend(self):
+        program = Program()
+        first = compile_program(regex_to_nfa('ab'))
+        second = compile_program(regex_to_nfa('b*'))
+        self.assertEqual(program.extend(first), 0)
+        base = program.extend(second)
+        self.assertEqual(base, len(first))
+        self.assertEqual(len(program), len(first) + len(second))
+        self.assertEqual(list(program.targets(base + second.start)), [base + t for t in second.targets(second.start)])
+        # 'b' is stored once for both programs
+        self.assertEqual(len(program.classes), 2)
+
+    def test_nbytes(self):
+        nfa = regex_to_nfa(r'[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+')
+        program = compile_program(nfa)
+        self.assertEqual(len(program), len(nfa.get_node_list()) + 2)
+        self.assertLess(program.nbytes(), 32 * len(program))
+
+    def test_max_length(self):
+        self.assertEqual(compile_program(regex_to_nfa('ab')).max_length(), 2)
+        self.assertEqual(compile_program(regex_to_nfa(r'\d{2,4}-\w{3}')).max_length(), 8)
+        self.assertEqual(compile_program(regex_to_nfa('itmo$')).max_length(), 4)
+        # counted repeats are bounded by their counters
+        self.assertEqual(compile_program(regex_to_nfa('x{0,70}y')).max_length(), 71)
+        self.assertEqual(compile_program(regex_to_nfa('(a{3}){70}')).max_length(), 210)
+        self.assertEqual(compile_program(regex_to_nfa('a+')).max_length(), None)
+        self.assertEqual(compile_program(regex_to_nfa('ab{65,}')).max_length(), None)
+        self.assertEqual(compile_program(regex_to_nfa('x{0,70}y')).max_length(limit=10), None)
+
+
+if __name__ == '__main__':
+    unittest.main()
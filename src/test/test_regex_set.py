@@ -0,0 +1,50 @@
+import unittest
+
+from regex_lib import compile
+from regex_set import *
+
+
+class RegexSetTest(unittest.TestCase):
+
+    def test_matches(self):
+        self.assertRaises(TypeError, lambda: RegexSet(['a', 1]))
+        self.assertRaises(ValueError, lambda: RegexSet(['a', '']))
+        rs = RegexSet(['[0-9]+', '^hello', 'itmo$', 'x*'])
+        self.assertEqual(len(rs), 4)
+        self.assertEqual(rs.matches('hello itmo'), [1, 2, 3])
+        self.assertEqual(rs.matches('itmo hello 42'), [0, 3])
+        self.assertEqual(rs.matches(''), [])
+        self.assertEqual(RegexSet(['^x*', 'x*']).matches(''), [0])
+        self.assertEqual(RegexSet([]).matches('abc'), [])
+
+    def test_search(self):
+        rs = RegexSet(['[0-2][0-9]:[0-5][0-9]:[0-5][0-9]', r'\w+@\w+', r'\d+', 'itmo$'])
+        text = 'sent by bob@itmo at 23:58:01'
+        self.assertEqual(rs.search(text), [(0, 20, 28), (1, 8, 16), (2, 20, 22)])
+        self.assertEqual(rs.search('nothing here'), [])
+
+    def test_same_as_pattern(self):
+        patterns = [r'\w+', 'x*', '^wxx', r'\d+\w', '[^0-9]+', 'a{1,3}', r' #.*$', 'ab$', '^a*$', '.b.', 'x{0,70}1']
+        texts = ['', 'wxx', 'ab', 'aaaab', 'x12 #a__b', '12', ' #', 'b', 'wxx，wxx ab-1 x12']
+        for max_states in (2, 1000):
+            rs = RegexSet(patterns, max_states)
+            for text in texts:
+                expected = []
+                for i, regex in enumerate(patterns):
+                    m = compile(regex).search(text)
+                    if m is not None:
+                        expected.append((i,) + m)
+                self.assertEqual(rs.search(text), expected)
+                self.assertEqual(rs.matches(text), [m[0] for m in expected])
+
+    def test_state_cache(self):
+        self.assertRaises(ValueError, lambda: RegexSet(['a'], max_states=1))
+        rs = RegexSet(['.{,9}x', 'a{3}', 'b'], max_states=3)
+        self.assertEqual(rs.matches('a' * 8 + 'x'), [0, 1])
+        self.assertGreater(rs.flushes, 0)
+        self.assertEqual(rs.matches('a' * 12 + 'x'), [0, 1])
+        self.assertEqual(rs.matches('aab'), [2])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -89,6 +89,26 @@ class RegexToNfaTest(unittest.TestCase):
         nfa.execute('aaaa')
         self.assertEqual(nfa.get_matched_str(), 'aaa')
 
+    def test_nodes_repeat_count(self):
+        nfa = RegexFaConstruction('nfa')
+        self.assertRaises(TypeError, lambda: nodes_repeat_count(1, 0, 2, 5))
+        self.assertRaises(ValueError, lambda: nodes_repeat_count(nfa, 0, 1, 3))
+        nfa.add_normal_node(nfa.input_port, 'n1', 'a')
+        nfa.add_normal_node('n1', nfa.output_port, 'b')
+        nfa, inc = nodes_repeat_count(nfa, 0, 2, 3)
+        self.assertEqual(len(nfa.get_node_list()), 7)
+        nfa.execute('ab')
+        self.assertEqual(nfa.is_matched(), False)
+        nfa.execute('abababab')
+        self.assertEqual(nfa.get_matched_str(), 'ababab')
+        nfa = RegexFaConstruction('nfa')
+        nfa.add_normal_node(nfa.input_port, nfa.output_port, 'a')
+        nfa, inc = nodes_repeat_count(nfa, 0, 2, -1)
+        nfa.execute('a')
+        self.assertEqual(nfa.is_matched(), False)
+        nfa.execute('aaaaa')
+        self.assertEqual(nfa.get_matched_str(), 'aaaaa')
+
     def test_nodes_prefix(self):
         nfa = RegexFaConstruction('nfa')
         self.assertRaises(TypeError, lambda: nodes_prefix(1, 2))
@@ -115,12 +135,66 @@ class RegexToNfaTest(unittest.TestCase):
         nfa.execute('cdab')
         self.assertEqual(nfa.is_matched(), False)
 
+    def test_eliminate_null_nodes(self):
+        self.assertRaises(TypeError, lambda: eliminate_null_nodes(1))
+        nfa = eliminate_null_nodes(regex_to_nfa('ab*c'))
+        self.assertEqual([node.name for node in nfa.get_node_list()], ['normal'] * 3)
+        nfa.execute('abbbc')
+        self.assertEqual(nfa.get_matched_str(), 'abbbc')
+        nfa.execute('ac')
+        self.assertEqual(nfa.get_matched_str(), 'ac')
+        # the empty string still reaches the output
+        nfa = eliminate_null_nodes(regex_to_nfa('a*'))
+        nfa.execute('')
+        self.assertEqual(nfa.is_matched(), True)
+        text = 'wangxin@hdu.edu.com'
+        for regex in [r'^[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+$', r'(\w*\.?)+', 'x*w*an(g+)', r'\w{2,}@\w{65,}']:
+            nfa = regex_to_nfa(regex)
+            nfa.execute(text)
+            steps = nfa.m.steps
+            expected = nfa.get_matched_index()
+            nfa = eliminate_null_nodes(regex_to_nfa(regex))
+            nfa.execute(text)
+            self.assertEqual(nfa.get_matched_index(), expected)
+            self.assertLessEqual(nfa.m.steps, steps)
+
+    def test_eliminate_null_nodes_nested_repeats(self):
+        # without the latencies of its null paths the NFA runs its events in another order: nested repeats need
+        # more events and may reach the event limit, which is why the discrete-event engine keeps the null nodes
+        for regex, text, expected in [(r'(.*.)*$', 'ab1baaabac1', 11), (r'(.*.)*\d{0,2}$', 'ab1baaabac1', 11),
+                                      (r'(a*a)*b', 'aaaab', 5)]:
+            nfa = regex_to_nfa(regex)
+            nfa.execute(text)
+            self.assertEqual(nfa.get_matched_index(), expected)
+            steps = nfa.m.steps
+            nfa = eliminate_null_nodes(regex_to_nfa(regex))
+            nfa.execute(text)
+            self.assertGreater(nfa.m.steps, steps)
+
     def test_regex_to_nfa(self):
         regex = r'^[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+$'
         self.assertRaises(TypeError, lambda: regex_to_nfa(1))
         nfa = regex_to_nfa(regex)
         nfa.execute('wangxin@hdu.edu.com')
         self.assertEqual(nfa.get_matched_str(), 'wangxin@hdu.edu.com')
+        # the ports of a range repeat must not be shared with the concatenation that follows it
+        nfa = regex_to_nfa('cd{1,2}f')
+        nfa.execute('cf')
+        self.assertEqual(nfa.is_matched(), False)
+        nfa.execute('cddf')
+        self.assertEqual(nfa.get_matched_str(), 'cddf')
+        # nor may the copies of a range repeat share ports with each other
+        nfa = regex_to_nfa('x(cd){2,3}')
+        nfa.execute('xcd')
+        self.assertEqual(nfa.is_matched(), False)
+        nfa = regex_to_nfa('(ab){2,}')
+        nfa.execute('ab')
+        self.assertEqual(nfa.is_matched(), False)
+        nfa.execute('ababab')
+        self.assertEqual(nfa.get_matched_str(), 'ababab')
+        # large counts do not copy the repeated part
+        self.assertLess(len(regex_to_nfa(r'\d{1000}').get_node_list()), 10)
+        self.assertLess(len(regex_to_nfa('.{0,500}').get_node_list()), 10)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,159 @@
+import unittest
+
+from regex_to_nfa import regex_to_nfa
+from regex_vm import *
+
+
+class RegexVmTest(unittest.TestCase):
+
+    def test_sparse_set(self):
+        threads = SparseSet(4)
+        threads.add(3, 0)
+        threads.add(1, 2)
+        self.assertEqual(len(threads), 2)
+        self.assertIn(1, threads)
+        self.assertNotIn(0, threads)
+        threads.clear()
+        self.assertNotIn(3, threads)
+
+    def test_search(self):
+        self.assertRaises(TypeError, lambda: PikeVm(None))
+        vm = PikeVm(regex_to_nfa('[0-9]+'))
+        self.assertEqual(vm.search('hello1324354657itmo'), (5, 15))
+        self.assertEqual(vm.search('hello1324354657itmo', 7), (7, 15))
+        self.assertEqual(vm.search('hello itmo'), None)
+        vm = PikeVm(regex_to_nfa('itmo$'))
+        self.assertEqual(vm.search('itmo hello itmo'), (11, 15))
+        vm = PikeVm(regex_to_nfa(r'[\w-]+(\.[\w-]+)*@[\w-]+(\.[\w-]+)+'))
+        self.assertEqual(vm.search('"email": "wangxinxin@hdu.edu.cn",'), (10, 31))
+
+    def test_scan(self):
+        vm = PikeVm(regex_to_nfa(r'[a-z]+\d'))
+        text = 'ab1 cd2 ef'
+        self.assertEqual(list(vm.scan(text)), [(0, 3), (4, 7)])
+        self.assertEqual(list(vm.scan(text, prefix='c')), [(4, 7)])
+        # a text that goes on after its end leaves the start of the last run undecided
+        self.assertEqual(list(vm.scan(text, at_end=False)), [(0, 3), (4, 7), (8, None)])
+        self.assertEqual(list(PikeVm(regex_to_nfa('ab$')).scan('xab', at_end=False)), [(1, None)])
+        # skip settles text the caller knows whenever no thread is alive
+        positions = []
+
+        def skip(i):
+            positions.append(i)
+            return ([(0, 3)], 3) if i == 0 else ([], i)
+        self.assertEqual(list(vm.scan('ab1 cd2 ef', skip=skip)), [(0, 3), (4, 7)])
+        # the scan went on from 3, the next position with no thread alive being after the space
+        self.assertEqual(positions[:2], [0, 4])
+        for regex in ('a*', r'(ab|a)(bc)?', r'\w+$', 'x?', '(z9){0,3}'):
+            vm = PikeVm(regex_to_nfa(regex))
+            for text in ('abcab', 'xz9z9z9z9 ', 'ab ab', ''):
+                expected = []
+                i = 0
+                while i < len(text):
+                    m = vm.search(text, i, last_start=len(text) - 1)
+                    if m is None:
+                        break
+                    expected.append(m)
+                    i = m[1] if m[1] > m[0] else m[1] + 1
+                self.assertEqual(list(vm.scan(text)), expected)
+
+    def test_prefix(self):
+        vm = PikeVm(regex_to_nfa(r'error: \d+'))
+        text = 'error: x, error: 42'
+        self.assertEqual(vm.search(text, prefix='error: '), (10, 19))
+        self.assertEqual(vm.search(text, 11, prefix='error: '), None)
+        self.assertEqual(vm.search(text, anchored=True, prefix='error: '), None)
+
+    def test_leftmost_longest(self):
+        vm = PikeVm(regex_to_nfa('a{1,3}'))
+        self.assertEqual(vm.search('baab'), (1, 3))
+        self.assertEqual(vm.search('baaaab'), (1, 4))
+        vm = PikeVm(regex_to_nfa('x*'))
+        self.assertEqual(vm.search('abc'), (0, 0))
+        self.assertEqual(vm.search('abc', 1, last_start=2), (1, 1))
+        vm = PikeVm(regex_to_nfa('a*$'))
+        self.assertEqual(vm.search('bb'), (2, 2))
+        self.assertEqual(vm.search('bb', last_start=1), None)
+
+    def test_counted_repeat(self):
+        vm = PikeVm(regex_to_nfa('x(ab){30,40}'))
+        self.assertEqual(vm.counted, True)
+        self.assertEqual(vm.search('x' + 'ab' * 29), None)
+        self.assertEqual(vm.search('yx' + 'ab' * 45), (1, 82))
+        vm = PikeVm(regex_to_nfa('[ab]{65,}c'))
+        self.assertEqual(vm.search('a' * 64 + 'c'), None)
+        self.assertEqual(vm.search('a' * 100 + 'c'), (0, 101))
+        threads = CountedSet()
+        threads.add(3, 0, (1,))
+        threads.add(3, 0, (2,))
+        self.assertEqual(len(threads), 2)
+        self.assertEqual(threads.has(3, (1,)), True)
+        self.assertEqual(threads.has(3, ()), False)
+
+    def test_match_at(self):
+        vm = PikeVm(regex_to_nfa(r'\d+\w'))
+        self.assertEqual(vm.match_at('123b'), 4)
+        self.assertEqual(vm.match_at('a123b'), None)
+        self.assertEqual(vm.match_at('a123b', 1), 5)
+
+
+class StreamMatcherTest(unittest.TestCase):
+
+    def test_feed(self):
+        m = StreamMatcher(PikeVm(regex_to_nfa('[0-9]+')))
+        self.assertRaises(TypeError, lambda: m.feed(1))
+        self.assertEqual(m.feed('ab12'), [])
+        # the digits may continue in the next chunk, everything before them is dropped
+        self.assertEqual((m.offset, m.pending), (2, '12'))
+        self.assertEqual(m.feed('3x45'), [(2, 5, '123')])
+        self.assertEqual(m.pending, '45')
+        self.assertEqual(m.feed('y' * 100), [(6, 8, '45')])
+        self.assertEqual(m.pending, '')
+        self.assertEqual(m.close(), [])
+        self.assertRaises(ValueError, lambda: m.feed('1'))
+
+    def test_end_of_text(self):
+        m = StreamMatcher(PikeVm(regex_to_nfa('itmo$')))
+        self.assertEqual(m.feed('itmo hello it'), [])
+        self.assertEqual(m.feed('mo'), [])
+        self.assertEqual(m.close(), [(11, 15, 'itmo')])
+
+    def test_same_as_search(self):
+        text = 'wxx，wxx ab-1 x12 #a__b'
+        for regex in [r'\w+', 'x*', '^wxx', r'\d+\w', '[^0-9]+', 'a{1,3}', r' #.*$', 'x{0,70}']:
+            vm = PikeVm(regex_to_nfa(regex))
+            expected = []
+            i = 0
+            while True:
+                res = vm.search(text, i, last_start=len(text) - 1, anchored=regex[0] == '^' and i == 0)
+                if res is None or (regex[0] == '^' and expected):
+                    break
+                expected.append((res[0], res[1], text[res[0]:res[1]]))
+                i = res[1] if res[1] > res[0] else res[1] + 1
+            for size in (1, 2, 5):
+                m = StreamMatcher(vm, regex[0] == '^')
+                res = []
+                for k in range(0, len(text), size):
+                    res.extend(m.feed(text[k:k + size]))
+                res.extend(m.close())
+                self.assertEqual(res, expected)
+
+    def test_close_with_pending_match(self):
+        # a match is pending while other threads still run when the text ends
+        m = StreamMatcher(PikeVm(regex_to_nfa(r'\w*1[^a]')))
+        self.assertEqual(m.feed('11a1') + m.close(), [(0, 2, '11')])
+        for regex, text in [(r'.*[^a]+.', 'ab1ba1'), (r'1*\w+([^a]+[ab]b)*', '1a ab1')]:
+            vm = PikeVm(regex_to_nfa(regex))
+            expected = []
+            i = 0
+            res = vm.search(text, i, last_start=len(text) - 1)
+            while res is not None:
+                expected.append(res)
+                i = res[1] if res[1] > res[0] else res[1] + 1
+                res = vm.search(text, i, last_start=len(text) - 1)
+            m = StreamMatcher(vm)
+            self.assertEqual([res[:2] for res in m.feed(text) + m.close()], expected)
+
+
+if __name__ == '__main__':
+    unittest.main()